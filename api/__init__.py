@@ -0,0 +1 @@
+# This file makes the 'api' folder a Python package.
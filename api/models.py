@@ -0,0 +1,68 @@
+import math
+from pydantic import BaseModel, Field, validator
+from typing import List, Dict, Any, Optional, Literal
+from utils.schemas import Activity, ItinerarySchema, TripRequest, Priorities
+
+# Request / response models for the HTTP API (built on utils/schemas)
+
+
+class CatalogItem(Activity):
+    location: Optional[str] = None
+    avg_rating: Optional[float] = None
+
+    class Config:
+        extra = 'allow'
+
+    @validator('*', pre=True)
+    def handle_nan(cls, v):
+        # CSV-derived payloads carry NaN for empty cells
+        return None if isinstance(v, float) and math.isnan(v) else v
+
+
+class SearchRequest(BaseModel):
+    query: str = Field(min_length=1)
+    top_k: int = Field(default=15, ge=1, le=100)
+    min_eco_score: float = Field(default=0.0, ge=0.0, le=10.0)
+    accuracy: Optional[Literal["fast", "balanced", "accurate", "exact"]] = None  # None = SEARCH_ACCURACY
+    location: Optional[str] = None  # routes to that location's shards; otherwise detected from the query
+
+
+class SearchResponse(BaseModel):
+    results: List[CatalogItem] = Field(default_factory=list)
+
+
+class RefineRequest(BaseModel):
+    itinerary: ItinerarySchema
+    feedback: str = Field(min_length=1)
+    location: Optional[str] = None
+    user_name: str = "User"
+    days: int = Field(default=3, ge=1, le=30)
+    travelers: int = Field(default=1, ge=1, le=20)
+    budget: int = Field(default=1500, ge=100, le=10000)
+
+
+class AskRequest(BaseModel):
+    itinerary: ItinerarySchema
+    question: str = Field(min_length=1)
+
+
+class PackingRequest(BaseModel):
+    itinerary: ItinerarySchema
+    user_name: str = "User"
+    list_type: Literal["Smart List", "Minimal List", "Ultra-Light List"] = "Smart List"
+
+
+class StoryRequest(BaseModel):
+    itinerary: ItinerarySchema
+    user_name: str = "Traveler"
+
+
+class TextResponse(BaseModel):
+    text: str
+
+
+class PlanEvent(BaseModel):
+    """One line of a streamed (NDJSON) plan response."""
+    event: Literal["status", "result", "error"]
+    message: Optional[str] = None
+    itinerary: Optional[Dict[str, Any]] = None
@@ -0,0 +1,305 @@
+"""
+Headless async HTTP API in front of RAGEngine / AgentWorkflow.
+
+    uvicorn api.server:app --host 0.0.0.0 --port 8000
+
+Blocking work runs in two bounded thread pools (retrieval and LLM), so
+hundreds of concurrent requests just wait on an asyncio semaphore instead
+of holding threads. Add ?stream=true to /plan (NDJSON events) or to /ask
+and /story (chunked text) to get incremental output.
+"""
+import os
+import sys
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from backend.agent_workflow import AgentWorkflow, llm_flight_stats
+from backend.rag_engine import RAGEngine
+from backend.trip_planner import build_trip_query, prune_candidates, retrieve_candidates, generate_itinerary, enrich_itinerary
+from backend.facets import get_facets
+from backend.regions import get_regions
+from backend.chat_index import chat_context
+from backend.chat_cache import answer_question, cached_answer
+from backend.llm_scheduler import get_scheduler
+from backend.utils import extract_json
+from utils.profile import load_profile
+from utils.logger import logger
+from utils.schemas import ItinerarySchema
+from version import APP_VERSION
+from api.models import (
+    SearchRequest, SearchResponse, TripRequest, RefineRequest, AskRequest,
+    PackingRequest, StoryRequest, TextResponse, PlanEvent,
+)
+
+# -----------------------------------------
+# ⚙️ Config
+# -----------------------------------------
+LLM_CONCURRENCY = int(os.getenv("API_LLM_CONCURRENCY", "32"))     # in-flight Gemini calls per process
+SEARCH_WORKERS = int(os.getenv("API_SEARCH_WORKERS", "8"))         # threads for retrieval / profile I/O
+MAX_PENDING_LLM = int(os.getenv("API_MAX_PENDING", "1024"))        # queued LLM calls before 503
+
+
+class Engines:
+    """Process-wide shared engines plus the pools / limits that guard them."""
+
+    def __init__(self, agent: AgentWorkflow, rag: RAGEngine) -> None:
+        self.agent = agent
+        self.rag = rag
+        self.search_pool = ThreadPoolExecutor(SEARCH_WORKERS, thread_name_prefix="api-search")
+        self.llm_pool = ThreadPoolExecutor(LLM_CONCURRENCY, thread_name_prefix="api-llm")
+        self.llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+        self.waiting = 0
+
+    def check_capacity(self) -> None:
+        if self.waiting >= MAX_PENDING_LLM:
+            raise HTTPException(status_code=503, detail="LLM queue is full, retry later.", headers={"Retry-After": "5"})
+
+    @asynccontextmanager
+    async def _llm_slot(self):
+        self.check_capacity()
+        self.waiting += 1
+        try:
+            await self.llm_slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            yield
+        finally:
+            self.llm_slots.release()
+
+    async def io(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.search_pool, lambda: fn(*args, **kwargs))
+
+    async def llm(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        async with self._llm_slot():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.llm_pool, lambda: fn(*args, **kwargs))
+
+    async def llm_stream(self, gen_fn: Callable, *args: Any) -> AsyncIterator[str]:
+        """Runs a sync chunk generator in the LLM pool and relays its chunks."""
+        async with self._llm_slot():
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+            end = object()
+
+            def pump() -> None:
+                try:
+                    for chunk in gen_fn(*args):
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                except Exception as e:
+                    logger.exception(f"API stream error: {e}")
+                finally:
+                    loop.call_soon_threadsafe(queue.put_nowait, end)
+
+            future = loop.run_in_executor(self.llm_pool, pump)
+            while (chunk := await queue.get()) is not end:
+                yield chunk
+            await future
+
+    def close(self) -> None:
+        self.search_pool.shutdown(wait=False, cancel_futures=True)
+        self.llm_pool.shutdown(wait=False, cancel_futures=True)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    rag = await asyncio.to_thread(RAGEngine)
+    app.state.engines = Engines(AgentWorkflow(), rag)
+    yield
+    app.state.engines.close()
+
+
+app = FastAPI(title="EcoGuide AI Pro API", version=APP_VERSION, lifespan=lifespan)
+
+
+def _engines() -> Engines:
+    return app.state.engines
+
+
+def _plan_context(itinerary: ItinerarySchema) -> str:
+    return json.dumps(itinerary.model_dump(), default=str)
+
+
+async def _load_user_profile(engines: Engines, user_name: str) -> Dict[str, Any]:
+    profile = await engines.io(load_profile, user_name)
+    profile["name"] = user_name
+    return profile
+
+
+# -----------------------------------------
+# Endpoints
+# -----------------------------------------
+@app.get("/health")
+async def health() -> Dict[str, Any]:
+    engines = _engines()
+    return {
+        "status": "ok",
+        "version": APP_VERSION,
+        "vector_db": engines.rag.client is not None,
+        "llm_waiting": engines.waiting,
+        "llm_scheduler": get_scheduler().metrics(),
+        "single_flight": {"gemini": llm_flight_stats(), "search": engines.rag.flight.stats()},
+        "shards": engines.rag.shards.stats() if engines.rag.shards else None,
+    }
+
+
+@app.post("/search", response_model=SearchResponse)
+async def search(req: SearchRequest) -> SearchResponse:
+    options = {k: v for k, v in (("accuracy", req.accuracy), ("location", req.location)) if v}
+    results = await _engines().io(retrieve_candidates, _engines().rag, req.query, req.min_eco_score, req.top_k, **options)
+    return SearchResponse(results=results)
+
+
+@app.get("/facets")
+async def facets(location: Optional[str] = None, interests: List[str] = Query(default=[]),
+                 min_eco_score: float = 0.0) -> Dict[str, Any]:
+    """Live match counts (total, per data_type, per interest) from the facet index."""
+    engines = _engines()
+    data_dir = engines.rag.data_dir
+
+    def count() -> Optional[Dict[str, Any]]:
+        index = get_facets(data_dir)  # builds the index on a cold or changed catalog
+        if index is None:
+            return None
+        locations = [get_regions(data_dir).canonical(location) or location] if location else None
+        return index.counts(locations, interests, min_eco_score)
+
+    counts = await engines.io(count)
+    if counts is None:
+        raise HTTPException(status_code=503, detail="Catalog snapshot unavailable.")
+    return counts
+
+
+@app.post("/plan", response_model=ItinerarySchema)
+async def plan(req: TripRequest, stream: bool = False):
+    engines = _engines()
+    engines.check_capacity()
+
+    async def run(emit: Callable[[str], Any]) -> Dict[str, Any]:
+        query = req.query or build_trip_query(req.days, req.location, req.travelers, req.interests)
+        await emit("🔍 Searching eco-friendly locations...")
+        candidates = await engines.io(prune_candidates, engines.rag, req.location, req.interests, req.min_eco_score)
+        if candidates is not None and not len(candidates):
+            raise HTTPException(status_code=404, detail="No eco-friendly results found.")
+        search_kwargs = {"candidates": candidates} if candidates is not None else {}
+        rag_results: List[Dict[str, Any]] = await engines.io(retrieve_candidates, engines.rag, query, req.min_eco_score,
+                                                             location=req.location, with_vectors=True, **search_kwargs)
+        if not rag_results:
+            raise HTTPException(status_code=404, detail="No eco-friendly results found.")
+        user_profile = await _load_user_profile(engines, req.user_name)
+        await emit("🤖 Creating itinerary...")
+        return await engines.llm(
+            generate_itinerary, engines.agent, query, rag_results,
+            budget=req.budget, interests=req.interests, days=req.days, location=req.location,
+            travelers=req.travelers, user_profile=user_profile, priorities=req.priorities.model_dump(),
+        )
+
+    if not stream:
+        async def no_emit(msg: str) -> None:
+            return None
+        return await run(no_emit)
+
+    async def events() -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def emit(msg: str) -> None:
+            await queue.put(PlanEvent(event="status", message=msg))
+
+        task = asyncio.create_task(run(emit))
+        while not (task.done() and queue.empty()):
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                yield getter.result().model_dump_json(exclude_none=True) + "\n"
+            else:
+                getter.cancel()
+        try:
+            yield PlanEvent(event="result", itinerary=task.result()).model_dump_json(exclude_none=True) + "\n"
+        except HTTPException as e:
+            yield PlanEvent(event="error", message=str(e.detail)).model_dump_json(exclude_none=True) + "\n"
+        except Exception as e:
+            logger.exception(f"API plan stream failed: {e}")
+            yield PlanEvent(event="error", message="Plan generation failed.").model_dump_json(exclude_none=True) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/refine", response_model=ItinerarySchema)
+async def refine(req: RefineRequest):
+    engines = _engines()
+    filters = await engines.io(engines.rag.extract_filters, req.feedback)  # may build the gazetteer
+    rag_results = await engines.io(engines.rag.search, req.feedback, location=req.location, filters=filters)
+    user_profile = await _load_user_profile(engines, req.user_name)
+    refined = await engines.llm(
+        engines.agent.refine_plan,
+        previous_plan_json=_plan_context(req.itinerary),
+        feedback_query=req.feedback,
+        rag_data=rag_results,
+        user_profile=user_profile,
+        travelers=req.travelers,
+        days=req.days,
+        budget=req.budget,
+    )
+    if isinstance(refined, str):
+        refined = extract_json(refined)
+    if not isinstance(refined, dict) or not refined:
+        raise HTTPException(status_code=502, detail="The refined plan could not be read; please try again.")
+    previous = [a.model_dump() for a in req.itinerary.activities]
+    return await engines.io(enrich_itinerary, refined, list(rag_results) + previous, req.days, req.travelers)
+
+
+@app.post("/ask", response_model=TextResponse)
+async def ask(req: AskRequest, stream: bool = False):
+    engines = _engines()
+    itinerary, embedder = req.itinerary.model_dump(), getattr(engines.rag, "embedder", None)
+    cached = await engines.io(cached_answer, itinerary, req.question, embedder)
+    if cached is not None:
+        return PlainTextResponse(cached) if stream else TextResponse(text=cached)
+    if stream:
+        context = await engines.io(chat_context, itinerary, req.question, embedder)
+        engines.check_capacity()
+        return StreamingResponse(
+            engines.llm_stream(engines.agent.stream_question, context, req.question),
+            media_type="text/plain; charset=utf-8",
+        )
+    text, _ = await engines.llm(answer_question, engines.agent, itinerary, req.question, embedder)
+    return TextResponse(text=text)
+
+
+@app.post("/packing", response_model=TextResponse)
+async def packing(req: PackingRequest):
+    engines = _engines()
+    user_profile = await _load_user_profile(engines, req.user_name)
+    text = await engines.llm(
+        engines.agent.generate_packing_list,
+        plan_context=_plan_context(req.itinerary), user_profile=user_profile, list_type=req.list_type,
+    )
+    return TextResponse(text=text)
+
+
+@app.post("/story", response_model=TextResponse)
+async def story(req: StoryRequest, stream: bool = False):
+    engines = _engines()
+    if stream:
+        engines.check_capacity()
+        return StreamingResponse(
+            engines.llm_stream(engines.agent.stream_story, _plan_context(req.itinerary), req.user_name),
+            media_type="text/markdown; charset=utf-8",
+        )
+    text = await engines.llm(engines.agent.generate_story, plan_context=_plan_context(req.itinerary), user_name=req.user_name)
+    return TextResponse(text=text)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("api.server:app", host="0.0.0.0", port=int(os.getenv("API_PORT", "8000")))
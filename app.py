@@ -17,6 +17,7 @@ try:
     from utils.logger import logger
     from utils.env_validator import validate_env
     from utils.caching import get_agent, get_rag
+    from utils.profiler import profile_rerun
     from ui.sidebar import render_sidebar
     from ui.main_content import render_main_content
     from version import APP_VERSION
@@ -53,10 +54,12 @@ def main():
 
     # -----------------------------------------
     # 🔧 FIX 4 — Render UI (Fully Safe)
+    # Opt-in profiling: ECOGUIDE_PROFILE=1 or ?profile=1
     # -----------------------------------------
     try:
-        render_sidebar(agent, rag, APP_VERSION)
-        render_main_content(agent, rag)
+        with profile_rerun("rerun"):
+            render_sidebar(agent, rag, APP_VERSION)
+            render_main_content(agent, rag)
     except Exception as e:
         st.error("⚠️ UI Error — Unable to render interface.")
         st.code(str(e))
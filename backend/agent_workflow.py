@@ -5,6 +5,10 @@ from dotenv import load_dotenv
 from backend.utils import extract_json
 from utils.schemas import ItinerarySchema
 from utils.logger import logger
+from backend.single_flight import SingleFlight, make_key
+from backend.llm_scheduler import (
+    get_scheduler, estimate_tokens, PRIORITY_INTERACTIVE, PRIORITY_PLAN, PRIORITY_BACKGROUND,
+)
 import random
 
 load_dotenv()
@@ -21,6 +25,10 @@ safety_settings = [
 
 model = genai.GenerativeModel(MODEL_NAME, safety_settings=safety_settings)
 
+# Merges concurrent identical prompts (see backend/single_flight.py)
+_ask_flight = SingleFlight("gemini")
+LLM_FLIGHT_TIMEOUT = float(os.getenv("LLM_FLIGHT_TIMEOUT", "120"))
+
 # --- 🚨 BACKUP PLAN (ডেমো সেভার) ---
 # যদি API ফেইল করে, এই প্ল্যানটা দেখাবে।
 MOCK_PLAN_JSON = """
@@ -37,7 +45,7 @@ MOCK_PLAN_JSON = """
   "waste_free_score": 8,
   "plan_health_score": 92,
   "budget_breakdown": { "Accommodation": 900, "Activities": 150, "Food": 200, "Transport": 50 },
-  "carbon_offset_suggestion": "Your trip saved 15kg of CO2! Consider donating $5 to a mangrove restoration project.",
+  "carbon_offset_suggestion": "Consider donating to a verified mangrove restoration project to offset your trip.",
   "ai_image_prompt": "A futuristic eco-city in Dubai with vertical gardens and solar panels.",
   "ai_time_planner_report": "The schedule is perfectly balanced with ample rest time.",
   "cost_leakage_report": "No hidden costs detected. Great budget management!",
@@ -59,18 +67,52 @@ RAG Data: {rag_data}
 
 INSTRUCTIONS:
 1. Create a detailed Markdown plan with times.
-2. Output ONLY JSON matching the schema.
+2. RAG items with a "day" are grouped by distance: schedule them on that day in "stop" order.
+3. Leave out eco_score, carbon_saved, waste_free_score, carbon_offset_suggestion and duplicate_trip_detector: they are computed from the catalog and the trip history. Do not quote CO2 figures anywhere else.
+4. Output ONLY JSON matching the schema.
 """
 
+def llm_flight_stats():
+    return _ask_flight.stats()
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", None)
+
 class AgentWorkflow:
-    def _ask(self, prompt):
+    def _ask(self, prompt, priority=PRIORITY_PLAN):
+        # Identical prompts already in flight (any session) share one Gemini call
+        try:
+            return _ask_flight.do(make_key(prompt), lambda: self._call_model(prompt, priority), timeout=LLM_FLIGHT_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Merged Gemini call failed: {e}")
+            return None
+
+    def _call_model(self, prompt, priority):
+        # Every Gemini call waits for a slot in the process-wide scheduler
         try:
-            response = model.generate_content(prompt)
+            with get_scheduler().slot(priority, estimate_tokens(prompt, priority)) as ticket:
+                response = model.generate_content(prompt)
+                ticket.record_usage(_usage_tokens(response))
             return response.text
         except Exception as e:
             logger.exception(f"Gemini Error: {e}")
             return None
 
+    def _ask_stream(self, prompt, fallback="", priority=PRIORITY_INTERACTIVE):
+        """Yields response text chunks as Gemini produces them; falls back to one chunk."""
+        yielded = False
+        try:
+            with get_scheduler().slot(priority, estimate_tokens(prompt, priority)):
+                for chunk in model.generate_content(prompt, stream=True):
+                    if chunk.text:
+                        yielded = True
+                        yield chunk.text
+        except Exception as e:
+            logger.exception(f"Gemini Stream Error: {e}")
+        if not yielded and fallback:
+            yield fallback
+
     def _validate(self, text):
         try:
             data = extract_json(text)
@@ -79,30 +121,37 @@ class AgentWorkflow:
         except:
             return json.loads(MOCK_PLAN_JSON) # Fallback to Mock
 
+    def is_fallback_plan(self, itinerary):
+        """True for the mock plan returned when the model fails."""
+        return itinerary == json.loads(MOCK_PLAN_JSON)
+
+    def _itinerary_prompt(self, query, rag_data, **kwargs):
+        rag_str = json.dumps(rag_data, default=str)
+        user_profile = kwargs.get('user_profile', {})
+        priorities = kwargs.get('priorities', {})
+        
+        profile_ack = ""
+        if user_profile.get('interests'):
+            profile_ack = f"User likes {user_profile.get('interests')}"
+
+        return ITINERARY_PROMPT_TEMPLATE.format(
+            query=query,
+            budget=kwargs.get('budget', 1000),
+            days=kwargs.get('days', 3),
+            travelers=kwargs.get('travelers', 1),
+            eco_priority=priorities.get('eco', 5),
+            budget_priority=priorities.get('budget', 5),
+            comfort_priority=priorities.get('comfort', 5),
+            user_name=user_profile.get('name', 'User'),
+            user_interests=str(user_profile.get('interests', [])),
+            profile_ack=profile_ack,
+            rag_data=rag_str
+        )
+
     def run(self, query, rag_data, **kwargs):
         try:
             # 1. Prompt তৈরি
-            rag_str = json.dumps(rag_data, default=str)
-            user_profile = kwargs.get('user_profile', {})
-            priorities = kwargs.get('priorities', {})
-            
-            profile_ack = ""
-            if user_profile.get('interests'):
-                profile_ack = f"User likes {user_profile.get('interests')}"
-
-            prompt = ITINERARY_PROMPT_TEMPLATE.format(
-                query=query,
-                budget=kwargs.get('budget', 1000),
-                days=kwargs.get('days', 3),
-                travelers=kwargs.get('travelers', 1),
-                eco_priority=priorities.get('eco', 5),
-                budget_priority=priorities.get('budget', 5),
-                comfort_priority=priorities.get('comfort', 5),
-                user_name=user_profile.get('name', 'User'),
-                user_interests=str(user_profile.get('interests', [])),
-                profile_ack=profile_ack,
-                rag_data=rag_str
-            )
+            prompt = self._itinerary_prompt(query, rag_data, **kwargs)
 
             # 2. AI কল করা
             response = self._ask(prompt)
@@ -118,6 +167,16 @@ class AgentWorkflow:
             logger.exception(f"Run Workflow Failed: {e}")
             return json.loads(MOCK_PLAN_JSON) # Final Safety Net
 
+    def run_strict(self, query, rag_data, **kwargs):
+        """Like run(), but raises instead of returning the mock plan (batch jobs need real failures)."""
+        response = self._ask(self._itinerary_prompt(query, rag_data, **kwargs))
+        if not response:
+            raise RuntimeError("Gemini returned no response")
+        data = extract_json(response)
+        if not data:
+            raise ValueError("Could not extract JSON from Gemini response")
+        return ItinerarySchema(**data).model_dump()
+
     def refine_plan(self, previous_plan_json=None, feedback_query="", rag_data=[], **kwargs):
         # রিফাইন ফেইল করলে আগের প্ল্যানই ফেরত দেবে
         try:
@@ -130,20 +189,61 @@ class AgentWorkflow:
 
     # --- HELPER FUNCTIONS (Mock সহ) ---
 
-    def ask_question(self, plan_context, question):
+    def _question_prompt(self, plan_context, question):
+        return f"Context: {str(plan_context)[:5000]}\nQuestion: {question}\nAnswer briefly."
+
+    def _question_fallback(self, question):
+        return f"That's a great question about {question}! Based on your plan, I recommend checking local timings and booking in advance."
+
+    def ask_question(self, plan_context, question, fallback=True):
         # যদি API কাজ না করে, ডামি উত্তর দাও
-        response = self._ask(f"Context: {str(plan_context)[:5000]}\nQuestion: {question}\nAnswer briefly.")
-        return response or f"That's a great question about {question}! Based on your plan, I recommend checking local timings and booking in advance."
+        response = self._ask(self._question_prompt(plan_context, question), PRIORITY_INTERACTIVE)
+        return response or (self._question_fallback(question) if fallback else None)
+
+    def answer_questions(self, plan_context, questions):
+        """One background call answering several questions; returns {question: answer} for those answered."""
+        numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+        prompt = (
+            f"Context: {str(plan_context)[:5000]}\n"
+            f"Answer each question briefly (2-3 sentences). Output ONLY JSON mapping the question number "
+            f"to its answer, e.g. {{\"1\": \"...\"}}.\nQuestions:\n{numbered}"
+        )
+        data = extract_json(self._ask(prompt, PRIORITY_BACKGROUND) or "")
+        if not isinstance(data, dict):
+            return {}
+        return {q: str(data[str(i)]).strip() for i, q in enumerate(questions, 1) if data.get(str(i))}
+
+    def summarize_conversation(self, summary, exchange, max_words=120):
+        """Folds one chat exchange into the running summary (background priority); None on failure."""
+        prompt = (
+            f"Running summary of a travel chat:\n{summary or '(empty)'}\n\nNew exchange:\n{exchange}\n\n"
+            f"Rewrite the summary to include the new exchange in at most {max_words} words. Keep the traveller's "
+            f"constraints, preferences and decisions; drop small talk. Output only the summary."
+        )
+        response = self._ask(prompt, PRIORITY_BACKGROUND)
+        return response.strip() if response and response.strip() else None
+
+    def stream_question(self, plan_context, question):
+        return self._ask_stream(self._question_prompt(plan_context, question), self._question_fallback(question))
 
     def generate_packing_list(self, plan_context, user_profile, list_type):
-        response = self._ask(f"Create a {list_type} packing list for: {str(plan_context)[:3000]}")
+        response = self._ask(f"Create a {list_type} packing list for: {str(plan_context)[:3000]}", PRIORITY_BACKGROUND)
         return response or "### 🎒 Essentials\n* Passport & ID\n* Sunscreen & Sunglasses\n* Reusable Water Bottle\n* Comfortable Walking Shoes"
 
+    def _story_prompt(self, plan_context, user_name):
+        return f"Write a story for {user_name} based on: {str(plan_context)[:3000]}"
+
+    def _story_fallback(self, user_name):
+        return f"### An Eco-Adventure for {user_name}\n\nThe journey began under the bright sun of Dubai. From the bustling souks to the quiet mangroves, every moment was a step towards sustainable discovery..."
+
     def generate_story(self, plan_context, user_name):
-        response = self._ask(f"Write a story for {user_name} based on: {str(plan_context)[:3000]}")
-        return response or f"### An Eco-Adventure for {user_name}\n\nThe journey began under the bright sun of Dubai. From the bustling souks to the quiet mangroves, every moment was a step towards sustainable discovery..."
+        response = self._ask(self._story_prompt(plan_context, user_name), PRIORITY_BACKGROUND)
+        return response or self._story_fallback(user_name)
+
+    def stream_story(self, plan_context, user_name):
+        return self._ask_stream(self._story_prompt(plan_context, user_name), self._story_fallback(user_name), PRIORITY_BACKGROUND)
 
     def get_upgrade_suggestions(self, plan_context, user_profile, rag_data):
-        response = self._ask(f"Suggest 3 upgrades for: {str(plan_context)[:3000]}")
+        response = self._ask(f"Suggest 3 upgrades for: {str(plan_context)[:3000]}", PRIORITY_BACKGROUND)
         return response or "* **Upgrade Hotel:** Switch to a 5-star Eco Resort.\n* **Private Tour:** Book a private guided mangrove tour.\n* **Fine Dining:** Try a farm-to-table dinner experience."
         
@@ -0,0 +1,255 @@
+"""
+Resumable, concurrent batch planner.
+
+    python -m backend.batch_planner trips.jsonl --out plans.jsonl --concurrency 16 --rpm 600
+
+Each input line is a TripRequest (utils/schemas) plus an optional "id".
+Results stream to --out as they finish; <out>.ckpt records every finished id
+so an interrupted run resumes where it stopped. Failed ids are retried on the
+next run. Per-item timings and a summary go to <out>.stats.json.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import numpy as np
+from pydantic import ValidationError
+from backend.trip_planner import build_trip_query, retrieve_candidates_batch, generate_itinerary
+from backend.llm_scheduler import TokenBucket
+from utils.schemas import TripRequest
+from utils.profile import load_profile
+from utils.logger import logger
+
+
+# -----------------------------------------
+# Input / checkpoint
+# -----------------------------------------
+def read_requests(path: str) -> Iterator[Tuple[str, Optional[TripRequest], Optional[str]]]:
+    """Yields (id, request, error) per non-empty input line."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                raw = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield f"line-{line_no}", None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(raw, dict):
+                yield f"line-{line_no}", None, f"Invalid request: expected a JSON object, got {type(raw).__name__}"
+                continue
+            item_id = str(raw.get("id") or raw.get("request_id") or f"line-{line_no}")
+            try:
+                request = TripRequest(**raw)
+            except ValidationError as e:
+                yield item_id, None, f"Invalid request: {e.errors()[0].get('msg')}"
+            except TypeError as e:
+                yield item_id, None, f"Invalid request: {e}"
+            else:
+                yield item_id, request, None
+
+
+def load_finished_ids(out_path: str, ckpt_path: str) -> Set[str]:
+    """Ids that already have a successful result (checkpoint + output file)."""
+    done: Set[str] = set()
+    if os.path.exists(ckpt_path):
+        with open(ckpt_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line after a crash
+                if entry.get("status") == "ok":
+                    done.add(entry["id"])
+    if os.path.exists(out_path):
+        # Covers a crash between writing the result and its checkpoint line
+        with open(out_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["id"])
+                except (json.JSONDecodeError, KeyError):
+                    continue
+    return done
+
+
+# -----------------------------------------
+# Runner
+# -----------------------------------------
+class BatchPlanner:
+    def __init__(self, agent, rag, out_path: str, concurrency: int = 8, rpm: float = 0,
+                 retrieval_batch: int = 64, retries: int = 2, top_k: int = 20) -> None:
+        self.agent = agent
+        self.rag = rag
+        self.out_path = out_path
+        self.ckpt_path = out_path + ".ckpt"
+        self.stats_path = out_path + ".stats.json"
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rpm)
+        self.retrieval_batch = retrieval_batch
+        self.retries = retries
+        self.top_k = top_k
+        self.timings: List[Dict[str, Any]] = []
+        self.counts: Dict[str, int] = defaultdict(int)
+        self._write_lock = threading.Lock()
+
+    def _record(self, out_f, ckpt_f, item_id: str, status: str, timing: Dict[str, float],
+                itinerary: Optional[Dict[str, Any]] = None, request: Optional[TripRequest] = None,
+                error: Optional[str] = None) -> None:
+        with self._write_lock:
+            if status == "ok":
+                out_f.write(json.dumps({"id": item_id, "request": request.model_dump(), "itinerary": itinerary}, default=str) + "\n")
+                out_f.flush()
+            ckpt_f.write(json.dumps({"id": item_id, "status": status, "error": error, **timing}) + "\n")
+            ckpt_f.flush()
+            self.counts[status] += 1
+            self.timings.append({"id": item_id, "status": status, **timing})
+
+    def _generate(self, item_id: str, req: TripRequest, query: str, candidates: List[Dict[str, Any]],
+                  retrieval_ms: float) -> Tuple[str, str, Dict[str, float], Optional[Dict[str, Any]], Optional[str]]:
+        start = time.perf_counter()
+        if not candidates:
+            return item_id, "failed", {"retrieval_ms": retrieval_ms, "generation_ms": 0.0}, None, "No candidates found"
+
+        user_profile = load_profile(req.user_name)
+        user_profile["name"] = req.user_name
+        error = None
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                itinerary = generate_itinerary(
+                    self.agent, query, candidates, strict=True,
+                    budget=req.budget, interests=req.interests, days=req.days, location=req.location,
+                    travelers=req.travelers, user_profile=user_profile, priorities=req.priorities.model_dump(),
+                )
+                timing = {"retrieval_ms": retrieval_ms, "generation_ms": (time.perf_counter() - start) * 1000, "attempts": attempt + 1}
+                return item_id, "ok", timing, itinerary, None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                logger.warning(f"Batch item {item_id} attempt {attempt + 1} failed: {error}")
+                if attempt < self.retries:
+                    time.sleep(min(30, 2 ** attempt))
+        timing = {"retrieval_ms": retrieval_ms, "generation_ms": (time.perf_counter() - start) * 1000, "attempts": self.retries + 1}
+        return item_id, "failed", timing, None, error
+
+    def _retrieve(self, chunk: List[Tuple[str, TripRequest]]) -> Tuple[Dict[str, str], Dict[str, List[Dict[str, Any]]], float]:
+        """One batched retrieval per distinct min_eco_score in the chunk; identical queries are searched once."""
+        start = time.perf_counter()
+        queries = {item_id: req.query or build_trip_query(req.days, req.location, req.travelers, req.interests)
+                   for item_id, req in chunk}
+        by_eco: Dict[float, List[str]] = defaultdict(list)
+        for item_id, req in chunk:
+            if queries[item_id] not in by_eco[req.min_eco_score]:
+                by_eco[req.min_eco_score].append(queries[item_id])
+
+        found: Dict[Tuple[float, str], List[Dict[str, Any]]] = {}
+        for min_eco, unique_queries in by_eco.items():
+            for q, res in zip(unique_queries, retrieve_candidates_batch(self.rag, unique_queries, min_eco, self.top_k,
+                                                                      with_vectors=True)):
+                found[(min_eco, q)] = res
+
+        candidates = {item_id: found[(req.min_eco_score, queries[item_id])] for item_id, req in chunk}
+        per_item_ms = (time.perf_counter() - start) * 1000 / max(1, len(chunk))
+        return queries, candidates, per_item_ms
+
+    def run(self, input_path: str) -> Dict[str, Any]:
+        done = load_finished_ids(self.out_path, self.ckpt_path)
+        started = time.perf_counter()
+        with open(self.out_path, "a", encoding="utf-8") as out_f, \
+                open(self.ckpt_path, "a", encoding="utf-8") as ckpt_f, \
+                ThreadPoolExecutor(self.concurrency, thread_name_prefix="batch-llm") as pool:
+            pending = set()
+            chunk: List[Tuple[str, TripRequest]] = []
+
+            def drain(limit: int) -> None:
+                nonlocal pending
+                while len(pending) > limit:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        item_id, status, timing, itinerary, error = fut.result()
+                        self._record(out_f, ckpt_f, item_id, status, timing, itinerary, requests_by_id.pop(item_id), error)
+
+            def flush_chunk() -> None:
+                if not chunk:
+                    return
+                queries, candidates, retrieval_ms = self._retrieve(chunk)
+                for item_id, req in chunk:
+                    requests_by_id[item_id] = req
+                    pending.add(pool.submit(self._generate, item_id, req, queries[item_id], candidates[item_id], retrieval_ms))
+                chunk.clear()
+                # Keep at most ~2 chunks in flight so memory stays bounded
+                drain(max(self.concurrency, self.retrieval_batch))
+
+            requests_by_id: Dict[str, TripRequest] = {}
+            try:
+                for item_id, req, error in read_requests(input_path):
+                    if item_id in done:
+                        self.counts["skipped"] += 1
+                        continue
+                    if error:
+                        self._record(out_f, ckpt_f, item_id, "invalid", {}, error=error)
+                        continue
+                    done.add(item_id)  # duplicate ids in the input are planned once
+                    chunk.append((item_id, req))
+                    if len(chunk) >= self.retrieval_batch:
+                        flush_chunk()
+                flush_chunk()
+                drain(0)
+            except KeyboardInterrupt:
+                print("\n⏸️ Interrupted — finishing in-flight items. Re-run the same command to resume.")
+                # Not-yet-started items are dropped (no checkpoint line → planned on resume)
+                pending = {fut for fut in pending if not fut.cancel()}
+                drain(0)
+
+        return self._write_stats(time.perf_counter() - started)
+
+    def _write_stats(self, elapsed_s: float) -> Dict[str, Any]:
+        gen = np.array([t["generation_ms"] for t in self.timings if t["status"] == "ok"] or [0.0])
+        ret = np.array([t["retrieval_ms"] for t in self.timings if "retrieval_ms" in t] or [0.0])
+        stats = {
+            "counts": dict(self.counts),
+            "elapsed_s": round(elapsed_s, 2),
+            "items_per_sec": round(self.counts.get("ok", 0) / elapsed_s, 3) if elapsed_s else None,
+            "generation_ms": {"p50": round(float(np.percentile(gen, 50)), 1), "p95": round(float(np.percentile(gen, 95)), 1)},
+            "retrieval_ms": {"p50": round(float(np.percentile(ret, 50)), 2), "p95": round(float(np.percentile(ret, 95)), 2)},
+            "items": self.timings,
+        }
+        with open(self.stats_path, "w", encoding="utf-8") as f:
+            json.dump(stats, f, indent=2)
+        return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch-generate itineraries from a JSONL file of trip requests")
+    parser.add_argument("input", help="JSONL file, one TripRequest per line (optional 'id')")
+    parser.add_argument("--out", default="plans.jsonl", help="Output JSONL (appended; <out>.ckpt is the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel LLM calls")
+    parser.add_argument("--rpm", type=float, default=0, help="LLM requests per minute (0 = unlimited)")
+    parser.add_argument("--retrieval-batch", type=int, default=64, help="Requests per batched retrieval")
+    parser.add_argument("--retries", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    from backend.agent_workflow import AgentWorkflow
+    from backend.rag_engine import RAGEngine
+
+    planner = BatchPlanner(AgentWorkflow(), RAGEngine(), args.out, concurrency=args.concurrency, rpm=args.rpm,
+                           retrieval_batch=args.retrieval_batch, retries=args.retries)
+    stats = planner.run(args.input)
+    print(f"✅ ok={stats['counts'].get('ok', 0)} failed={stats['counts'].get('failed', 0)} "
+          f"invalid={stats['counts'].get('invalid', 0)} skipped={stats['counts'].get('skipped', 0)} "
+          f"| {stats['items_per_sec']} items/s | gen p50={stats['generation_ms']['p50']}ms p95={stats['generation_ms']['p95']}ms")
+    print(f"📄 Results: {args.out}  📊 Stats: {planner.stats_path}")
+    return 0 if not stats["counts"].get("failed") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
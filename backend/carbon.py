@@ -0,0 +1,173 @@
+"""
+Deterministic carbon and sustainability metrics.
+
+Trip metrics are computed from catalog data instead of being invented by the
+LLM. Activities are flattened into arrays (one row per item, tagged with
+its itinerary) and emissions are computed in NumPy. np.bincount then sums
+them per itinerary, so a batch of plans costs the same few array operations
+as one.
+
+Emissions in kg CO2e:
+- hotel: HOTEL_NIGHT_KG per room-night. Nights are split across the plan's
+  hotels; rooms are (travelers + 1) // 2, as in utils/cost.py.
+- activities, places, food...: ITEM_KG by data_type, per traveler.
+- ground travel: route km (backend/geo.py day loops, or DEFAULT_DAILY_KM a
+  day) x travelers x the mean factor of the plan's transport modes.
+Each item factor is scaled by its eco_score: x1.0 at 5/10, x0.5 at 10/10.
+data_type and eco_score come from the catalog row of the same name
+(attach_catalog_fields); the model's values are used only for unmatched items.
+The baseline is the same trip at eco 5 travelling by petrol car.
+carbon_saved is the baseline minus the trip's emissions.
+"""
+import re
+import math
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from backend.geo import plan_routes
+
+HOTEL_NIGHT_KG = 31.0
+ITEM_KG = {"Activity": 6.0, "Place": 1.5, "Food": 3.5, "Nightlife": 2.5, "Shopping": 1.0}
+DEFAULT_ITEM_KG = 2.0
+DEFAULT_DAILY_KM = 25.0
+BASELINE_KM_FACTOR = 0.17  # petrol car / taxi, kg per passenger-km
+OFFSET_USD_PER_TONNE = 15.0  # typical price of a verified nature-based offset
+# kg per passenger-km, first match wins
+TRANSPORT_MODES = [
+    ("walk", r"\bwalk", 0.0),
+    ("bike", r"\bbike|cycl", 0.005),
+    ("scooter", r"scooter", 0.035),
+    ("rail", r"metro|tram|train|rail", 0.035),
+    ("ev_bus", r"(e-|electric |eco |ev )bus", 0.03),
+    ("bus", r"\bbus", 0.09),
+    ("ev_car", r"\bev\b|electric|hybrid", 0.06),
+    ("car", r"taxi|car|cab", BASELINE_KM_FACTOR),
+]
+WASTE_TERMS = re.compile(r"zero[- ]waste|plastic|refill|compost|organic|plant[- ]based|recycl|local", re.IGNORECASE)
+_TYPES = ["Hotel", "Transport"] + list(ITEM_KG)
+_TYPE_CODE = {t: i for i, t in enumerate(_TYPES)}
+_MODE_PATTERNS = [(name, re.compile(pattern, re.IGNORECASE), factor) for name, pattern, factor in TRANSPORT_MODES]
+CATALOG_FIELDS = ("data_type", "eco_score")  # metric inputs taken from the catalog, never from the model
+
+
+def attach_catalog_fields(activities: List[Dict[str, Any]], candidates: Sequence[Dict[str, Any]]) -> None:
+    """Overwrites CATALOG_FIELDS on itinerary activities with those of the first candidate of the same name."""
+    known: Dict[str, Dict[str, Any]] = {}
+    for c in candidates:
+        known.setdefault(str(c.get("name", "")).strip().lower(), c)
+    for activity in activities:
+        row = known.get(str(activity.get("name", "")).strip().lower()) if isinstance(activity, dict) else None
+        if row is None:
+            continue
+        for field in CATALOG_FIELDS:
+            if row.get(field) is not None:
+                activity[field] = row[field]
+
+
+def transport_factor(item: Dict[str, Any]) -> float:
+    """kg CO2e per passenger-km for a transport item, from its name / description."""
+    text = f"{item.get('name', '')} {item.get('description', '')}"
+    return next((factor for _, pattern, factor in _MODE_PATTERNS if pattern.search(text)), BASELINE_KM_FACTOR)
+
+
+def _number(value: Any, default: float) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if math.isnan(value) else value
+
+
+def compute_metrics_batch(itineraries: Sequence[Dict[str, Any]], days: Sequence[int], travelers: Sequence[int],
+                          route_km: Optional[Sequence[float]] = None) -> List[Dict[str, Any]]:
+    """
+    Metrics for many itineraries at once (same order as the input). route_km skips the per-plan
+    routing (most of the cost) when the callers already know each trip's ground distance.
+    """
+    n = len(itineraries)
+    owner, kind, eco, factor, waste = [], [], [], [], []
+    known_km = route_km
+    route_km = np.zeros(n)
+    for i, itinerary in enumerate(itineraries):
+        activities = [a for a in itinerary.get("activities") or [] if isinstance(a, dict)]
+        for a in activities:
+            owner.append(i)
+            kind.append(_TYPE_CODE.get(a.get("data_type"), -1))
+            eco.append(_number(a.get("eco_score"), 5.0))
+            factor.append(transport_factor(a) if a.get("data_type") == "Transport" else 0.0)
+            waste.append(bool(WASTE_TERMS.search(f"{a.get('name', '')} {a.get('description', '')} {a.get('tag') or ''}")))
+        if known_km is not None:
+            route_km[i] = known_km[i]
+            continue
+        routes = plan_routes(activities, days[i])
+        route_km[i] = sum(r["km"] for r in routes) if routes else DEFAULT_DAILY_KM * max(1, days[i])
+
+    owner = np.asarray(owner, dtype=np.int64)
+    kind = np.asarray(kind, dtype=np.int64)
+    eco = np.clip(np.asarray(eco, dtype=np.float64), 0, 10)
+    factor = np.asarray(factor, dtype=np.float64)
+    waste = np.asarray(waste, dtype=np.float64)
+    days_arr = np.maximum(1, np.asarray(days, dtype=np.float64))
+    pax = np.maximum(1, np.asarray(travelers, dtype=np.float64))
+    rooms = np.floor((pax + 1) / 2)
+
+    def per_trip(values: np.ndarray, mask: Any = True) -> np.ndarray:
+        return np.bincount(owner, weights=np.where(mask, values, 0.0), minlength=n)
+
+    is_hotel = kind == _TYPE_CODE["Hotel"]
+    is_transport = kind == _TYPE_CODE["Transport"]
+    base_kg = np.array([HOTEL_NIGHT_KG, 0.0] + list(ITEM_KG.values()))[kind] if len(kind) else np.zeros(0)
+    base_kg[kind < 0] = DEFAULT_ITEM_KG
+    scale = 1.5 - eco / 10.0                                  # 1.0 at eco 5, 0.5 at eco 10
+
+    hotels = per_trip(np.ones(len(kind)), is_hotel)
+    nights = (days_arr * rooms / np.maximum(hotels, 1))[owner] if len(owner) else np.zeros(0)
+    units = np.where(is_hotel, nights, pax[owner] if len(owner) else 0)
+    stay_kg = per_trip(base_kg * scale * units)
+    stay_baseline = per_trip(base_kg * units)
+
+    modes = per_trip(np.ones(len(kind)), is_transport)
+    km_factor = np.where(modes > 0, per_trip(factor, is_transport) / np.maximum(modes, 1), BASELINE_KM_FACTOR)
+    travel_kg = route_km * pax * km_factor
+    travel_baseline = route_km * pax * BASELINE_KM_FACTOR
+
+    footprint = stay_kg + travel_kg
+    baseline = stay_baseline + travel_baseline
+    counted = per_trip(np.ones(len(kind)), ~is_transport)
+    weights = np.where(is_hotel, days_arr[owner] if len(owner) else 0, 1.0)
+    eco_score = per_trip(eco * weights) / np.maximum(per_trip(weights), 1e-9)
+    waste_share = per_trip(waste, ~is_transport) / np.maximum(counted, 1)
+    waste_score = np.clip(np.round((eco_score - 5) * 1.2 + 4 * waste_share), 0, 10)
+
+    return [
+        {
+            "eco_score": round(float(eco_score[i]), 1),
+            "carbon_footprint_kg": round(float(footprint[i]), 1),
+            "carbon_baseline_kg": round(float(baseline[i]), 1),
+            "carbon_saved_kg": round(float(max(0.0, baseline[i] - footprint[i])), 1),
+            "carbon_saved": f"{max(0.0, baseline[i] - footprint[i]):.0f}kg",
+            "waste_free_score": int(waste_score[i]),
+            "travel_km": round(float(route_km[i]), 1),
+        }
+        for i in range(n)
+    ]
+
+
+def compute_metrics(itinerary: Dict[str, Any], days: int = 3, travelers: int = 1) -> Dict[str, Any]:
+    return compute_metrics_batch([itinerary], [days], [travelers])[0]
+
+
+def offset_suggestion(metrics: Dict[str, Any]) -> str:
+    """carbon_offset_suggestion text quoting the computed figures (the LLM does not write numbers here)."""
+    footprint = metrics["carbon_footprint_kg"]
+    cost = max(1.0, footprint / 1000 * OFFSET_USD_PER_TONNE)
+    saved = f", {metrics['carbon_saved_kg']:.0f}kg less than the same trip by car" if metrics["carbon_saved_kg"] >= 1 else ""
+    return (f"This trip emits about {footprint:.0f}kg CO2e{saved}. Offsetting it costs about ${cost:.0f} "
+            f"through a verified project such as mangrove restoration.")
+
+
+def apply_metrics(itinerary: Dict[str, Any], days: int = 3, travelers: int = 1) -> Dict[str, Any]:
+    """Overwrites the itinerary's sustainability fields and offset suggestion with computed values (in place)."""
+    if itinerary.get("activities"):
+        metrics = compute_metrics(itinerary, days, travelers)
+        itinerary.update(metrics, carbon_offset_suggestion=offset_suggestion(metrics))
+    return itinerary
@@ -0,0 +1,285 @@
+"""
+Binary columnar snapshot of the CSV catalog.
+
+    python -m backend.catalog_snapshot            # compile data/*.csv -> data/snapshot/<version>/
+
+Layout of a snapshot directory:
+    manifest.json                 version, row count, source signatures, column kinds
+    <col>.npy                     numeric columns (float32, NaN = missing)
+    <col>.codes.npy               dictionary-encoded columns (int32 codes; values in the manifest)
+    <col>.heap / <col>.offsets.npy   string columns (utf-8 bytes + int64 offsets, n + 1)
+
+Everything is opened with mmap, so loading is O(1) regardless of catalog size
+and every worker process shares the same pages through the OS page cache.
+The snapshot is recompiled in the background when a source CSV changes.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import numpy as np
+import pandas as pd
+from utils.logger import logger
+from backend.catalog_store import (
+    CatalogStore, NUMERIC_COLUMNS, DICT_COLUMNS, STRING_COLUMNS, encode_strings,
+)
+from backend.ingest import iter_records
+
+DATA_DIR: str = os.path.join(BASE_DIR, "data")
+SNAPSHOT_DIRNAME = "snapshot"
+SNAPSHOT_FORMAT = 3
+CHUNK_ROWS = 100_000
+SNAPSHOT_CHECK_S = float(os.getenv("SNAPSHOT_CHECK_S", "2"))  # how often get_snapshot re-stats the CSVs
+
+
+
+# -----------------------------------------
+# Compile
+# -----------------------------------------
+def _source_files(data_dir: str) -> List[str]:
+    return sorted(f for f in os.listdir(data_dir) if f.endswith(".csv"))
+
+
+def source_signature(data_dir: str) -> Dict[str, List[int]]:
+    """filename -> [size, mtime_ns]; cheap staleness check without reading the files."""
+    out = {}
+    for filename in _source_files(data_dir):
+        st = os.stat(os.path.join(data_dir, filename))
+        out[filename] = [st.st_size, st.st_mtime_ns]
+    return out
+
+
+def _content_version(data_dir: str) -> str:
+    digest = hashlib.sha1(f"format={SNAPSHOT_FORMAT}".encode())
+    for filename in _source_files(data_dir):
+        digest.update(filename.encode())
+        with open(os.path.join(data_dir, filename), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def compile_snapshot(data_dir: str = DATA_DIR, out_root: Optional[str] = None) -> str:
+    """Compiles data_dir/*.csv into out_root/<version>/ and points out_root/CURRENT at it."""
+    out_root = out_root or os.path.join(data_dir, SNAPSHOT_DIRNAME)
+    os.makedirs(out_root, exist_ok=True)
+    signature = source_signature(data_dir)
+    version = _content_version(data_dir)
+    final_dir = os.path.join(out_root, version)
+
+    if not os.path.exists(os.path.join(final_dir, "manifest.json")):
+        tmp_dir = os.path.join(out_root, f".{version}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        start = time.perf_counter()
+
+        numeric: Dict[str, List[np.ndarray]] = {c: [] for c in NUMERIC_COLUMNS}
+        codes: Dict[str, List[np.ndarray]] = {c: [] for c in DICT_COLUMNS}
+        dictionaries: Dict[str, Dict[str, int]] = {c: {} for c in DICT_COLUMNS}
+        offsets: Dict[str, List[np.ndarray]] = {c: [] for c in STRING_COLUMNS}
+        heap_sizes = {c: 0 for c in STRING_COLUMNS}
+        heaps = {c: open(os.path.join(tmp_dir, f"{c}.heap"), "wb") for c in STRING_COLUMNS}
+        rows = 0
+        stats: Dict[str, Any] = {}
+        try:
+            # same normalize / validate / dedupe pipeline as backend/ingest.py
+            for _, chunk in iter_records([os.path.join(data_dir, f) for f in signature], CHUNK_ROWS, stats=stats):
+                for col in NUMERIC_COLUMNS:
+                    numeric[col].append(chunk[col].to_numpy(dtype=np.float32))
+                for col in DICT_COLUMNS:
+                    local_codes, uniques = pd.factorize(chunk[col], sort=False)
+                    mapping = dictionaries[col]
+                    remap = np.array([mapping.setdefault(u, len(mapping)) for u in uniques], dtype=np.int32)
+                    codes[col].append(remap[local_codes] if len(remap) else local_codes.astype(np.int32))
+                for col in STRING_COLUMNS:
+                    col_offsets, heap = encode_strings(chunk[col], base=heap_sizes[col])
+                    offsets[col].append(col_offsets[1:])
+                    heap_sizes[col] += len(heap)
+                    heaps[col].write(heap)
+                rows += len(chunk)
+        finally:
+            for f in heaps.values():
+                f.close()
+        if stats.get("failed_sources"):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise ValueError(f"Catalog sources could not be read: {stats['failed_sources']}")
+
+        for col in NUMERIC_COLUMNS:
+            np.save(os.path.join(tmp_dir, f"{col}.npy"), np.concatenate(numeric[col]) if rows else np.zeros(0, np.float32))
+        for col in DICT_COLUMNS:
+            np.save(os.path.join(tmp_dir, f"{col}.codes.npy"), np.concatenate(codes[col]) if rows else np.zeros(0, np.int32))
+        for col in STRING_COLUMNS:
+            np.save(os.path.join(tmp_dir, f"{col}.offsets.npy"), np.concatenate([np.zeros(1, np.int64)] + offsets[col]))
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "rows": rows,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sources": signature,
+            "numeric": list(NUMERIC_COLUMNS),
+            "dict": {c: list(dictionaries[c]) for c in DICT_COLUMNS},
+            "strings": list(STRING_COLUMNS),
+        }
+        with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        try:
+            os.replace(tmp_dir, final_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # another worker compiled the same version first
+        skipped = sum(stats.get("rejected", {}).values()) + stats.get("duplicates", 0)
+        logger.info(f"Catalog snapshot {version}: {rows} rows compiled in {time.perf_counter() - start:.2f}s"
+                    + (f" ({skipped} invalid or duplicate rows skipped)" if skipped else ""))
+
+    _write_current(out_root, version, signature)
+    _prune(out_root, keep=version)
+    return final_dir
+
+
+def _write_current(out_root: str, version: str, signature: Dict[str, List[int]]) -> None:
+    tmp = os.path.join(out_root, f".CURRENT.tmp-{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "sources": signature}, f)
+    os.replace(tmp, os.path.join(out_root, "CURRENT"))
+
+
+def _prune(out_root: str, keep: str, max_age_s: float = 3600) -> None:
+    """Removes old versions (after a grace period, since other workers may still map them)."""
+    now = time.time()
+    for name in os.listdir(out_root):
+        path = os.path.join(out_root, name)
+        if name == keep or name == "CURRENT" or not os.path.isdir(path):
+            continue
+        if now - os.path.getmtime(path) > max_age_s:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# -----------------------------------------
+# Read (mmap)
+# -----------------------------------------
+class CatalogSnapshot(CatalogStore):
+    """A CatalogStore whose columns are memory-mapped from a compiled snapshot directory."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.version: str = self.manifest["version"]
+        super().__init__(
+            numeric={c: self._load(f"{c}.npy") for c in self.manifest["numeric"]},
+            codes={c: self._load(f"{c}.codes.npy") for c in self.manifest["dict"]},
+            dictionaries=self.manifest["dict"],
+            offsets={c: self._load(f"{c}.offsets.npy") for c in self.manifest["strings"]},
+            heaps={c: self._heap(c) for c in self.manifest["strings"]},
+        )
+        self.rows = self.manifest["rows"]
+
+    def _load(self, filename: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, filename), mmap_mode="r")
+
+    def _heap(self, col: str) -> np.ndarray:
+        path = os.path.join(self.path, f"{col}.heap")
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=np.uint8)  # mmap cannot map an empty file
+        return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+_snapshots: Dict[str, CatalogSnapshot] = {}
+_checked: Dict[str, float] = {}  # data_dir -> monotonic time of the last staleness check
+_failed: Dict[str, Optional[Dict[str, List[int]]]] = {}  # data_dir -> source signature a compile failed on
+_compiling: Dict[str, Future] = {}  # data_dir -> running compile
+_compile_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-compile")
+_snapshot_lock = threading.Lock()
+
+
+def _current_version(out_root: str, signature: Dict[str, List[int]]) -> Optional[str]:
+    """Version CURRENT points at, if it was compiled from the CSVs as they are now."""
+    try:
+        with open(os.path.join(out_root, "CURRENT"), "r", encoding="utf-8") as f:
+            current = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if current.get("sources") != signature:
+        return None
+    return current["version"] if os.path.exists(os.path.join(out_root, current["version"], "manifest.json")) else None
+
+
+def _compile(data_dir: str, out_root: str, signature: Dict[str, List[int]]) -> Optional[CatalogSnapshot]:
+    """Compiles and swaps in a new snapshot; remembers the signature of a failed compile."""
+    try:
+        snapshot = CatalogSnapshot(compile_snapshot(data_dir, out_root))
+    except Exception as e:
+        logger.error(f"Catalog snapshot compile failed for {data_dir}: {e}")
+        with _snapshot_lock:
+            _failed[data_dir] = signature
+        return None
+    with _snapshot_lock:
+        _snapshots[data_dir] = snapshot
+        _failed.pop(data_dir, None)
+    return snapshot
+
+
+def get_snapshot(data_dir: str = DATA_DIR, auto_compile: bool = True) -> Optional[CatalogSnapshot]:
+    """
+    Process-wide mmap'd snapshot for data_dir; None when there is none yet and it cannot be built.
+    The CSVs are stat'ed at most every SNAPSHOT_CHECK_S seconds. A changed CSV is recompiled on one
+    background thread while callers keep the previous snapshot; only a cold start waits for the
+    compile. A failed compile is not retried until a CSV changes again.
+    """
+    out_root = os.path.join(data_dir, SNAPSHOT_DIRNAME)
+    with _snapshot_lock:
+        cached = _snapshots.get(data_dir)
+        now = time.monotonic()
+        if now - _checked.get(data_dir, float("-inf")) < SNAPSHOT_CHECK_S and (cached is not None or data_dir in _failed):
+            return cached
+        _checked[data_dir] = now
+        try:
+            signature = source_signature(data_dir)
+            version = _current_version(out_root, signature)
+            if cached is not None and cached.version == version:
+                return cached
+            if version is not None:  # compiled by another process
+                _snapshots[data_dir] = CatalogSnapshot(os.path.join(out_root, version))
+                _failed.pop(data_dir, None)
+                return _snapshots[data_dir]
+        except Exception as e:
+            logger.error(f"Catalog snapshot unavailable for {data_dir}: {e}")
+            _failed[data_dir] = None
+            return cached
+        if not auto_compile:
+            return None
+        if _failed.get(data_dir) == signature:
+            return cached
+        future = _compiling.get(data_dir)
+        if future is None or future.done():
+            future = _compile_pool.submit(_compile, data_dir, out_root, signature)
+            _compiling[data_dir] = future
+    return cached if cached is not None else future.result()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compile data/*.csv into a memory-mapped columnar snapshot")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--out", default=None, help="Snapshot root (default: <data-dir>/snapshot)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    path = compile_snapshot(args.data_dir, args.out)
+    snapshot = CatalogSnapshot(path)
+    print(f"✅ Snapshot {snapshot.version}: {len(snapshot)} rows -> {path} ({time.perf_counter() - start:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Struct-of-arrays catalog store.
+
+Each column lives in one typed array: float32 for numeric fields, int32 codes
+plus a small value list for low-cardinality fields, and a utf-8 heap with
+int64 offsets for free text. Rows are handed out as `RowView`s (two slots: store +
+index) that read fields lazily, so filtering, ranking and cost maths run on
+the arrays. A dict or `Activity` is built only for the few rows that reach the
+prompt or the UI.
+"""
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+import numpy as np
+import pandas as pd
+
+NUMERIC_COLUMNS = ("eco_score", "cost", "avg_rating", "lat", "lon")
+DICT_COLUMNS = ("location", "data_type", "cost_type", "tag")
+STRING_COLUMNS = ("name", "description", "image_url")
+PRICE_COLUMNS = ("price_per_night", "price", "entry_fee")  # whichever the source has becomes `cost`
+RECORD_COLUMNS = STRING_COLUMNS[:1] + DICT_COLUMNS + STRING_COLUMNS[1:] + NUMERIC_COLUMNS  # the one record schema
+NUMERIC_DEFAULTS = {"eco_score": 5.0, "cost": 0.0}
+DATA_TYPES = ("Hotel", "Activity", "Place", "Food", "Nightlife", "Shopping", "Transport")
+# source spellings -> canonical cost_type. "free" is a price rather than a billing unit: it sets cost to 0
+# and the row gets its type's default cost_type, like any unknown spelling
+COST_TYPES = {"per_night": "per_night", "per night": "per_night", "nightly": "per_night",
+              "one_time": "one_time", "one time": "one_time", "once": "one_time"}
+ROW_DEFAULTS = {"image_url": "https://placehold.co/600x400?text=No+Image"}
+
+
+class RowView(Mapping):
+    """Read-only mapping over one catalog row; nothing is copied until to_dict()/to_activity()."""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "CatalogStore", index: int) -> None:
+        self.store = store
+        self.index = index
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.store.columns:
+            raise KeyError(key)
+        value = self.store.value(key, self.index)
+        return ROW_DEFAULTS.get(key) if value is None and key in ROW_DEFAULTS else value
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.columns)
+
+    def __len__(self) -> int:
+        return len(self.store.columns)
+
+    def __repr__(self) -> str:
+        return f"RowView({self.index}, name={self.store.value('name', self.index)!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self[key] for key in self.store.columns}
+
+    def to_activity(self):
+        from utils.schemas import Activity
+        data = self.to_dict()
+        return Activity(**{k: v for k, v in data.items() if v is not None})
+
+
+class CatalogStore:
+    def __init__(self, numeric: Dict[str, np.ndarray], codes: Dict[str, np.ndarray], dictionaries: Dict[str, List[str]],
+                 offsets: Dict[str, np.ndarray], heaps: Dict[str, np.ndarray]) -> None:
+        self.numeric = numeric
+        self.codes = codes
+        self.dictionaries = dictionaries
+        self.offsets = offsets
+        self.heaps = heaps
+        self.columns = tuple(offsets) + tuple(codes) + tuple(numeric)
+        self.rows = len(next(iter(numeric.values()))) if numeric else 0
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CatalogStore":
+        """Packs a catalog DataFrame (CSV rows or payloads) into typed columns."""
+        df = normalize_frame(df.copy())
+        codes, dictionaries, offsets, heaps = {}, {}, {}, {}
+        for col in DICT_COLUMNS:
+            col_codes, uniques = pd.factorize(df[col], sort=False)
+            codes[col] = col_codes.astype(np.int32)
+            dictionaries[col] = [str(u) for u in uniques]
+        for col in STRING_COLUMNS:
+            offsets[col], heap = encode_strings(df[col])
+            heaps[col] = np.frombuffer(heap, dtype=np.uint8)
+        numeric = {c: df[c].to_numpy(dtype=np.float32) for c in NUMERIC_COLUMNS}
+        return cls(numeric, codes, dictionaries, offsets, heaps)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping]) -> "CatalogStore":
+        return cls.from_frame(pd.DataFrame.from_records([dict(r) for r in records]))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def nbytes(self) -> int:
+        arrays = [*self.numeric.values(), *self.codes.values(), *self.offsets.values(), *self.heaps.values()]
+        return int(sum(a.nbytes for a in arrays))
+
+    # -- columns --
+    def dict_code(self, col: str, value: str) -> int:
+        """Code of `value` in a dictionary column (-1 if absent)."""
+        try:
+            return self.dictionaries[col].index(value)
+        except ValueError:
+            return -1
+
+    def mask_in(self, col: str, values: Iterable[str]) -> np.ndarray:
+        """Boolean row mask: dictionary column equals any of `values` (case-insensitive)."""
+        wanted = {v.lower() for v in values}
+        hits = [i for i, v in enumerate(self.dictionaries[col]) if v.lower() in wanted]
+        return np.isin(self.codes[col], hits)
+
+    def mask_contains(self, col: str, substring: str) -> np.ndarray:
+        """Boolean row mask: dictionary column value contains `substring` (case-insensitive)."""
+        substring = substring.lower()
+        hits = [i for i, v in enumerate(self.dictionaries[col]) if substring in v.lower()]
+        return np.isin(self.codes[col], hits)
+
+    def top_k(self, indices: Sequence[int], k: int, by: str = "eco_score", descending: bool = True) -> np.ndarray:
+        """The k best of `indices` by a numeric column (argpartition, then sort only those k)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0 or k <= 0:
+            return indices[:0]
+        values = np.nan_to_num(np.asarray(self.numeric[by][indices], dtype=np.float32), nan=-np.inf)
+        values = -values if descending else values
+        if len(indices) > k:
+            part = np.argpartition(values, k - 1)[:k]
+        else:
+            part = np.arange(len(indices))
+        return indices[part[np.argsort(values[part], kind="stable")]]
+
+    def value(self, col: str, i: int) -> Any:
+        if col in self.numeric:
+            v = float(self.numeric[col][i])
+            return None if np.isnan(v) else round(v, 4)  # float32 -> clean decimal
+        if col in self.codes:
+            return self.dictionaries[col][self.codes[col][i]] or None
+        if col in self.offsets:
+            start, end = self.offsets[col][i], self.offsets[col][i + 1]
+            return bytes(self.heaps[col][start:end]).decode("utf-8") or None
+        raise KeyError(col)
+
+    # -- rows --
+    def view(self, i: int) -> RowView:
+        return RowView(self, int(i))
+
+    def views(self, indices: Iterable[int]) -> List[RowView]:
+        return [RowView(self, int(i)) for i in indices]
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """Materializes one catalog row as a dict (same keys as the CSV fallback payloads)."""
+        return RowView(self, int(i)).to_dict()
+
+    def rows_at(self, indices: Iterable[int]) -> List[Dict[str, Any]]:
+        return [RowView(self, int(i)).to_dict() for i in indices]
+
+
+def materialize(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """Turns RowViews into plain dicts at the prompt / UI boundary (dicts pass through)."""
+    return [r.to_dict() if isinstance(r, RowView) else r for r in rows]
+
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Canonical catalog columns: `cost` from the file's price column (0 when the row is free),
+    typed numerics, clean strings, and data_type / cost_type in their canonical spelling.
+    """
+    cost = pd.to_numeric(df["cost"], errors="coerce") if "cost" in df.columns else pd.Series(np.nan, index=df.index)
+    for col in PRICE_COLUMNS:  # row-wise, so mixed hotel/activity frames keep their own prices
+        if col in df.columns:
+            cost = cost.fillna(pd.to_numeric(df[col], errors="coerce"))
+    raw_cost_type = df["cost_type"].fillna("").astype(str).str.strip().str.lower() if "cost_type" in df.columns else None
+    if raw_cost_type is not None:
+        cost = cost.mask(raw_cost_type == "free", 0.0)
+    df["cost"] = cost
+    for col in NUMERIC_COLUMNS:
+        values = pd.to_numeric(df[col], errors="coerce").astype(np.float64) if col in df.columns else pd.Series(np.nan, index=df.index)
+        df[col] = values.fillna(NUMERIC_DEFAULTS[col]) if col in NUMERIC_DEFAULTS else values
+    for col in DICT_COLUMNS + STRING_COLUMNS:
+        df[col] = df[col].fillna("").astype(str).str.strip() if col in df.columns else ""
+    types = {t.lower(): t for t in DATA_TYPES}
+    df["data_type"] = df["data_type"].str.lower().map(types).fillna(df["data_type"])
+    default_cost_type = np.where(df["data_type"] == "Hotel", "per_night", "one_time")
+    cost_type = raw_cost_type.map(COST_TYPES) if raw_cost_type is not None else pd.Series(np.nan, index=df.index)
+    df["cost_type"] = cost_type.fillna(pd.Series(default_cost_type, index=df.index))
+    return df
+
+
+def encode_strings(values: Iterable[str], base: int = 0):
+    """(offsets, heap bytes) for a string column; offsets has n + 1 entries starting at `base`."""
+    encoded = [s.encode("utf-8") for s in values]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    return np.concatenate([np.array([base], np.int64), base + np.cumsum(lengths)]), b"".join(encoded)
@@ -0,0 +1,197 @@
+"""
+Chat answer cache and precomputed answers for the suggested questions.
+
+Answers are cached per itinerary version (backend/chat_index.py) and
+looked up by normalized question first, then by question-embedding cosine
+similarity (QA_SIMILARITY), or by word overlap when there is no embedder.
+The cache is process-wide, so a user who repeats a question, or a second
+session with the same itinerary, skips the LLM.
+
+As soon as an itinerary exists, its answers to SUGGESTED_QUESTIONS are
+generated in the background with one batched LLM call. A click on a
+suggestion waits up to QA_PRECOMPUTE_WAIT seconds for that call (usually done
+already) and otherwise asks the question directly.
+
+Follow-up answers are cached under the itinerary version plus a digest of the
+conversation they were built on, so they are reused only after the same
+conversation (a rerun, or a second session that asked the same questions).
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from utils.logger import logger
+from backend.chat_index import chat_context, itinerary_version, CHAT_CONTEXT_TOKENS
+from backend.single_flight import make_key
+
+SUGGESTED_QUESTIONS: List[str] = [
+    "Is this place safe at night?",
+    "What are the best local restaurants?",
+    "How do I get around the city?",
+    "What should I pack for the weather?",
+    "Are there any cultural customs I should know?",
+    "What's the best time to visit these attractions?",
+    "Can you suggest alternatives if it rains?",
+    "What are some hidden gems nearby?",
+]
+QA_SIMILARITY: float = float(os.getenv("QA_SIMILARITY", "0.92"))           # cosine, with an embedder
+QA_LEXICAL_SIMILARITY: float = float(os.getenv("QA_LEXICAL_SIMILARITY", "0.8"))  # word Jaccard, without one
+QA_CACHE_ITINERARIES: int = int(os.getenv("QA_CACHE_ITINERARIES", "256"))
+QA_ANSWERS_PER_ITINERARY = 64
+PRECOMPUTE_WAIT_S: float = float(os.getenv("QA_PRECOMPUTE_WAIT", "1.5"))
+_WORDS = re.compile(r"[a-z0-9']+")
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(_WORDS.findall(question.lower()))
+
+
+class _Entry:
+    __slots__ = ("question", "words", "vector", "answer")
+
+    def __init__(self, question: str, vector: Optional[np.ndarray], answer: str) -> None:
+        self.question = question
+        self.words = frozenset(question.split())
+        self.vector = vector
+        self.answer = answer
+
+
+class QACache:
+    def __init__(self, max_itineraries: int = QA_CACHE_ITINERARIES) -> None:
+        self.max_itineraries = max_itineraries
+        self._entries: "OrderedDict[str, List[_Entry]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _vector(question: str, embedder: Any) -> Optional[np.ndarray]:
+        if embedder is None:
+            return None
+        try:
+            v = np.asarray(embedder.encode([question]), dtype=np.float32)[0]
+            return v / max(float(np.linalg.norm(v)), 1e-9)
+        except Exception as e:
+            logger.warning(f"QA cache embedding failed, matching by words: {e}")
+            return None
+
+    def get(self, version: str, question: str, embedder: Any = None) -> Optional[str]:
+        norm = normalize_question(question)
+        with self._lock:
+            entries = list(self._entries.get(version, ()))
+        exact = next((e.answer for e in entries if e.question == norm), None)
+        if exact is None and entries:
+            exact = self._similar(entries, norm, self._vector(norm, embedder))
+        with self._lock:
+            if exact is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                if version in self._entries:
+                    self._entries.move_to_end(version)
+        return exact
+
+    @staticmethod
+    def _similar(entries: List[_Entry], norm: str, vector: Optional[np.ndarray]) -> Optional[str]:
+        with_vectors = [e for e in entries if e.vector is not None and vector is not None and e.vector.shape == vector.shape]
+        if with_vectors:
+            sims = np.stack([e.vector for e in with_vectors]) @ vector
+            best = int(np.argmax(sims))
+            return with_vectors[best].answer if sims[best] >= QA_SIMILARITY else None
+        words = frozenset(norm.split())
+        if not words:
+            return None
+        best_entry, best_sim = None, 0.0
+        for e in entries:
+            sim = len(words & e.words) / len(words | e.words)
+            if sim > best_sim:
+                best_entry, best_sim = e, sim
+        return best_entry.answer if best_entry is not None and best_sim >= QA_LEXICAL_SIMILARITY else None
+
+    def put(self, version: str, question: str, answer: str, embedder: Any = None) -> None:
+        norm = normalize_question(question)
+        entry = _Entry(norm, self._vector(norm, embedder), answer)
+        with self._lock:
+            entries = self._entries.setdefault(version, [])
+            entries[:] = [e for e in entries if e.question != norm][-(QA_ANSWERS_PER_ITINERARY - 1):] + [entry]
+            self._entries.move_to_end(version)
+            while len(self._entries) > self.max_itineraries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"itineraries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+qa_cache = QACache()
+_precompute_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="qa-precompute")
+_precomputing: Dict[str, Future] = {}
+_precompute_lock = threading.Lock()
+
+
+def _precompute(agent, itinerary: Dict[str, Any], version: str, embedder: Any) -> int:
+    questions = [q for q in SUGGESTED_QUESTIONS if qa_cache.get(version, q) is None]
+    if not questions:
+        return 0
+    context = chat_context(itinerary, " ".join(questions), embedder, token_budget=CHAT_CONTEXT_TOKENS * 2)
+    answers = agent.answer_questions(context, questions)
+    for question, answer in answers.items():
+        qa_cache.put(version, question, answer, embedder)
+    logger.info(f"Precomputed {len(answers)}/{len(questions)} suggested answers for itinerary {version[:8]}")
+    return len(answers)
+
+
+def precompute_suggested(agent, itinerary: Dict[str, Any], embedder: Any = None) -> Future:
+    """Starts (once per itinerary version) the batched background call for the suggested questions."""
+    version = itinerary_version(itinerary)
+    with _precompute_lock:
+        future = _precomputing.get(version)
+        if future is None or (future.done() and future.exception() is not None):
+            future = _precompute_pool.submit(_precompute, agent, itinerary, version, embedder)
+            _precomputing[version] = future
+            while len(_precomputing) > QA_CACHE_ITINERARIES:
+                _precomputing.pop(next(iter(_precomputing)))
+        return future
+
+
+def cached_answer(itinerary: Dict[str, Any], question: str, embedder: Any = None) -> Optional[str]:
+    return qa_cache.get(itinerary_version(itinerary), question, embedder)
+
+
+def answer_question(agent, itinerary: Dict[str, Any], question: str, embedder: Any = None,
+                    conversation: str = "") -> Tuple[str, bool]:
+    """
+    (answer, from_cache). Cached / precomputed answers return without an LLM call; otherwise
+    the agent answers from the question's chat context. Answers built on `conversation` are
+    cached under its digest; a failed call gets the canned fallback, not a second request.
+    """
+    version = itinerary_version(itinerary)
+    key = f"{version}:{make_key(conversation)}" if conversation else version
+    cached = qa_cache.get(version, question, embedder)
+    if cached is None and conversation:
+        cached = qa_cache.get(key, question, embedder)
+    if cached is None and normalize_question(question) in {normalize_question(q) for q in SUGGESTED_QUESTIONS}:
+        with _precompute_lock:
+            pending = _precomputing.get(version)
+        if pending is not None:
+            try:
+                pending.result(timeout=PRECOMPUTE_WAIT_S)  # short: it runs at background LLM priority
+            except FutureTimeoutError:
+                pass
+            except Exception as e:
+                logger.warning(f"Suggested-answer precompute failed: {e}")
+            cached = qa_cache.get(version, question, embedder)
+    if cached is not None:
+        return cached, True
+
+    context = chat_context(itinerary, question, embedder)
+    if conversation:
+        context = f"ITINERARY SUMMARY:\n{context}\n\nRECENT CONVERSATION:\n{conversation}\n\nCURRENT QUESTION: {question}"
+    answer = agent.ask_question(plan_context=context[:4000], question=question, fallback=False)
+    if answer and answer.strip():
+        qa_cache.put(key, question, answer.strip(), embedder)
+        return answer.strip(), False
+    return agent._question_fallback(question), False
@@ -0,0 +1,193 @@
+"""
+Per-itinerary chunk index for chat context.
+
+An itinerary is split once into chunks (plan sections per day / heading,
+one per activity, one per report field) and embedded in a single batch. The
+index is cached by itinerary version, so each chat question costs one query
+embedding and a dot product. The best-scoring chunks are packed into a token
+budget, always after a short overview chunk. Without an embedder (or if it
+fails) chunks are scored with TF-IDF over their words instead.
+"""
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+import numpy as np
+from utils.logger import logger
+
+CHAT_CONTEXT_TOKENS: int = int(os.getenv("CHAT_CONTEXT_TOKENS", "700"))  # ~4 chars per token
+CHAT_INDEX_CACHE_SIZE: int = int(os.getenv("CHAT_INDEX_CACHE_SIZE", "64"))
+MAX_CHUNK_CHARS = 800
+DAY_BOOST = 1.0  # "day 2" in the question pins that day's chunks to the top
+MIN_RELATIVE_SCORE = 0.25  # chunks scoring below this share of the best one are left out
+REPORT_FIELDS = {
+    "risk_safety_report": "Safety",
+    "weather_contingency": "Weather plan",
+    "budget_breakdown": "Budget breakdown",
+    "cost_leakage_report": "Cost analysis",
+    "ai_time_planner_report": "Schedule",
+    "carbon_offset_suggestion": "Carbon offset",
+    "experience_highlights": "Highlights",
+    "trip_mood_indicator": "Trip mood",
+    "duplicate_trip_detector": "Similar trips",
+}
+_DAY = re.compile(r"\bday\s*(\d{1,2})\b", re.IGNORECASE)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def itinerary_version(itinerary: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(itinerary, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _split(text: str, limit: int = MAX_CHUNK_CHARS) -> List[str]:
+    """Paragraph-aligned pieces of at most ~limit chars."""
+    pieces, current = [], ""
+    for para in re.split(r"\n\s*\n", text):
+        if current and len(current) + len(para) + 2 > limit:
+            pieces.append(current)
+            current = ""
+        current = f"{current}\n\n{para}" if current else para
+        while len(current) > limit:
+            pieces.append(current[:limit])
+            current = current[limit:]
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def _plan_sections(plan: str) -> List[Dict[str, Any]]:
+    """Markdown plan split at headings and "Day N" lines; each section keeps its day number."""
+    sections: List[Dict[str, Any]] = []
+    title, lines, day = "Plan", [], None
+
+    def flush() -> None:
+        body = "\n".join(lines).strip()
+        if body:
+            for piece in _split(body):
+                sections.append({"kind": "plan", "title": title, "day": day, "text": piece})
+
+    for line in plan.splitlines():
+        stripped = line.strip()
+        day_match = _DAY.search(stripped)
+        if stripped.startswith("#") or (day_match and stripped.lower().lstrip("*- ").startswith("day")):
+            flush()
+            title, lines = stripped.lstrip("#*- ").strip() or title, []
+            day = int(day_match.group(1)) if day_match else day
+        lines.append(line)
+    flush()
+    return sections
+
+
+def chunk_itinerary(itinerary: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Overview first, then plan sections, activities and report fields (document order)."""
+    overview = (
+        f"Total cost: ${itinerary.get('total_cost', 0)}; eco score {itinerary.get('eco_score', 0)}/10; "
+        f"carbon saved {itinerary.get('carbon_saved', 'n/a')}; plan health {itinerary.get('plan_health_score', 'n/a')}."
+    )
+    chunks = [{"kind": "overview", "title": "Overview", "day": None, "text": overview}]
+    chunks += _plan_sections(str(itinerary.get("plan") or ""))
+    for activity in itinerary.get("activities") or []:
+        if not isinstance(activity, dict):
+            continue
+        text = (
+            f"{activity.get('name', 'Activity')} ({activity.get('data_type', 'Activity')}, {activity.get('location', '')}): "
+            f"${activity.get('cost', 0)} {activity.get('cost_type', '')}, eco {activity.get('eco_score', 'n/a')}. "
+            f"{activity.get('description', '')}"
+        )
+        chunks.append({"kind": "activity", "title": activity.get("name", "Activity"), "day": None, "text": text})
+    for field, label in REPORT_FIELDS.items():
+        value = itinerary.get(field)
+        if value:
+            value = value if isinstance(value, str) else json.dumps(value, default=str)
+            chunks.append({"kind": "report", "title": label, "day": None, "text": f"{label}: {value}"[:MAX_CHUNK_CHARS]})
+    return chunks
+
+
+class ItineraryIndex:
+    def __init__(self, itinerary: Dict[str, Any], embedder: Any = None) -> None:
+        self.chunks = chunk_itinerary(itinerary)
+        self.embedder = embedder
+        self.vectors: Optional[np.ndarray] = None
+        texts = [f"{c['title']}: {c['text']}" for c in self.chunks]
+        if embedder is not None:
+            try:
+                vectors = np.asarray(embedder.encode(texts), dtype=np.float32)  # one batch per itinerary
+                self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+            except Exception as e:
+                logger.warning(f"Chat index embedding failed, using lexical scoring: {e}")
+        # Lexical fallback: TF-IDF over chunk words
+        self._terms = [Counter(_TOKEN.findall(t.lower())) for t in texts]
+        df = Counter(term for terms in self._terms for term in terms)
+        self._idf = {term: math.log(1 + len(texts) / n) for term, n in df.items()}
+
+    def _lexical_scores(self, question: str) -> np.ndarray:
+        q_terms = set(_TOKEN.findall(question.lower()))
+        return np.array([
+            sum(self._idf.get(t, 0.0) * (1 + math.log(terms[t])) for t in q_terms if t in terms) / math.sqrt(1 + sum(terms.values()))
+            for terms in self._terms
+        ])
+
+    def scores(self, question: str) -> np.ndarray:
+        scores = None
+        if self.vectors is not None:
+            try:
+                q = np.asarray(self.embedder.encode([question]), dtype=np.float32)[0]
+                scores = self.vectors @ (q / max(float(np.linalg.norm(q)), 1e-9))
+            except Exception as e:
+                logger.warning(f"Chat question embedding failed, using lexical scoring: {e}")
+        if scores is None:
+            scores = self._lexical_scores(question)
+        days = {int(d) for d in _DAY.findall(question)}
+        if days:
+            scores = scores + DAY_BOOST * np.array([c["day"] in days for c in self.chunks], dtype=np.float64)
+        return scores
+
+    def context(self, question: str, token_budget: int = CHAT_CONTEXT_TOKENS) -> str:
+        """Overview plus the best relevant chunks that fit in token_budget, in itinerary order."""
+        scores = self.scores(question)
+        floor = MIN_RELATIVE_SCORE * scores.max() if scores.max() > 0 else -np.inf
+        picked, used = {0}, estimate_tokens(self.chunks[0]["text"])
+        for i in map(int, np.argsort(-scores, kind="stable")):
+            cost = estimate_tokens(self.chunks[i]["text"])
+            if i not in picked and scores[i] >= floor and used + cost <= token_budget:
+                picked.add(i)
+                used += cost
+        return "\n\n".join(self.chunks[i]["text"] for i in sorted(picked))
+
+
+_indexes: "OrderedDict[str, ItineraryIndex]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_itinerary_index(itinerary: Dict[str, Any], embedder: Any = None) -> ItineraryIndex:
+    """Index for this itinerary version (built and embedded once, LRU-cached)."""
+    key = f"{itinerary_version(itinerary)}:{id(embedder) if embedder is not None else 'lexical'}"
+    with _index_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = ItineraryIndex(itinerary, embedder)
+    with _index_lock:
+        _indexes[key] = index
+        while len(_indexes) > CHAT_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def chat_context(itinerary: Dict[str, Any], question: str, embedder: Any = None,
+                 token_budget: int = CHAT_CONTEXT_TOKENS) -> str:
+    """Question-relevant itinerary context within token_budget."""
+    try:
+        return get_itinerary_index(itinerary, embedder).context(question, token_budget)
+    except Exception as e:
+        logger.warning(f"Could not build chat context: {e}")
+        return json.dumps(itinerary, default=str)[:token_budget * 4]
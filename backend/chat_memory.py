@@ -0,0 +1,99 @@
+"""
+Rolling conversation memory for the trip chat.
+
+The last RECENT_MESSAGES messages are kept verbatim. Older exchanges are
+folded into a running summary one exchange at a time, in the background
+after each answer, so the summary update never delays an answer. Each
+prompt gets the summary plus as many recent turns as fit in
+CHAT_MEMORY_TOKENS (long turns are clipped). Prompt size is therefore
+bounded no matter how long the conversation runs. If the summariser LLM
+call fails, the exchange is compacted to its question instead.
+"""
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from utils.logger import logger
+from backend.chat_index import estimate_tokens
+
+CHAT_MEMORY_TOKENS: int = int(os.getenv("CHAT_MEMORY_TOKENS", "300"))  # summary + recent turns
+SUMMARY_TOKENS: int = int(os.getenv("CHAT_SUMMARY_TOKENS", "150"))
+RECENT_MESSAGES = 4        # two exchanges stay verbatim
+MESSAGE_TOKENS = 100       # clip for one verbatim turn
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+
+
+def _clip(text: str, tokens: int) -> str:
+    limit = tokens * 4
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def _format(message: Dict[str, Any]) -> str:
+    return f"{message.get('role', 'user')}: {message.get('content', '')}"
+
+
+class ChatMemory:
+    def __init__(self) -> None:
+        self.summary = ""
+        self.covered = 0  # messages already folded into the summary
+        self._future: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.summary, self.covered, self._future = "", 0, None
+
+    def _compact(self, exchange: List[Dict[str, Any]]) -> str:
+        """Summary without the LLM: earlier notes plus the exchange's question, newest lines kept."""
+        questions = [f"- User asked: {_clip(str(m.get('content', '')), 30)}" for m in exchange if m.get("role") == "user"]
+        lines = [l for l in self.summary.splitlines() if l.strip()] + questions
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > SUMMARY_TOKENS:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    def _fold(self, agent, messages: List[Dict[str, Any]], start: int, end: int) -> None:
+        """Folds messages[start:end] into the summary one exchange (user + reply) at a time."""
+        i = start
+        while i < end:
+            exchange = messages[i:min(i + 2, end)]
+            summary = None
+            try:
+                summary = agent.summarize_conversation(self.summary, "\n".join(_format(m) for m in exchange),
+                                                       max_words=SUMMARY_TOKENS * 3 // 4)
+            except Exception as e:
+                logger.warning(f"Chat summary update failed, compacting instead: {e}")
+            with self._lock:
+                if self.covered != i:
+                    return  # reset while summarising
+                self.summary = _clip(summary, SUMMARY_TOKENS) if summary else self._compact(exchange)
+                self.covered = i + len(exchange)
+            i += len(exchange)
+
+    def observe(self, agent, history: List[Dict[str, Any]]) -> Optional[Future]:
+        """Call after each answer: folds turns that left the verbatim window, off the request path."""
+        messages = list(history)
+        end = len(messages) - RECENT_MESSAGES
+        with self._lock:
+            if end <= self.covered or (self._future is not None and not self._future.done()):
+                return self._future  # nothing new, or the running update picks it up next time
+            self._future = _summary_pool.submit(self._fold, agent, messages, self.covered, end)
+            return self._future
+
+    def context(self, history: List[Dict[str, Any]], token_budget: int = CHAT_MEMORY_TOKENS) -> str:
+        """Summary plus the newest unsummarised turns that fit in token_budget (oldest first)."""
+        with self._lock:
+            summary, covered = self.summary, self.covered
+        parts: List[str] = []
+        used = 0
+        if summary:
+            parts.append(f"Earlier in this conversation: {summary}")
+            used = estimate_tokens(parts[0])
+        recent: List[str] = []
+        for message in reversed(history[covered:]):
+            turn = _clip(_format(message), MESSAGE_TOKENS)
+            cost = estimate_tokens(turn)
+            if used + cost > token_budget:
+                break
+            recent.append(turn)
+            used += cost
+        return "\n".join(parts + recent[::-1])
@@ -0,0 +1,112 @@
+"""
+Maximal-marginal-relevance (MMR) selection of planner candidates.
+
+Nearest neighbours are often near-duplicates (five mangrove tours, no food).
+MMR picks, one at a time, the candidate that maximises
+
+    lambda * relevance - (1 - lambda) * max cosine similarity to what is already picked
+
+with per-category quotas. The similarity matrix is one matmul over the
+candidate embeddings; each pick is a vectorised argmax, so k picks cost
+O(k * n). Candidates without an embedding (CSV fallback) use hashed
+bag-of-words vectors instead.
+"""
+import os
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+VECTOR_KEY = "_vector"  # embedding attached by RAGEngine.search(with_vectors=True); never sent to the LLM
+MMR_LAMBDA: float = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 = relevance only, 0 = diversity only
+DEFAULT_QUOTAS: Dict[str, int] = {
+    "Hotel": 2, "Activity": 3, "Place": 2, "Food": 2, "Transport": 1, "Nightlife": 1, "Shopping": 1,
+}
+LEXICAL_DIM = 512
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _parse_quotas(raw: str) -> Dict[str, int]:
+    """"Hotel=2,Food=1" -> {"Hotel": 2, "Food": 1} (invalid entries are ignored)."""
+    quotas: Dict[str, int] = {}
+    for part in raw.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip().isdigit():
+            quotas[name.strip()] = int(value)
+    return quotas
+
+
+CATEGORY_QUOTAS: Dict[str, int] = {**DEFAULT_QUOTAS, **_parse_quotas(os.getenv("MMR_CATEGORY_QUOTAS", ""))}
+
+
+def lexical_vectors(candidates: Sequence[Dict[str, Any]], dim: int = LEXICAL_DIM) -> np.ndarray:
+    """Hashed bag-of-words vectors over name + description (stand-in when embeddings are missing)."""
+    out = np.zeros((len(candidates), dim), dtype=np.float32)
+    for row, c in enumerate(candidates):
+        text = f"{c.get('name', '')} {c.get('description', '')}".lower()
+        for token in _TOKEN.findall(text):
+            out[row, zlib.crc32(token.encode()) % dim] += 1.0
+    return out
+
+
+def candidate_vectors(candidates: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Row-normalised embedding matrix; lexical vectors unless every candidate has a usable embedding."""
+    vectors = [c.get(VECTOR_KEY) for c in candidates]
+    matrix = None
+    if all(v is not None for v in vectors):
+        try:
+            matrix = np.asarray(vectors, dtype=np.float32)
+        except ValueError:
+            matrix = None  # ragged (mixed collections / models)
+    if matrix is None or matrix.ndim != 2:
+        matrix = lexical_vectors(candidates)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, categories: Sequence[str], k: int,
+               lam: float = MMR_LAMBDA, quotas: Optional[Dict[str, int]] = None,
+               required: Sequence[str] = ()) -> np.ndarray:
+    """
+    Indices of k candidates chosen by MMR under per-category quotas (categories without a
+    quota are uncapped), starting with the most relevant row of each `required` category.
+    When quotas leave slots empty, the rest is filled by MMR without caps.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    quotas = CATEGORY_QUOTAS if quotas is None else quotas
+    rel = np.asarray(relevance, dtype=np.float64)
+    span = rel.max() - rel.min()
+    rel = (rel - rel.min()) / span if span > 0 else np.ones(n)
+    sim = vectors @ vectors.T                       # cosine similarity, one pass
+    cats = np.asarray(categories)
+    max_sim = np.zeros(n)                           # similarity to the closest picked item
+    available = np.ones(n, dtype=bool)
+    capped = np.zeros(n, dtype=bool)
+    taken: Dict[str, int] = {}
+    chosen: List[int] = []
+    seeds = [int(np.argmax(np.where(cats == c, rel, -np.inf))) for c in required if (cats == c).any()]
+    while len(chosen) < k:
+        if seeds:
+            pick = seeds.pop(0)
+        else:
+            allowed = available & ~capped
+            if not allowed.any():
+                capped[:] = False                   # quotas exhausted: fill remaining slots uncapped
+                allowed = available
+            gain = np.where(allowed, lam * rel - (1 - lam) * max_sim, -np.inf)
+            pick = int(np.argmax(gain))
+        chosen.append(pick)
+        available[pick] = False
+        max_sim = np.maximum(max_sim, sim[pick])
+        category = cats[pick]
+        taken[category] = taken.get(category, 0) + 1
+        if category in quotas and taken[category] >= quotas[category]:
+            capped |= cats == category
+    return np.asarray(chosen)
+
+
+def strip_vectors(candidates: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{k: v for k, v in c.items() if k != VECTOR_KEY} for c in candidates]
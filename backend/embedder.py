@@ -0,0 +1,215 @@
+"""
+Embedding model loading.
+
+    EMBEDDING_BACKEND=torch|onnx|onnx-int8   runtime for all-MiniLM-L6-v2 (default torch)
+    EMBEDDING_THREADS=N                      intra-op CPU threads (0 = runtime default)
+    EMBEDDING_TOKEN_BUDGET=N                 padded tokens per batch for bulk encodes
+
+    python -m backend.embedder --parity onnx-int8   cosine agreement vs PyTorch + timings
+"""
+import os
+import sys
+import time
+import argparse
+import platform
+from typing import Any, Dict, List, Optional, Union
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import numpy as np
+from utils.logger import logger
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_SERVICE_SOCKET = os.getenv("EMBEDDING_SERVICE_SOCKET")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_TOKEN_BUDGET = int(os.getenv("EMBEDDING_TOKEN_BUDGET", "8192"))
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")  # override the exported graph inside the model repo
+PARITY_THRESHOLD = 0.99
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+# -----------------------------------------
+# Length-bucketed batching
+# -----------------------------------------
+class BucketedEncoder:
+    """
+    Wraps a SentenceTransformer so bulk encodes are split into length buckets:
+    short texts go in large batches, long texts in small ones, keeping the
+    padded tokens per forward pass near `token_budget`. Output order is preserved.
+    """
+
+    def __init__(self, model: Any, token_budget: int = EMBEDDING_TOKEN_BUDGET, max_batch: int = 256) -> None:
+        self.model = model
+        self.token_budget = token_budget
+        self.max_batch = max_batch
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+    @staticmethod
+    def _approx_tokens(text: str) -> int:
+        return len(text) // 4 + 2  # ~4 chars per WordPiece + [CLS]/[SEP]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs: Any) -> np.ndarray:
+        if isinstance(sentences, str) or len(sentences) <= batch_size:
+            return self.model.encode(sentences, batch_size=batch_size, **kwargs)
+
+        texts = list(sentences)
+        order = sorted(range(len(texts)), key=lambda i: self._approx_tokens(texts[i]))
+        chunks: List[np.ndarray] = []
+        start = 0
+        while start < len(order):
+            # order is ascending, so the last text in a bucket is its longest
+            end = start + 1
+            while end < len(order) and end - start < self.max_batch and \
+                    (end - start + 1) * self._approx_tokens(texts[order[end]]) <= self.token_budget:
+                end += 1
+            bucket = [texts[i] for i in order[start:end]]
+            chunks.append(np.asarray(self.model.encode(bucket, batch_size=len(bucket), **kwargs)))
+            start = end
+
+        sorted_vecs = np.concatenate(chunks)
+        out = np.empty_like(sorted_vecs)
+        out[np.asarray(order)] = sorted_vecs
+        return out
+
+
+# -----------------------------------------
+# Runtimes
+# -----------------------------------------
+def _cpu_flags() -> str:
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return line
+    except OSError:
+        pass
+    return ""
+
+
+def _int8_onnx_file() -> str:
+    """Picks the int8 graph the hub repo ships for this CPU's widest integer SIMD."""
+    flags = _cpu_flags()
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx512" in flags:
+        return "onnx/model_qint8_avx512.onnx"
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+def _onnx_model_kwargs(backend: str, threads: int) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {"provider": "CPUExecutionProvider"}
+    kwargs["file_name"] = EMBEDDING_ONNX_FILE or (_int8_onnx_file() if backend == "onnx-int8" else "onnx/model.onnx")
+    if threads:
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        kwargs["session_options"] = options
+    return kwargs
+
+
+def load_local_model(backend: str = EMBEDDING_BACKEND, threads: int = EMBEDDING_THREADS, bucketed: bool = True) -> Any:
+    """In-process SentenceTransformer on the selected CPU runtime (imported lazily: torch is slow to import)."""
+    from sentence_transformers import SentenceTransformer
+
+    model = None
+    if backend in ("onnx", "onnx-int8"):
+        try:
+            model = SentenceTransformer(EMBEDDING_MODEL, backend="onnx", model_kwargs=_onnx_model_kwargs(backend, threads))
+        except Exception as e:
+            # onnxruntime / optimum missing (pip install "sentence-transformers[onnx]") or graph not found
+            logger.warning(f"ONNX embedding backend unavailable ({e}); using PyTorch.")
+    elif backend != "torch":
+        logger.warning(f"Unknown EMBEDDING_BACKEND '{backend}'; using PyTorch.")
+
+    if model is None:
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(EMBEDDING_MODEL)
+    return BucketedEncoder(model) if bucketed else model
+
+
+def load_embedder() -> Any:
+    """
+    Returns an object with SentenceTransformer's encode() interface.
+    Uses the shared embedding service when EMBEDDING_SERVICE_SOCKET is set and
+    reachable, otherwise loads the model in this process.
+    """
+    if EMBEDDING_SERVICE_SOCKET:
+        from backend.embedding_service import EmbeddingServiceClient
+        client = EmbeddingServiceClient(EMBEDDING_SERVICE_SOCKET)
+        if client.ping():
+            return client
+        logger.warning(f"Embedding service not reachable at {EMBEDDING_SERVICE_SOCKET}; loading model in-process.")
+    return load_local_model()
+
+
+# -----------------------------------------
+# Parity / speed check
+# -----------------------------------------
+def catalog_texts(data_dir: str = os.path.join(BASE_DIR, "data")) -> List[str]:
+    """Indexing-style texts from the CSV catalog (same shape as utils/setup_db.py)."""
+    import pandas as pd
+    texts = []
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(".csv"):
+            df = pd.read_csv(os.path.join(data_dir, filename))
+            texts += [f"{row.get('name', '')} in {row.get('location', '')}. {row.get('description', '')}" for _, row in df.iterrows()]
+    return texts
+
+
+def parity_check(backend: str, texts: List[str], threads: int = EMBEDDING_THREADS,
+                 threshold: float = PARITY_THRESHOLD) -> Dict[str, Any]:
+    """Cosine agreement of `backend` against PyTorch on `texts`, plus query latency and bulk throughput."""
+    reference = load_local_model("torch", threads)
+    candidate = load_local_model(backend, threads)
+    get_backend = getattr(candidate, "get_backend", None)
+    runtime = get_backend() if get_backend else getattr(candidate, "backend", "torch")
+    if backend != "torch" and runtime == "torch":
+        raise RuntimeError(f"{backend} fell back to PyTorch; nothing to compare")  # load_local_model logged why
+    report: Dict[str, Any] = {"backend": backend, "texts": len(texts)}
+
+    vectors = {}
+    for name, model in (("torch", reference), (backend, candidate)):
+        model.encode(texts[:8])  # warm-up
+        start = time.perf_counter()
+        for text in texts[:50]:
+            model.encode(text)
+        query_ms = (time.perf_counter() - start) * 1000 / min(50, len(texts))
+        start = time.perf_counter()
+        vectors[name] = np.asarray(model.encode(texts, batch_size=64), dtype=np.float32)
+        report[name] = {"query_ms": round(query_ms, 2), "bulk_per_sec": round(len(texts) / (time.perf_counter() - start), 1)}
+
+    a, b = vectors["torch"], vectors[backend]
+    cos = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    report["cosine_mean"] = round(float(cos.mean()), 5)
+    report["cosine_min"] = round(float(cos.min()), 5)
+    report["passed"] = bool(cos.min() >= threshold)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare an embedding runtime against PyTorch")
+    parser.add_argument("--parity", choices=BACKENDS, default="onnx-int8", help="Runtime to check")
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    parser.add_argument("--threshold", type=float, default=PARITY_THRESHOLD, help="Minimum per-text cosine")
+    args = parser.parse_args(argv)
+
+    report = parity_check(args.parity, catalog_texts(), args.threads, args.threshold)
+    for name in ("torch", args.parity):
+        print(f"{name:>10}: query {report[name]['query_ms']} ms | bulk {report[name]['bulk_per_sec']} texts/s")
+    status = "✅" if report["passed"] else "❌"
+    print(f"{status} cosine mean={report['cosine_mean']} min={report['cosine_min']} (threshold {args.threshold})")
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
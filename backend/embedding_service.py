@@ -0,0 +1,305 @@
+"""
+Local embedding service: one process holds the SentenceTransformer model and
+serves every Streamlit worker / API process / indexer on the machine.
+
+    python -m backend.embedding_service --socket /tmp/ecoguide-embed.sock
+
+Requests arriving within --window-ms of each other are coalesced into a single
+batched forward pass. Small results (a query vector) come back inline in the
+JSON reply; larger ones go through POSIX shared memory and only a small header
+crosses the Unix socket. The server owns every block: it unlinks it once the
+client acknowledges the read, or when the reply or the ack fails. Clients set
+EMBEDDING_SERVICE_SOCKET and get an EmbeddingServiceClient from
+backend.embedder.load_embedder().
+"""
+import os
+import sys
+import json
+import base64
+import time
+import queue
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import numpy as np
+from utils.logger import logger
+
+DEFAULT_SOCKET = "/tmp/ecoguide-embed.sock"
+INLINE_MAX_BYTES = 64 * 1024  # results up to this size travel in the JSON reply
+ACK_TIMEOUT: float = 10.0     # seconds the server keeps a shared-memory block waiting for the client
+_HEADER = struct.Struct("!I")
+_served: Set[str] = set()  # shared-memory blocks this process's server currently owns
+
+
+# -----------------------------------------
+# Framing (4-byte length + JSON)
+# -----------------------------------------
+def _send(sock: socket.socket, payload: Dict[str, Any]) -> None:
+    data = json.dumps(payload).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Embedding service connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv(sock: socket.socket) -> Dict[str, Any]:
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return json.loads(_recv_exact(sock, length))
+
+
+# -----------------------------------------
+# Server
+# -----------------------------------------
+class MicroBatcher:
+    """Collects concurrent encode requests and runs them as one batch."""
+
+    def __init__(self, model, window_ms: float = 5.0, max_batch: int = 256, batch_size: int = 64) -> None:
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batch_size = batch_size
+        self.requests: "queue.Queue[Tuple[List[str], bool, Future]]" = queue.Queue()
+        self.batches = 0
+        self.texts = 0
+        threading.Thread(target=self._loop, name="embed-batcher", daemon=True).start()
+
+    def submit(self, texts: List[str], normalize: bool) -> Future:
+        future: Future = Future()
+        self.requests.put((texts, normalize, future))
+        return future
+
+    def _collect(self) -> List[Tuple[List[str], bool, Future]]:
+        batch = [self.requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            texts = [t for item in batch for t in item[0]]
+            try:
+                vectors = np.asarray(self.model.encode(texts, batch_size=self.batch_size), dtype=np.float32)
+            except Exception as e:
+                logger.exception(f"Embedding batch failed: {e}")
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for item_texts, normalize, future in batch:
+                part = vectors[offset:offset + len(item_texts)]
+                offset += len(item_texts)
+                if normalize:
+                    norms = np.linalg.norm(part, axis=1, keepdims=True)
+                    part = part / np.where(norms == 0, 1, norms)
+                future.set_result(part)
+
+
+def _to_shared_memory(vectors: np.ndarray) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+    """Copies vectors into a new shared-memory block; the caller unlinks it once the client has read it."""
+    shm = shared_memory.SharedMemory(create=True, size=max(1, vectors.nbytes))
+    _served.add(shm.name)
+    np.ndarray(vectors.shape, dtype=np.float32, buffer=shm.buf)[:] = vectors
+    return shm, {"shm": shm.name, "shape": list(vectors.shape), "dtype": "float32"}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Opens a block the server owns without handing it to this process's resource_tracker."""
+    if name in _served:  # server and client in one process share one tracker entry
+        return shared_memory.SharedMemory(name=name)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # Attaching registers the block for unlink at exit, but the server unlinks it after the ack
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        return shm
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        batcher: MicroBatcher = self.server.batcher  # type: ignore[attr-defined]
+        while True:
+            try:
+                request = _recv(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                op = request.get("op", "encode")
+                if op == "ping":
+                    _send(self.request, {"ok": True, "dim": self.server.dim, "batches": batcher.batches, "texts": batcher.texts})  # type: ignore[attr-defined]
+                    continue
+                vectors = batcher.submit(list(request["texts"]), bool(request.get("normalize"))).result()
+            except Exception as e:
+                _send(self.request, {"ok": False, "error": str(e)})
+                continue
+            if vectors.nbytes <= INLINE_MAX_BYTES:
+                _send(self.request, {"ok": True, "data": base64.b64encode(vectors.tobytes()).decode("ascii"),
+                                     "shape": list(vectors.shape), "dtype": "float32"})
+                continue
+            shm, header = _to_shared_memory(vectors)
+            try:
+                _send(self.request, {"ok": True, **header})
+                self.request.settimeout(ACK_TIMEOUT)
+                _recv(self.request)  # {"op": "ack"} once the client has copied the vectors
+            except (ConnectionError, OSError, ValueError):
+                return
+            finally:
+                self.request.settimeout(None)
+                shm.close()
+                shm.unlink()
+                _served.discard(shm.name)
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 256  # many worker threads connect at once on startup
+
+    def __init__(self, socket_path: str, model, **batch_kwargs: Any) -> None:
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.remove(socket_path)  # stale socket left by a dead server
+            else:
+                raise RuntimeError(f"An embedding service is already listening on {socket_path}")
+            finally:
+                probe.close()
+        super().__init__(socket_path, _Handler)
+        self.batcher = MicroBatcher(model, **batch_kwargs)
+        get_dim = getattr(model, "get_sentence_embedding_dimension", None)
+        self.dim = int(get_dim() if get_dim else len(model.encode("dimension probe")))
+
+
+# -----------------------------------------
+# Client (drop-in for SentenceTransformer.encode)
+# -----------------------------------------
+class EmbeddingServiceClient:
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout: float = 30.0) -> None:
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()  # one connection per thread
+        self._dim: Optional[int] = None
+
+    def _conn(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _call(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Retry only when the request cannot have reached the service (connect / send on a dead
+        # connection after a restart); a timeout or a lost reply is not retried, or it would run twice
+        for attempt in range(2):
+            try:
+                sock = self._conn()
+                _send(sock, payload)
+                break
+            except OSError:
+                self._local.sock = None
+                if attempt:
+                    raise
+        try:
+            response = _recv(sock)
+        except (ConnectionError, OSError):
+            self._local.sock = None
+            sock.close()  # a late reply must not be read as the answer to the next request
+            raise
+        if not response.get("ok"):
+            raise RuntimeError(f"Embedding service error: {response.get('error')}")
+        return response
+
+    def ping(self) -> bool:
+        try:
+            self._dim = int(self._call({"op": "ping"})["dim"])
+            return True
+        except Exception:
+            return False
+
+    def get_sentence_embedding_dimension(self) -> Optional[int]:
+        if self._dim is None:
+            self.ping()
+        return self._dim
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, normalize_embeddings: bool = False,
+               **kwargs: Any) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension() or 0), dtype=np.float32)
+
+        header = self._call({"op": "encode", "texts": texts, "normalize": normalize_embeddings})
+        shape = tuple(header["shape"])
+        if "data" in header:
+            vectors = np.frombuffer(base64.b64decode(header["data"]), dtype=header["dtype"]).reshape(shape)
+        else:
+            shm = _attach(header["shm"])
+            try:
+                vectors = np.ndarray(shape, dtype=header["dtype"], buffer=shm.buf).copy()
+            finally:
+                shm.close()
+            try:
+                _send(self._conn(), {"op": "ack"})  # the service unlinks the block
+            except OSError:
+                self._local.sock = None
+        return vectors[0] if single else vectors
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EcoGuide local embedding service")
+    parser.add_argument("--socket", default=os.getenv("EMBEDDING_SERVICE_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--window-ms", type=float, default=5.0, help="Coalescing window for concurrent requests")
+    parser.add_argument("--max-batch", type=int, default=256, help="Max texts per forward pass")
+    parser.add_argument("--batch-size", type=int, default=64, help="Model batch size inside a forward pass")
+    args = parser.parse_args(argv)
+
+    from backend.embedder import load_local_model
+    model = load_local_model()
+    server = EmbeddingServer(args.socket, model, window_ms=args.window_ms, max_batch=args.max_batch, batch_size=args.batch_size)
+    print(f"🧠 Embedding service ready on {args.socket} (dim={server.dim}, window={args.window_ms}ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Facet index over the catalog snapshot.
+
+Every location, data_type, tag and sidebar interest gets one bitmap (a Python
+int, bit i = row i), and eco_score / cost keep a sorted copy for range queries.
+A facet count is a few big-int ANDs plus int.bit_count(), so the sidebar can
+show live match counts on every widget change, and plan_trip can refuse a
+trip with zero candidates before it spends a search and an LLM call.
+
+    index = get_facets()
+    bitmap = index.select(locations=["Dubai"], interests=["Beach"], min_eco=8.0)
+    index.count(bitmap), index.indices(bitmap)
+"""
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from utils.logger import logger
+from backend.catalog_snapshot import DATA_DIR, get_snapshot
+
+# Sidebar interest -> word prefixes looked for in name / description / tag
+INTEREST_TERMS: Dict[str, List[str]] = {
+    "Beach": ["beach", "coast", "sea", "marina", "island", "snorkel", "kayak", "palm", "lagoon", "dive", "diving"],
+    "History": ["histor", "heritage", "museum", "fort", "old town", "culture", "cultural", "tradition", "souk", "mosque"],
+    "Adventure": ["adventure", "kayak", "hiking", "hike", "cycling", "desert", "dune", "climb", "zipline", "dive", "safari"],
+    "Food": ["food", "restaurant", "cafe", "organic", "vegan", "plant-based", "farm", "dining", "bakery", "coffee"],
+    "Nature": ["nature", "mangrove", "park", "garden", "wildlife", "bird", "reserve", "conservation", "eco-", "mountain"],
+}
+INTEREST_TYPES: Dict[str, List[str]] = {"Food": ["Food"]}  # interests that also match a whole data_type
+INTEREST_EXEMPT_TYPES = ("Hotel", "Transport")  # every plan needs a base and a way around, whatever the interests
+MIN_INTEREST_ROWS = 8  # narrow by interest only when it leaves at least this many other rows
+RANGE_CACHE_SIZE = 256
+
+
+def bitmap_from_mask(mask: np.ndarray) -> int:
+    """Boolean row mask -> int bitmap (bit i set when mask[i])."""
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def bitmap_from_indices(indices: np.ndarray, rows: int) -> int:
+    mask = np.zeros(rows, dtype=bool)
+    mask[indices] = True
+    return bitmap_from_mask(mask)
+
+
+class FacetIndex:
+    def __init__(self, store) -> None:
+        self.rows = len(store)
+        self.all = (1 << self.rows) - 1
+        self.bitmaps: Dict[str, Dict[str, int]] = {}  # facet -> value -> bitmap
+        for col in ("location", "data_type", "tag"):
+            codes = np.asarray(store.codes[col])
+            self.bitmaps[col] = {
+                value: bitmap_from_mask(codes == code)
+                for code, value in enumerate(store.dictionaries[col]) if value
+            }
+        self.bitmaps["interest"] = self._interest_bitmaps(store)
+        # Sorted columns: a range is a searchsorted pair, materialised as a bitmap on first use
+        self._sorted: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for col in ("eco_score", "cost"):
+            values = np.nan_to_num(np.asarray(store.numeric[col], dtype=np.float32), nan=-np.inf)
+            order = np.argsort(values, kind="stable")
+            self._sorted[col] = (values[order], order)
+        self._ranges: Dict[Tuple[str, Optional[float], Optional[float]], int] = {}
+        self._lock = threading.Lock()
+
+    def _interest_bitmaps(self, store) -> Dict[str, int]:
+        """
+        One regex pass over each lower-cased utf-8 heap for all interest words;
+        byte offsets map back to rows with searchsorted.
+        """
+        words = sorted({w for ws in INTEREST_TERMS.values() for w in ws})
+        word_ids = {w.encode(): i for i, w in enumerate(words)}
+        pattern = re.compile(rb"\b(" + b"|".join(re.escape(w.encode()) for w in words) + rb")")
+        masks = {interest: np.zeros(self.rows, dtype=bool) for interest in INTEREST_TERMS}
+        for col in ("name", "description"):
+            heap, offsets = store.heaps[col], np.asarray(store.offsets[col])
+            if not len(heap):
+                continue
+            starts, groups = [], []
+            for m in pattern.finditer(bytes(heap).lower()):
+                starts.append(m.start())
+                groups.append(word_ids[m[1]])
+            if not starts:
+                continue
+            rows = np.searchsorted(offsets, np.asarray(starts), side="right") - 1
+            hit_words = np.asarray(groups)
+            for interest, terms in INTEREST_TERMS.items():
+                masks[interest][rows[np.isin(hit_words, [words.index(t) for t in terms])]] = True
+        out: Dict[str, int] = {}
+        for interest, mask in masks.items():
+            bitmap = bitmap_from_mask(mask)
+            for tag, tag_bitmap in self.bitmaps["tag"].items():
+                if any(t in tag.lower() for t in INTEREST_TERMS[interest]):
+                    bitmap |= tag_bitmap
+            for data_type in INTEREST_TYPES.get(interest, []):
+                bitmap |= self.bitmaps["data_type"].get(data_type, 0)
+            out[interest] = bitmap
+        return out
+
+    # -- bitmaps --
+    def facet(self, facet: str, values: Iterable[str]) -> int:
+        """OR of the bitmaps for `values` (case-insensitive)."""
+        wanted = {v.lower() for v in values}
+        bitmap = 0
+        for value, b in self.bitmaps.get(facet, {}).items():
+            if value.lower() in wanted:
+                bitmap |= b
+        return bitmap
+
+    def range(self, col: str, low: Optional[float] = None, high: Optional[float] = None) -> int:
+        """Rows with low <= col <= high (either end open)."""
+        key = (col, low, high)
+        cached = self._ranges.get(key)
+        if cached is not None:
+            return cached
+        values, order = self._sorted[col]
+        start = 0 if low is None else int(np.searchsorted(values, low, side="left"))
+        end = len(values) if high is None else int(np.searchsorted(values, high, side="right"))
+        bitmap = bitmap_from_indices(order[start:end], self.rows)
+        with self._lock:
+            if len(self._ranges) >= RANGE_CACHE_SIZE:
+                self._ranges.pop(next(iter(self._ranges)))
+            self._ranges[key] = bitmap
+        return bitmap
+
+    def select(self, locations: Optional[Iterable[str]] = None, interests: Optional[Iterable[str]] = None,
+               data_types: Optional[Iterable[str]] = None, min_eco: Optional[float] = None,
+               max_cost: Optional[float] = None) -> int:
+        """
+        Bitmap of rows matching every given facet. Locations, types and the eco/cost ranges are hard
+        constraints. Interests narrow everything except INTEREST_EXEMPT_TYPES, and only when at least
+        MIN_INTEREST_ROWS rows match, so a niche interest cannot starve the planner.
+        """
+        bitmap = self.all
+        if locations:
+            bitmap &= self.facet("location", locations)
+        if data_types:
+            bitmap &= self.facet("data_type", data_types)
+        if min_eco:
+            bitmap &= self.range("eco_score", low=min_eco)
+        if max_cost is not None:
+            bitmap &= self.range("cost", high=max_cost)
+        if interests:
+            exempt = bitmap & self.facet("data_type", INTEREST_EXEMPT_TYPES)
+            narrowed = bitmap & self.facet("interest", interests) & ~exempt
+            if self.count(narrowed) >= MIN_INTEREST_ROWS:
+                bitmap = narrowed | exempt
+        return bitmap
+
+    @staticmethod
+    def count(bitmap: int) -> int:
+        return bitmap.bit_count()
+
+    def indices(self, bitmap: int) -> np.ndarray:
+        """Row indices set in `bitmap`, ascending."""
+        if not bitmap:
+            return np.empty(0, dtype=np.int64)
+        raw = np.frombuffer(bitmap.to_bytes((self.rows + 7) // 8, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder="little")[:self.rows])
+
+    def counts(self, locations: Optional[Iterable[str]] = None, interests: Optional[Iterable[str]] = None,
+               min_eco: Optional[float] = None) -> Dict[str, Any]:
+        """Live counts for the sidebar: total matches, per data_type and per interest."""
+        base = self.select(locations=locations, min_eco=min_eco)
+        selected = self.select(locations=locations, interests=interests, min_eco=min_eco)
+        return {
+            "total": self.count(selected),
+            "by_type": {t: self.count(selected & b) for t, b in self.bitmaps["data_type"].items() if selected & b},
+            "by_interest": {i: self.count(base & b) for i, b in self.bitmaps["interest"].items()},
+        }
+
+
+_indexes: Dict[str, FacetIndex] = {}
+_index_versions: Dict[str, Optional[str]] = {}
+_index_lock = threading.Lock()
+
+
+def get_facets(data_dir: str = DATA_DIR) -> Optional[FacetIndex]:
+    """Process-wide facet index for data_dir, rebuilt when the catalog snapshot changes (None without one)."""
+    snapshot = get_snapshot(data_dir)
+    if snapshot is None:
+        return None
+    with _index_lock:
+        if _index_versions.get(data_dir) != snapshot.version:
+            try:
+                _indexes[data_dir] = FacetIndex(snapshot)
+                _index_versions[data_dir] = snapshot.version
+            except Exception as e:
+                logger.error(f"Facet index build failed: {e}")
+                return None
+        return _indexes[data_dir]
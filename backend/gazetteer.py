@@ -0,0 +1,189 @@
+"""
+Gazetteer-backed query understanding.
+
+A single Aho-Corasick automaton holds every catalog location (+ aliases from
+data/regions.json), venue name, category synonym and price word. One pass over
+the lower-cased query finds all of them, whatever the dictionary size, and
+turns "Add more beach activities near Sharjah" into structured filters:
+
+    {"locations": ["Sharjah"], "categories": ["Activity"], "venues": [], "price": None}
+"""
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from backend.catalog_snapshot import DATA_DIR, get_snapshot
+
+# data_type -> words that ask for it
+CATEGORY_TERMS: Dict[str, List[str]] = {
+    "Hotel": ["hotel", "hotels", "stay", "stays", "resort", "resorts", "accommodation", "lodge", "lodging"],
+    "Activity": ["activity", "activities", "tour", "tours", "adventure", "adventures", "experience", "experiences"],
+    "Place": ["place", "places", "sight", "sights", "attraction", "attractions", "landmark", "landmarks", "sightseeing"],
+    "Food": ["food", "restaurant", "restaurants", "cafe", "cafes", "dining", "eat", "eats", "brunch", "dinner", "lunch"],
+    "Nightlife": ["nightlife", "bar", "bars", "lounge", "lounges", "club", "clubs", "rooftop"],
+    "Shopping": ["shopping", "shop", "shops", "market", "markets", "souk", "souks", "mall", "malls"],
+    "Transport": ["transport", "transportation", "metro", "taxi", "taxis", "bus", "buses", "tram", "ferry", "commute"],
+}
+PRICE_TERMS: Dict[str, List[str]] = {
+    "free": ["free", "no cost", "free entry"],
+    "low": ["cheap", "cheaper", "budget", "affordable", "inexpensive", "low cost", "low-cost", "save money", "reduce the budget"],
+    "high": ["luxury", "luxurious", "premium", "upscale", "high-end", "splurge", "5-star", "five star"],
+}
+MIN_VENUE_LENGTH = 4
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: build once, then find every pattern occurrence in O(len(text) + matches)."""
+
+    def __init__(self) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]      # pattern ids ending exactly here
+        self._link: List[int] = [-1]           # nearest suffix node that has output
+        self.patterns: List[str] = []
+        self.values: List[List[Any]] = []
+        self._ids: Dict[str, int] = {}
+
+    def add(self, pattern: str, value: Any) -> None:
+        pattern = pattern.lower().strip()
+        if not pattern:
+            return
+        pid = self._ids.get(pattern)
+        if pid is not None:
+            if value not in self.values[pid]:
+                self.values[pid].append(value)
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._link.append(-1)
+            node = nxt
+        pid = len(self.patterns)
+        self._ids[pattern] = pid
+        self.patterns.append(pattern)
+        self.values.append([value])
+        self._out[node].append(pid)
+
+    def build(self) -> "AhoCorasick":
+        """Computes failure and output links (BFS)."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                fail = self._fail[child]
+                self._link[child] = fail if self._out[fail] else self._link[fail]
+        return self
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, int, int]]:
+        """Yields (start, end, pattern_id) for every occurrence in `text` (already lower-cased)."""
+        goto, fail, out, link, patterns = self._goto, self._fail, self._out, self._link, self.patterns
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if out[node] else link[node]
+            while hit > 0:
+                for pid in out[hit]:
+                    yield i + 1 - len(patterns[pid]), i + 1, pid
+                hit = link[hit]
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """Whole-word, leftmost-longest, non-overlapping matches."""
+        text = text.lower()
+        n = len(text)
+        matches = [
+            (s, e, pid) for s, e, pid in self.iter_matches(text)
+            if (s == 0 or not text[s - 1].isalnum()) and (e == n or not text[e].isalnum())
+        ]
+        matches.sort(key=lambda m: (m[0], m[0] - m[1]))
+        chosen, last_end = [], -1
+        for s, e, pid in matches:
+            if s >= last_end:
+                chosen.append((s, e, pid))
+                last_end = e
+        return chosen
+
+
+class Gazetteer:
+    def __init__(self, snapshot=None, regions=None) -> None:
+        self.automaton = AhoCorasick()
+        self.price_limits: Dict[str, Tuple[float, float]] = {}  # data_type -> (p33, p66) of cost
+        if regions is not None:
+            for term, name in regions.terms():
+                self.automaton.add(term, ("location", name))
+        for data_type, words in CATEGORY_TERMS.items():
+            for word in words:
+                self.automaton.add(word, ("category", data_type))
+        for band, words in PRICE_TERMS.items():
+            for word in words:
+                self.automaton.add(word, ("price", band))
+        if snapshot is not None and len(snapshot):
+            self._add_venues(snapshot)
+            self._price_bands(snapshot)
+        self.automaton.build()
+
+    def _add_venues(self, snapshot) -> None:
+        offsets, heap = snapshot.offsets["name"], snapshot.heaps["name"]
+        raw = bytes(heap).decode("utf-8") if len(heap) else ""
+        # Offsets are byte positions; decode per row only when the heap is not pure ASCII
+        ascii_only = len(raw) == len(heap)
+        for i in range(len(snapshot)):
+            name = raw[offsets[i]:offsets[i + 1]] if ascii_only else snapshot.value("name", i)
+            if name and len(name) >= MIN_VENUE_LENGTH:
+                self.automaton.add(name, ("venue", i))
+
+    def _price_bands(self, snapshot) -> None:
+        cost = np.asarray(snapshot.numeric["cost"])
+        codes = np.asarray(snapshot.codes["data_type"])
+        for code, data_type in enumerate(snapshot.dictionaries["data_type"]):
+            values = cost[(codes == code) & (cost > 0)]
+            if len(values):
+                self.price_limits[data_type] = (float(np.percentile(values, 33)), float(np.percentile(values, 66)))
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """Structured filters found in free text (lists keep first-mention order)."""
+        filters: Dict[str, Any] = {"locations": [], "categories": [], "venues": [], "price": None}
+        for _, _, pid in self.automaton.find(text or ""):
+            for kind, value in self.automaton.values[pid]:
+                if kind == "price":
+                    filters["price"] = filters["price"] or value
+                    continue
+                bucket = filters[{"location": "locations", "category": "categories", "venue": "venues"}[kind]]
+                if value not in bucket:
+                    bucket.append(value)
+        return filters
+
+
+_gazetteers: Dict[str, Gazetteer] = {}
+_gazetteer_versions: Dict[str, Optional[str]] = {}
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer(data_dir: str = DATA_DIR) -> Gazetteer:
+    """Process-wide gazetteer for data_dir, rebuilt when the catalog snapshot changes."""
+    from backend.regions import get_regions
+
+    snapshot = get_snapshot(data_dir)
+    version = snapshot.version if snapshot is not None else None
+    with _gazetteer_lock:
+        if data_dir not in _gazetteers or _gazetteer_versions.get(data_dir) != version:
+            _gazetteers[data_dir] = Gazetteer(snapshot, get_regions(data_dir))
+            _gazetteer_versions[data_dir] = version
+        return _gazetteers[data_dir]
+
+
+def extract_filters(query: str, data_dir: str = DATA_DIR) -> Dict[str, Any]:
+    return get_gazetteer(data_dir).extract(query)
@@ -0,0 +1,253 @@
+"""
+Geospatial index and day routing.
+
+GeoIndex is a uniform lat/lon grid over catalog rows that have coordinates.
+Rows are sorted by cell key (cell row * width + cell column), so the cells
+of one grid row in a query box form one contiguous key range, found with
+searchsorted. A radius query reads those ranges and filters them by exact
+haversine distance. nearest() widens the radius until it has k rows.
+
+Retrieval uses nearby_rows() to add good catalog rows around the chosen
+hotel that text search missed. For an itinerary, cluster_days() splits the stops into balanced k-means
+day groups. order_stops() orders each day as a loop from the hotel:
+nearest neighbour, then 2-opt.
+"""
+import os
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from utils.logger import logger
+from backend.catalog_snapshot import DATA_DIR, get_snapshot
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+GEO_CELL_KM: float = float(os.getenv("GEO_CELL_KM", "2"))
+PROXIMITY_KM: float = float(os.getenv("PROXIMITY_KM", "15"))  # proximity score reaches 0 at this distance
+UNROUTED_TYPES = ("Hotel", "Transport")  # the hotel is the daily base; transport is not a stop
+_GRID_WIDTH = 1 << 21
+
+
+def haversine_km(lat1: Any, lon1: Any, lat2: Any, lon2: Any) -> np.ndarray:
+    """Great-circle distance in km (broadcasts over arrays)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def distance_matrix(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    return haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+def coordinates(item: Any) -> Optional[Tuple[float, float]]:
+    """(lat, lon) of a candidate / activity dict, or None when missing or invalid."""
+    try:
+        lat, lon = float(item.get("lat")), float(item.get("lon"))
+    except (TypeError, ValueError, AttributeError):
+        return None
+    if math.isnan(lat) or math.isnan(lon) or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class GeoIndex:
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, cell_km: float = GEO_CELL_KM) -> None:
+        lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(lat) & ~np.isnan(lon))
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        keys = self._keys(lat[valid], lon[valid])
+        order = np.argsort(keys, kind="stable")
+        self.rows = valid[order]                 # catalog row of each indexed point
+        self.keys = keys[order]
+        self.lat, self.lon = lat[self.rows], lon[self.rows]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _cell(self, value: Any) -> np.ndarray:
+        return np.floor(np.asarray(value, dtype=np.float64) / self.cell_deg).astype(np.int64)
+
+    def _keys(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        return self._cell(lat) * _GRID_WIDTH + self._cell(lon) + _GRID_WIDTH // 2
+
+    def _box(self, lat: float, lon: float, km: float) -> np.ndarray:
+        """Positions of all points in the grid cells covering the km-box around (lat, lon)."""
+        dlat = km / KM_PER_DEGREE
+        dlon = km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        if dlon >= 180:
+            return np.arange(len(self.rows))
+        x0, x1 = int(self._cell(lon - dlon)) + _GRID_WIDTH // 2, int(self._cell(lon + dlon)) + _GRID_WIDTH // 2
+        spans = []
+        for cy in range(int(self._cell(max(lat - dlat, -90.0))), int(self._cell(min(lat + dlat, 90.0))) + 1):
+            lo, hi = np.searchsorted(self.keys, [cy * _GRID_WIDTH + x0, cy * _GRID_WIDTH + x1 + 1])
+            if hi > lo:
+                spans.append(np.arange(lo, hi))
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def radius(self, lat: float, lon: float, km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(catalog rows, distances in km) within km of the point, nearest first."""
+        positions = self._box(lat, lon, km)
+        dist = haversine_km(lat, lon, self.lat[positions], self.lon[positions])
+        keep = dist <= km
+        positions, dist = positions[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return self.rows[positions[order]], dist[order]
+
+    def nearest(self, lat: float, lon: float, k: int = 10, max_km: float = 2 * math.pi * EARTH_RADIUS_KM) -> Tuple[np.ndarray, np.ndarray]:
+        """(catalog rows, distances in km) of the k nearest points (within max_km)."""
+        km = GEO_CELL_KM
+        while True:
+            rows, dist = self.radius(lat, lon, min(km, max_km))
+            if len(rows) >= k or km >= max_km:
+                return rows[:k], dist[:k]
+            km *= 2
+
+
+_indexes: Dict[str, GeoIndex] = {}
+_index_versions: Dict[str, str] = {}
+_index_lock = threading.Lock()
+
+
+def get_geo_index(data_dir: str = DATA_DIR) -> Optional[GeoIndex]:
+    """Process-wide grid over the catalog snapshot's coordinates (None without a snapshot or coordinates)."""
+    snapshot = get_snapshot(data_dir)
+    if snapshot is None or "lat" not in snapshot.numeric:
+        return None
+    with _index_lock:
+        if _index_versions.get(data_dir) != snapshot.version:
+            try:
+                _indexes[data_dir] = GeoIndex(snapshot.numeric["lat"], snapshot.numeric["lon"])
+                _index_versions[data_dir] = snapshot.version
+            except Exception as e:
+                logger.error(f"Geo index build failed: {e}")
+                return None
+        return _indexes[data_dir]
+
+
+def nearby_rows(lat: float, lon: float, km: float = PROXIMITY_KM, allowed: Optional[np.ndarray] = None,
+                data_dir: str = DATA_DIR) -> np.ndarray:
+    """Snapshot rows within km of the point, nearest first (only `allowed` rows when given)."""
+    index = get_geo_index(data_dir)
+    if index is None:
+        return np.empty(0, dtype=np.int64)
+    rows, _ = index.radius(lat, lon, km)
+    return rows[np.isin(rows, allowed)] if allowed is not None else rows
+
+
+# -- itinerary routing --
+
+def cluster_days(lat: np.ndarray, lon: np.ndarray, days: int, iterations: int = 10) -> np.ndarray:
+    """
+    Day label per stop: k-means (farthest-point seeding) with at most ceil(n / days) stops a day.
+    Stops whose nearest and second-nearest centres differ most are placed first.
+    """
+    n = len(lat)
+    days = max(1, min(days, n))
+    if days == 1:
+        return np.zeros(n, dtype=np.int64)
+    points = np.column_stack([lat, lon * math.cos(math.radians(float(np.mean(lat))))])  # local equirectangular
+    centres = [points[0]]
+    for _ in range(1, days):
+        gap = np.min([((points - c) ** 2).sum(axis=1) for c in centres], axis=0)
+        centres.append(points[int(np.argmax(gap))])
+    centres = np.array(centres)
+    capacity = math.ceil(n / days)
+    labels = np.zeros(n, dtype=np.int64)
+    for _ in range(iterations):
+        d2 = ((points[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        ranked = np.sort(d2, axis=1)
+        urgency = ranked[:, 1] - ranked[:, 0]
+        load = np.zeros(days, dtype=np.int64)
+        new_labels = np.empty(n, dtype=np.int64)
+        for i in np.argsort(-urgency, kind="stable"):
+            for c in np.argsort(d2[i], kind="stable"):
+                if load[c] < capacity:
+                    new_labels[i] = c
+                    load[c] += 1
+                    break
+        centres = np.array([points[new_labels == c].mean(axis=0) if (new_labels == c).any() else centres[c] for c in range(days)])
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return labels
+
+
+def route_km(dist: np.ndarray, order: Sequence[int], closed: bool = False) -> float:
+    legs = [dist[a, b] for a, b in zip(order, order[1:])]
+    if closed and len(order) > 1:
+        legs.append(dist[order[-1], order[0]])
+    return float(sum(legs))
+
+
+def order_stops(dist: np.ndarray, start: int = 0, closed: bool = True) -> List[int]:
+    """Visiting order over a distance matrix from `start`: nearest neighbour, then 2-opt."""
+    n = len(dist)
+    order, left = [start], set(range(n)) - {start}
+    while left:
+        here = order[-1]
+        nxt = min(left, key=lambda j: dist[here, j])
+        order.append(nxt)
+        left.remove(nxt)
+    improved = True
+    while improved and n > 3:
+        improved = False
+        for i in range(1, n - 1):
+            for j in range(i + 1, n if closed else n - 1):
+                a, b = order[i - 1], order[i]
+                c, d = order[j], order[(j + 1) % n]
+                if dist[a, c] + dist[b, d] < dist[a, b] + dist[c, d] - 1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+    return order
+
+
+def plan_routes(activities: Sequence[Dict[str, Any]], days: int) -> List[Dict[str, Any]]:
+    """
+    Per-day routes over the activities that have coordinates:
+    [{"day": 1, "stops": [activity, ...], "km": loop length from the hotel}], hotel first when known.
+    """
+    located = [(a, coordinates(a)) for a in activities]
+    hotel = next((a for a, ll in located if ll and a.get("data_type") == "Hotel"), None)
+    stops = [(a, ll) for a, ll in located if ll and a.get("data_type") not in UNROUTED_TYPES]
+    if not stops:
+        return []
+    lat = np.array([ll[0] for _, ll in stops])
+    lon = np.array([ll[1] for _, ll in stops])
+    labels = cluster_days(lat, lon, days)
+    base = coordinates(hotel) if hotel else None
+    routes = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        day_lat, day_lon = lat[members], lon[members]
+        if base:
+            day_lat, day_lon = np.concatenate([[base[0]], day_lat]), np.concatenate([[base[1]], day_lon])
+        dist = distance_matrix(day_lat, day_lon)
+        order = order_stops(dist, 0, closed=base is not None)
+        ordered = [stops[members[i - 1]][0] if base else stops[members[i]][0] for i in order if not (base and i == 0)]
+        routes.append({"stops": ([hotel] if base else []) + ordered, "km": round(route_km(dist, order, closed=base is not None), 1),
+                       "_reach": float(dist[0, 1:].mean()) if base else 0.0})
+    routes.sort(key=lambda r: r.pop("_reach"))  # nearest day first
+    for day, route in enumerate(routes, 1):
+        route["day"] = day
+    return routes
+
+
+def proximity_scores(candidates: Sequence[Dict[str, Any]], anchor: Tuple[float, float], km: float = PROXIMITY_KM) -> np.ndarray:
+    """1 at the anchor, falling linearly to 0 at km; 0.5 (neutral) without coordinates."""
+    out = np.full(len(candidates), 0.5)
+    located = [(i, ll) for i, ll in enumerate(coordinates(c) for c in candidates) if ll]
+    if located:
+        idx = np.array([i for i, _ in located])
+        dist = haversine_km(anchor[0], anchor[1], [ll[0] for _, ll in located], [ll[1] for _, ll in located])
+        out[idx] = np.clip(1.0 - dist / km, 0.0, 1.0)
+    return out
+
+
+def attach_coordinates(activities: List[Dict[str, Any]], candidates: Sequence[Dict[str, Any]]) -> None:
+    """Copies lat/lon from the retrieved candidates onto itinerary activities with the same name."""
+    known = {str(c.get("name", "")).strip().lower(): ll for c in candidates for ll in [coordinates(c)] if ll}
+    for activity in activities:
+        if isinstance(activity, dict) and coordinates(activity) is None:
+            ll = known.get(str(activity.get("name", "")).strip().lower())
+            if ll:
+                activity["lat"], activity["lon"] = ll
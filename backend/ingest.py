@@ -0,0 +1,299 @@
+"""
+Streaming catalog ingestion.
+
+    python -m backend.ingest                              # data/*.csv -> the search collection
+    python -m backend.ingest feeds/partner.csv.gz --recreate
+    python -m backend.ingest dump.jsonl --dry-run         # normalize + validate only, print the counts
+
+Sources (CSV, optionally gz/bz2/zip/xz compressed, or JSON lines) are read in
+fixed-size chunks, so memory use depends on INGEST_CHUNK_ROWS rather than the
+file size (plus 8 bytes a record for the dedupe hashes). Each chunk goes through the same steps:
+    normalize  normalize_frame(): one record schema (RECORD_COLUMNS), cost from
+               price / price_per_night / entry_fee, canonical data_type and cost_type
+    validate   rows without a name or location, or with out-of-range scores or
+               prices, are dropped; bad coordinates or ratings are cleared
+    dedupe     64-bit content hash of the canonical record; hashes already seen
+               in this run are dropped
+Point ids hash the record's identity (source feed, name, location), not its
+content, so re-ingesting a feed with edited rows overwrites their points.
+Rows removed from a feed keep their points until the collection is recreated.
+A reader thread stays up to INGEST_PREFETCH chunks ahead, so parsing overlaps
+with embedding. Batches of INGEST_EMBED_BATCH records are embedded and upserted
+as soon as they are ready.
+"""
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import numpy as np
+import pandas as pd
+from utils.logger import logger
+from backend.catalog_store import (
+    RECORD_COLUMNS, DICT_COLUMNS, STRING_COLUMNS, ROW_DEFAULTS, normalize_frame,
+)
+
+DATA_DIR: str = os.path.join(BASE_DIR, "data")
+INGEST_CHUNK_ROWS: int = int(os.getenv("INGEST_CHUNK_ROWS", "50000"))
+INGEST_EMBED_BATCH: int = int(os.getenv("INGEST_EMBED_BATCH", "256"))
+INGEST_PREFETCH: int = int(os.getenv("INGEST_PREFETCH", "2"))
+SOURCE_SUFFIXES = (".csv", ".jsonl", ".ndjson")
+COMPRESSION_SUFFIXES = (".gz", ".bz2", ".zip", ".xz")
+# file stem -> data_type, for feeds that have no data_type column
+SOURCE_TYPES = {
+    "hotels": "Hotel", "activities": "Activity", "places": "Place", "food": "Food",
+    "nightlife": "Nightlife", "shopping": "Shopping", "transport": "Transport",
+}
+
+
+# -----------------------------------------
+# Read
+# -----------------------------------------
+def _source_name(path: str) -> str:
+    name = os.path.basename(path).lower()
+    for suffix in COMPRESSION_SUFFIXES:
+        name = name[: -len(suffix)] if name.endswith(suffix) else name
+    return name
+
+
+def source_files(paths: Iterable[str]) -> List[str]:
+    """Expands directories into their catalog files (sorted); files are kept as given."""
+    out = []
+    for path in paths:
+        if os.path.isdir(path):
+            out += [os.path.join(path, f) for f in sorted(os.listdir(path)) if _source_name(f).endswith(SOURCE_SUFFIXES)]
+        else:
+            out.append(path)
+    return out
+
+
+def read_chunks(path: str, chunk_rows: int = INGEST_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Raw chunks of a CSV / JSON-lines source, every column read as text."""
+    if _source_name(path).endswith((".jsonl", ".ndjson")):
+        for chunk in pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False):
+            yield chunk.astype(object).where(chunk.notna(), None)
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=True, on_bad_lines="warn")
+
+
+def normalize_chunk(chunk: pd.DataFrame, source: str = "") -> pd.DataFrame:
+    """normalize_frame() on one chunk, with the data_type implied by the file name where a row has none."""
+    implied = SOURCE_TYPES.get(_source_name(source).split(".")[0])
+    if implied:
+        current = chunk["data_type"] if "data_type" in chunk.columns else pd.Series(None, index=chunk.index, dtype=object)
+        chunk["data_type"] = current.where(current.notna() & (current.astype(str).str.strip() != ""), implied)
+    return normalize_frame(chunk)[list(RECORD_COLUMNS)]
+
+
+# -----------------------------------------
+# Validate / dedupe
+# -----------------------------------------
+def validate_chunk(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """(valid rows, rejected count per reason). Bad coordinates / ratings are cleared, not rejected."""
+    reasons = {
+        "no_name": chunk["name"] == "",
+        "no_location": chunk["location"] == "",
+        "eco_score": ~chunk["eco_score"].between(0, 10),
+        "cost": chunk["cost"] < 0,
+    }
+    bad = np.zeros(len(chunk), dtype=bool)
+    rejected = {}
+    for reason, mask in reasons.items():
+        mask = mask.to_numpy() & ~bad  # count each row once, under its first reason
+        if mask.any():
+            rejected[reason] = int(mask.sum())
+        bad |= mask
+    chunk = chunk[~bad]
+    bad_coords = chunk["lat"].notna() & ~(chunk["lat"].between(-90, 90) & chunk["lon"].between(-180, 180))
+    if bad_coords.any():
+        chunk = chunk.copy()
+        chunk.loc[bad_coords, ["lat", "lon"]] = np.nan
+    bad_rating = chunk["avg_rating"].notna() & ~chunk["avg_rating"].between(0, 5)
+    if bad_rating.any():
+        chunk = chunk.copy()
+        chunk.loc[bad_rating, "avg_rating"] = np.nan
+    return chunk, rejected
+
+
+def content_hashes(chunk: pd.DataFrame) -> np.ndarray:
+    """Stable 64-bit hash of each canonical record (same row -> same hash across runs and files)."""
+    return pd.util.hash_pandas_object(chunk[list(RECORD_COLUMNS)], index=False).to_numpy(dtype=np.uint64)
+
+
+def point_ids(chunk: pd.DataFrame, source: str = "") -> np.ndarray:
+    """Stable 64-bit id per record from its source feed, name and location (case-insensitive)."""
+    identity = pd.DataFrame({
+        "source": _source_name(source).split(".")[0],
+        "name": chunk["name"].str.strip().str.lower(),
+        "location": chunk["location"].str.strip().str.lower(),
+    })
+    return pd.util.hash_pandas_object(identity, index=False).to_numpy(dtype=np.uint64)
+
+
+class SeenHashes:
+    """Sorted uint64 array of hashes already ingested (8 bytes a row)."""
+
+    def __init__(self) -> None:
+        self.hashes = np.zeros(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add_new(self, hashes: np.ndarray) -> np.ndarray:
+        """Boolean mask of `hashes` not seen before (first occurrence within the batch wins); records them."""
+        _, first = np.unique(hashes, return_index=True)
+        keep = np.zeros(len(hashes), dtype=bool)
+        keep[first] = True
+        if len(self.hashes):
+            pos = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+            keep &= self.hashes[pos] != hashes
+        if keep.any():
+            new = np.sort(hashes[keep])
+            self.hashes = np.insert(self.hashes, np.searchsorted(self.hashes, new), new)  # linear merge, no re-sort
+        return keep
+
+
+def iter_records(paths: Sequence[str], chunk_rows: int = INGEST_CHUNK_ROWS, dedupe: bool = True,
+                 stats: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[np.ndarray, pd.DataFrame]]:
+    """(point ids, canonical frame) per chunk of every source, validated and deduplicated by content."""
+    stats = stats if stats is not None else {}
+    seen = SeenHashes() if dedupe else None
+    for path in source_files(paths):
+        try:
+            for raw in read_chunks(path, chunk_rows):
+                stats["read"] = stats.get("read", 0) + len(raw)
+                chunk, rejected = validate_chunk(normalize_chunk(raw, path))
+                for reason, count in rejected.items():
+                    stats.setdefault("rejected", {})[reason] = stats.get("rejected", {}).get(reason, 0) + count
+                hashes = content_hashes(chunk)
+                if seen is not None:
+                    keep = seen.add_new(hashes)
+                    stats["duplicates"] = stats.get("duplicates", 0) + int((~keep).sum())
+                    chunk = chunk[keep]
+                if len(chunk):
+                    stats["records"] = stats.get("records", 0) + len(chunk)
+                    yield point_ids(chunk, path), chunk.reset_index(drop=True)
+        except Exception as e:
+            logger.error(f"Ingest read error {path}: {e}")
+            stats.setdefault("failed_sources", []).append(path)
+
+
+def prefetch(iterator: Iterator[Any], depth: int = INGEST_PREFETCH) -> Iterator[Any]:
+    """Runs `iterator` in a reader thread, at most `depth` items ahead of the consumer."""
+    if depth <= 0:
+        yield from iterator
+        return
+    items: "queue.Queue" = queue.Queue(maxsize=depth)
+    done = object()
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False  # the consumer went away
+
+    def produce() -> None:
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+        except Exception as e:
+            put(e)
+        put(done)
+
+    threading.Thread(target=produce, name="ingest-reader", daemon=True).start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def to_payloads(chunk: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Plain dicts in the snapshot's row shape: None for missing values, default image."""
+    records = chunk.astype(object).where(chunk.notna(), None).to_dict("records")
+    for r in records:
+        for col in DICT_COLUMNS + STRING_COLUMNS:
+            if r[col] == "":
+                r[col] = ROW_DEFAULTS.get(col)
+    return records
+
+
+# -----------------------------------------
+# Embed + index
+# -----------------------------------------
+def ingest(paths: Sequence[str], client: Any, embedder: Any, collection: str,
+           chunk_rows: int = INGEST_CHUNK_ROWS, embed_batch: int = INGEST_EMBED_BATCH,
+           recreate: bool = False) -> Dict[str, Any]:
+    """Streams `paths` into a Qdrant collection; returns the run's counts."""
+    from qdrant_client import models
+    from backend.quantization import collection_params
+    from backend.shards import index_text
+
+    if recreate and client.collection_exists(collection):
+        client.delete_collection(collection)
+    if not client.collection_exists(collection):
+        client.create_collection(collection_name=collection, **collection_params())
+
+    stats: Dict[str, Any] = {"indexed": 0}
+    start = time.perf_counter()
+    for ids, chunk in prefetch(iter_records(paths, chunk_rows, stats=stats)):
+        payloads = to_payloads(chunk)
+        for offset in range(0, len(payloads), embed_batch):
+            batch = payloads[offset:offset + embed_batch]
+            vectors = embedder.encode([index_text(r) for r in batch])
+            client.upsert(collection_name=collection, points=[
+                models.PointStruct(id=int(i), vector=np.asarray(v).tolist(), payload=r)
+                for i, v, r in zip(ids[offset:offset + embed_batch], vectors, batch)
+            ])
+            stats["indexed"] += len(batch)
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    logger.info(f"Ingested {stats['indexed']} records into {collection} ({stats})")
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream catalog feeds into the search collection")
+    parser.add_argument("paths", nargs="*", default=[DATA_DIR], help="Files or directories (default: data/)")
+    parser.add_argument("--collection", default=None, help="Target collection (default: the RAG collection)")
+    parser.add_argument("--chunk-rows", type=int, default=INGEST_CHUNK_ROWS)
+    parser.add_argument("--embed-batch", type=int, default=INGEST_EMBED_BATCH)
+    parser.add_argument("--recreate", action="store_true", help="Drop the collection first")
+    parser.add_argument("--dry-run", action="store_true", help="Normalize, validate and dedupe only")
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        stats: Dict[str, Any] = {}
+        for _ in iter_records(args.paths, args.chunk_rows, stats=stats):
+            pass
+        print(stats)
+        return 0
+
+    from backend.rag_engine import RAGEngine, COLLECTION
+    rag = RAGEngine()
+    if rag.client is None:
+        print("❌ Qdrant is not reachable.")
+        return 1
+    print(ingest(args.paths, rag.client, rag.embedder, args.collection or COLLECTION,
+                 args.chunk_rows, args.embed_batch, args.recreate))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
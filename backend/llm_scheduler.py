@@ -0,0 +1,223 @@
+"""
+Process-wide LLM scheduler in front of AgentWorkflow._ask.
+
+All Gemini calls in a process (every Streamlit session, API request or batch
+worker) take a slot here first. Slots are admitted strictly by priority, so
+interactive chat and plan generation never queue behind background artifacts,
+and only when both the requests-per-minute and tokens-per-minute buckets have
+room. When the queue is full new calls are rejected immediately (backpressure)
+and callers fall back to their mock answers instead of piling up.
+"""
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Optional
+import numpy as np
+from utils.logger import logger
+
+# Lower number = admitted first
+PRIORITY_INTERACTIVE = 0   # chat answers
+PRIORITY_PLAN = 1          # plan generation / refinement
+PRIORITY_BACKGROUND = 5    # packing lists, stories, upgrades, summaries, prefetch
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_PLAN: "plan", PRIORITY_BACKGROUND: "background"}
+
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))                     # 0 = unlimited
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))                     # 0 = unlimited
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "0"))     # 0 = unlimited
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "256"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+EXPECTED_OUTPUT_TOKENS = {PRIORITY_INTERACTIVE: 200, PRIORITY_PLAN: 1500, PRIORITY_BACKGROUND: 600}
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the scheduler queue is full (caller should degrade, not wait)."""
+
+
+def estimate_tokens(prompt: str, priority: int = PRIORITY_PLAN) -> int:
+    """Rough prompt + expected completion size (~4 chars per token)."""
+    return len(prompt) // 4 + EXPECTED_OUTPUT_TOKENS.get(priority, 500)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `per_minute` (0 = unlimited)."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or max(1.0, per_minute / 60.0 * 10)  # ~10s of burst
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n: float = 1) -> float:
+        """Seconds until n tokens are available (0 if available now)."""
+        if self.unlimited:
+            return 0.0
+        with self.lock:
+            self._refill()
+            n = min(n, self.capacity)  # oversized requests wait for a full bucket
+            return 0.0 if self.tokens >= n else (n - self.tokens) / self.rate
+
+    def take(self, n: float = 1) -> None:
+        """Debits n tokens (may go negative to account for under-estimates)."""
+        if self.unlimited:
+            return
+        with self.lock:
+            self._refill()
+            self.tokens -= min(n, self.capacity) if n > 0 else n
+
+    def acquire(self, n: float = 1) -> None:
+        """Blocks until n tokens are available, then takes them."""
+        while True:
+            wait_s = self.wait_time(n)
+            if wait_s <= 0:
+                self.take(n)
+                return
+            time.sleep(wait_s)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "enqueued", "admitted", "abandoned")
+
+    def __init__(self, priority: int, seq: int, tokens: int) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.admitted = False
+        self.abandoned = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Ticket:
+    """Handle for one admitted call; report real token usage when known."""
+
+    def __init__(self, scheduler: "LLMScheduler", estimated: int) -> None:
+        self.scheduler = scheduler
+        self.estimated = estimated
+
+    def record_usage(self, total_tokens: Optional[int]) -> None:
+        if total_tokens:
+            self.scheduler.tpm.take(total_tokens - self.estimated)
+
+
+class LLMScheduler:
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM, max_inflight: int = LLM_MAX_INFLIGHT,
+                 max_queue: int = LLM_MAX_QUEUE) -> None:
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm, capacity=tpm / 6 if tpm else None)
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.inflight = 0
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._queue_ms: Dict[int, Deque[float]] = defaultdict(lambda: deque(maxlen=1000))
+        self._counts: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    # -- admission --
+    def _queued(self) -> int:
+        return sum(1 for w in self._heap if not w.abandoned)
+
+    def _dispatch(self) -> float:
+        """Admits waiters from the head of the queue; returns seconds until the head could run."""
+        while self._heap:
+            head = self._heap[0]
+            if head.abandoned:
+                heapq.heappop(self._heap)
+                continue
+            if self.max_inflight and self.inflight >= self.max_inflight:
+                return LLM_QUEUE_TIMEOUT  # woken by release()
+            wait_s = max(self.rpm.wait_time(1), self.tpm.wait_time(head.tokens))
+            if wait_s > 0:
+                return wait_s
+            heapq.heappop(self._heap)
+            self.rpm.take(1)
+            self.tpm.take(head.tokens)
+            self.inflight += 1
+            head.admitted = True
+            self._cond.notify_all()
+        return LLM_QUEUE_TIMEOUT
+
+    def acquire(self, priority: int, tokens: int, timeout: float = LLM_QUEUE_TIMEOUT) -> None:
+        counts = self._counts[priority]
+        with self._cond:
+            counts["submitted"] += 1
+            # Background work is shed first: it may only use half of the queue
+            limit = self.max_queue // 2 if priority >= PRIORITY_BACKGROUND else self.max_queue
+            if self._queued() >= limit:
+                counts["rejected"] += 1
+                raise QueueFullError(f"LLM queue full ({self._queued()} waiting)")
+
+            waiter = _Waiter(priority, next(self._seq), tokens)
+            heapq.heappush(self._heap, waiter)
+            deadline = waiter.enqueued + timeout
+            while True:
+                next_wait = self._dispatch()
+                if waiter.admitted:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    waiter.abandoned = True
+                    counts["timed_out"] += 1
+                    self._cond.notify_all()
+                    raise TimeoutError(f"Waited {timeout:.0f}s for an LLM slot")
+                self._cond.wait(min(remaining, max(next_wait, 0.005)))
+
+            counts["admitted"] += 1
+            self._queue_ms[priority].append((time.monotonic() - waiter.enqueued) * 1000)
+
+    def release(self) -> None:
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = PRIORITY_PLAN, tokens: int = 0, timeout: float = LLM_QUEUE_TIMEOUT):
+        self.acquire(priority, tokens, timeout)
+        try:
+            yield Ticket(self, tokens)
+        finally:
+            self.release()
+
+    # -- metrics --
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            out: Dict[str, Any] = {"queued": self._queued(), "inflight": self.inflight}
+            for priority, counts in self._counts.items():
+                times = np.array(self._queue_ms[priority] or [0.0])
+                out[PRIORITY_NAMES.get(priority, str(priority))] = {
+                    **counts,
+                    "queue_ms_p50": round(float(np.percentile(times, 50)), 1),
+                    "queue_ms_p95": round(float(np.percentile(times, 95)), 1),
+                }
+            return out
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """The process-wide scheduler (shared by every session / request thread)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+                logger.info(f"LLM scheduler: rpm={LLM_RPM or '∞'} tpm={LLM_TPM or '∞'} max_queue={LLM_MAX_QUEUE}")
+    return _scheduler
@@ -0,0 +1,52 @@
+"""
+Quantized vector storage for the catalog collection.
+
+Full float32 vectors (384 x 4 B = 1.5 KB per item) are kept on disk (mmap) and
+only compressed codes stay in RAM: int8 scalar codes are 4x smaller, 1-bit
+binary codes 32x. Search runs over the codes, then rescores the top
+`limit * oversampling` hits against the original vectors.
+"""
+import os
+from typing import Any, Dict, Optional
+from qdrant_client import models
+
+EMBEDDING_DIM = 384
+QDRANT_QUANTIZATION: str = os.getenv("QDRANT_QUANTIZATION", "scalar").lower()  # none | scalar | binary
+SEARCH_ACCURACY: str = os.getenv("SEARCH_ACCURACY", "balanced").lower()
+
+# accuracy preset -> (rescore, oversampling); binary codes need more oversampling at 384 dims
+ACCURACY_PRESETS: Dict[str, Dict[str, Any]] = {
+    "fast": {"rescore": False, "oversampling": 1.0},
+    "balanced": {"rescore": True, "oversampling": 2.0},
+    "accurate": {"rescore": True, "oversampling": 4.0},
+    "exact": {"ignore": True},
+}
+BINARY_OVERSAMPLING_FACTOR = 2.0
+
+
+def quantization_config(mode: str = QDRANT_QUANTIZATION) -> Optional[Any]:
+    """Qdrant quantization config for `mode` (None = plain float32 in RAM)."""
+    if mode == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+
+def collection_params(mode: str = QDRANT_QUANTIZATION, dim: int = EMBEDDING_DIM) -> Dict[str, Any]:
+    """kwargs for client.create_collection(); originals go to disk only when codes are kept in RAM."""
+    quantization = quantization_config(mode)
+    return {
+        "vectors_config": models.VectorParams(size=dim, distance=models.Distance.COSINE, on_disk=quantization is not None),
+        "quantization_config": quantization,
+    }
+
+
+def search_params(accuracy: str = SEARCH_ACCURACY, mode: str = QDRANT_QUANTIZATION) -> models.SearchParams:
+    """Search params for an accuracy preset (unknown names fall back to 'balanced')."""
+    preset = dict(ACCURACY_PRESETS.get(accuracy, ACCURACY_PRESETS["balanced"]))
+    if mode == "binary" and "oversampling" in preset:
+        preset["oversampling"] *= BINARY_OVERSAMPLING_FACTOR
+    return models.SearchParams(quantization=models.QuantizationSearchParams(**preset))
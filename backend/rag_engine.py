@@ -1,23 +1,46 @@
 import os
-import pandas as pd
+import hashlib
+from collections import defaultdict
+import numpy as np
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
 from uuid import uuid4
 from typing import List, Dict, Any, Optional
 from utils.logger import logger
+from backend.single_flight import SingleFlight, make_key
+from backend.embedder import load_embedder
+from backend.quantization import SEARCH_ACCURACY, search_params
+from backend.catalog_snapshot import get_snapshot
+from backend.catalog_store import materialize
+from backend.ingest import iter_records, to_payloads
+from backend.regions import get_regions
+from backend.gazetteer import get_gazetteer
+from backend.shards import ShardManager, SHARDED_SEARCH
+from backend.diversity import VECTOR_KEY
 import random
 
 load_dotenv()
 COLLECTION: str = "eco_travel_v3"
 QDRANT_URL: Optional[str] = os.getenv("QDRANT_URL")
 QDRANT_API_KEY: Optional[str] = os.getenv("QDRANT_API_KEY")
+SEARCH_FLIGHT_TIMEOUT: float = float(os.getenv("SEARCH_FLIGHT_TIMEOUT", "30"))
+CANDIDATE_ID_FILTER_MAX: int = int(os.getenv("CANDIDATE_ID_FILTER_MAX", "20000"))  # larger sets filter by payload only
+# Find data directory relative to this file
+DATA_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+FALLBACK_TYPES = ("Hotel", "Activity", "Place")
 
 class RAGEngine:
-    def __init__(self) -> None:
+    def __init__(self, client: Optional[QdrantClient] = None, embedder: Any = None, data_dir: str = DATA_DIR) -> None:
+        """client/embedder can be injected (benchmarks, shared services); defaults connect as usual."""
+        self.data_dir = data_dir
+        self.flight = SingleFlight("search")  # merges identical concurrent searches
+        self._quantization: Dict[str, str] = {}  # collection -> none/scalar/binary
+        self.shards: Optional[ShardManager] = None
         # 1. Try connecting to Qdrant
         try:
-            if not QDRANT_URL:
+            if client is not None:
+                self.client = client
+            elif not QDRANT_URL:
                 self.client = QdrantClient(":memory:")
             else:
                 self.client = QdrantClient(
@@ -27,7 +50,8 @@ class RAGEngine:
                     https=True,
                     prefer_grpc=False
                 )
-            self.embedder = SentenceTransformer("all-MiniLM-L6-v2")
+            self.embedder = embedder if embedder is not None else load_embedder()
+            self.shards = ShardManager(self.client, self.embedder, COLLECTION, data_dir)
             
             # Quick check (Self-healing)
             try:
@@ -44,24 +68,68 @@ class RAGEngine:
         # Indexing logic skipped for brevity as fallback handles data now
         pass
 
-    def search(self, query: str, top_k: int = 15, min_eco_score: float = 0.0) -> List[Dict[str, Any]]:
+    def search(self, query: str, top_k: int = 15, min_eco_score: float = 0.0,
+               accuracy: str = SEARCH_ACCURACY, location: Optional[str] = None,
+               filters: Optional[Dict[str, Any]] = None, candidates: Optional[np.ndarray] = None,
+               with_vectors: bool = False) -> List[Dict[str, Any]]:
         """
         Smart Search: Tries Vector DB first. If empty/fails, forces CSV data.
+        Identical concurrent searches (same normalized query + filters) run once.
+        accuracy: fast / balanced / accurate / exact — rescoring depth on quantized collections.
+        location: routes to that location's shard (+ neighbours); otherwise detected from the query.
+        filters: structured filters from extract_filters() (categories, price, named venues);
+                 relaxed automatically when they leave fewer than top_k results.
+        candidates: catalog rows pre-pruned by the facet index (backend/facets.py); results never leave
+                    this set (ids on shards; eco floor + location on the main collection),
+                    so a short result list stays short rather than pulling in other cities.
+        with_vectors: attach each hit's embedding under VECTOR_KEY (for MMR selection; strip before prompts).
         """
+        # Digest, not the raw bytes: make_key would stringify and normalise megabytes of row ids per search
+        pruned = "" if candidates is None else hashlib.blake2b(np.ascontiguousarray(candidates, dtype=np.int64).tobytes(),
+                                                               digest_size=16).hexdigest()
+        key = make_key(query, top_k, min_eco_score, accuracy, location or "", sorted((filters or {}).items()), pruned,
+                       with_vectors, lower=True)
+        return self.flight.do(
+            key,
+            lambda: self._search(query, top_k, min_eco_score, accuracy, location, filters, candidates, with_vectors),
+            timeout=SEARCH_FLIGHT_TIMEOUT,
+            copy=lambda res: [dict(r) for r in res],
+        )
+
+    def extract_filters(self, query: str) -> Dict[str, Any]:
+        """Locations, categories, named venues and price band mentioned in free text."""
+        try:
+            return get_gazetteer(self.data_dir).extract(query)
+        except Exception as e:
+            logger.warning(f"Filter extraction failed: {e}")
+            return {}
+
+    def _search(self, query: str, top_k: int, min_eco_score: float, accuracy: str = SEARCH_ACCURACY,
+                location: Optional[str] = None, filters: Optional[Dict[str, Any]] = None,
+                candidates: Optional[np.ndarray] = None, with_vectors: bool = False) -> List[Dict[str, Any]]:
         results = []
         
         # --- Attempt 1: Vector Search ---
         if self.client:
             try:
                 vec = self.embedder.encode(query).tolist()
-                search_result = self.client.search(
-                    collection_name=COLLECTION,
-                    query_vector=vec,
-                    limit=top_k,
-                    # Removed strict filter to ensure we get *some* results
-                    # query_filter=models.Filter(...) 
-                )
-                results = [h.payload for h in search_result]
+                shard_collections = self._shard_collections(query, location)
+                # A pre-pruned candidate set means the facet index already saw rows in this location above
+                # min_eco_score, so both stay strict filters, also for the top-up below
+                pruned = self._candidate_conditions(query, location, min_eco_score, candidates, bool(shard_collections))
+                query_filter = self._payload_filter(filters)
+                if pruned is not None:
+                    query_filter = models.Filter(must=(query_filter.must if query_filter else []) + pruned)
+                search_result = self._vector_hits(vec, shard_collections or [COLLECTION], top_k, accuracy, query_filter,
+                                                  with_vectors=with_vectors)
+                if query_filter is not None and len(search_result) < top_k:
+                    # Category / price filters left too few hits: top up without them (never outside the pruned set)
+                    seen = {h.id for h in search_result}
+                    search_result += [h for h in self._vector_hits(vec, shard_collections or [COLLECTION], top_k, accuracy,
+                                                                   models.Filter(must=pruned) if pruned else None,
+                                                                   with_vectors=with_vectors)
+                                      if h.id not in seen][:top_k - len(search_result)]
+                results = self._with_venues([self._hit_payload(h, with_vectors) for h in search_result], filters, top_k)
             except Exception as e:
                 logger.warning(f"Vector search failed: {e}")
         
@@ -69,16 +137,210 @@ class RAGEngine:
         # যদি ভেক্টর সার্চ খালি রেজাল্ট দেয়, আমরা সরাসরি CSV ফাইল পড়ব
         if not results:
             print("⚠️ Vector search empty or failed. Using CSV Fallback.")
-            results = self._fallback_search(query, min_eco_score)
+            results = self._fallback_search(query, min_eco_score, location, filters, candidates)
             
         return results
 
-    def _fallback_search(self, query: str, min_eco_score: float) -> List[Dict[str, Any]]:
-        """Reads directly from CSV files if DB fails."""
+    def search_batch(self, queries: List[str], top_k: int = 15, min_eco_score: float = 0.0,
+                     accuracy: str = SEARCH_ACCURACY, with_vectors: bool = False) -> List[List[Dict[str, Any]]]:
+        """
+        Batched search: one encode call and one Qdrant round-trip per collection for all queries.
+        Each query is routed to its location shards (or the global collection).
+        Queries with no vector hits fall back to the CSV search individually.
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in queries]
+        if self.client and queries:
+            try:
+                vecs = self.embedder.encode(list(queries))
+                routes = [self._shard_collections(q) for q in queries]
+                by_collection: Dict[str, List[int]] = defaultdict(list)
+                for i, route in enumerate(routes):
+                    for collection in route or [COLLECTION]:
+                        by_collection[collection].append(i)
+
+                hits: List[List[Any]] = [[] for _ in queries]
+                for collection, idx in by_collection.items():
+                    params = self._search_params(accuracy, collection)
+                    for i, points in zip(idx, self._batch_query(collection, [vecs[i] for i in idx], top_k, params, with_vectors)):
+                        hits[i] += points
+                results = [
+                    [self._hit_payload(h, with_vectors) for h in (sorted(h_list, key=lambda h: h.score, reverse=True)[:top_k] if len(route) > 1 else h_list)]
+                    for h_list, route in zip(hits, routes)
+                ]
+            except Exception as e:
+                logger.warning(f"Batch vector search failed: {e}")
+
+        return [r if r else self._fallback_search(q, min_eco_score) for q, r in zip(queries, results)]
+
+    def _vector_hits(self, vec: List[float], collections: List[str], top_k: int, accuracy: str,
+                     query_filter: Optional[models.Filter] = None, with_vectors: bool = False) -> List[Any]:
+        """Top-k hits across one or more collections, merged by score."""
+        hits = []
+        for collection in collections:
+            query = lambda: self._query(
+                vec,
+                limit=top_k,
+                collection=collection,
+                search_params=self._search_params(accuracy, collection),
+                query_filter=query_filter,
+                **({"with_vectors": True} if with_vectors else {}),
+            )
+            try:
+                hits += query()
+            except Exception:
+                # A shard evicted by another process: forget it, rebuild once and retry
+                location = self.shards.location_of(collection) if self.shards else None
+                if location is None or self.client.collection_exists(collection):
+                    raise
+                logger.warning(f"Shard {collection} disappeared; rebuilding")
+                self.shards.invalidate(location)
+                if not self.shards.ensure(location):
+                    raise
+                hits += query()
+        if len(collections) > 1:
+            hits = sorted(hits, key=lambda h: h.score, reverse=True)[:top_k]
+        return hits
+
+    def _candidate_conditions(self, query: str, location: Optional[str], min_eco_score: float,
+                              candidates: Optional[np.ndarray], sharded: bool) -> Optional[List[Any]]:
+        """
+        Qdrant conditions that keep vector hits inside a facet-pruned candidate set (None when unpruned).
+        Shard point ids are snapshot rows, so shards filter on the ids themselves; the main collection
+        (content-hash ids) filters on the eco floor and the location the pruning used.
+        """
+        if candidates is None:
+            return None
+        must: List[Any] = []
+        if min_eco_score:
+            must.append(models.FieldCondition(key="eco_score", range=models.Range(gte=min_eco_score)))
+        if sharded and len(candidates) <= CANDIDATE_ID_FILTER_MAX:
+            must.append(models.HasIdCondition(has_id=[int(i) for i in candidates]))
+        elif location and not sharded:
+            canonical = get_regions(self.data_dir).canonical(location) or location
+            must.append(models.FieldCondition(key="location", match=models.MatchAny(any=[canonical])))
+        return must
+
+    def _payload_filter(self, filters: Optional[Dict[str, Any]],
+                        min_eco_score: Optional[float] = None) -> Optional[models.Filter]:
+        """Qdrant filter for extracted categories / price band / eco floor (None when there is nothing to filter)."""
+        filters = filters or {}
+        must: List[Any] = []
+        if min_eco_score:
+            must.append(models.FieldCondition(key="eco_score", range=models.Range(gte=min_eco_score)))
+        categories = filters.get("categories") or []
+        if categories:
+            must.append(models.FieldCondition(key="data_type", match=models.MatchAny(any=list(categories))))
+        price = filters.get("price")
+        if price == "free":
+            must.append(models.FieldCondition(key="cost", range=models.Range(lte=0)))
+        elif price in ("low", "high"):
+            # Price bands are per category: a cheap hotel and a cheap taxi cost very different amounts
+            limits = get_gazetteer(self.data_dir).price_limits
+            should = [
+                models.Filter(must=[
+                    models.FieldCondition(key="data_type", match=models.MatchValue(value=data_type)),
+                    models.FieldCondition(key="cost", range=models.Range(lte=low) if price == "low" else models.Range(gte=high)),
+                ])
+                for data_type, (low, high) in limits.items() if not categories or data_type in categories
+            ]
+            if should:
+                must.append(models.Filter(should=should))
+        return models.Filter(must=must) if must else None
+
+    def _with_venues(self, results: List[Dict[str, Any]], filters: Optional[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Puts venues named in the query first (looked up in the catalog snapshot by row)."""
+        venues = (filters or {}).get("venues") or []
+        snapshot = get_snapshot(self.data_dir) if venues else None
+        if snapshot is None:
+            return results
+        named = snapshot.rows_at(venues)
+        names = {r["name"] for r in named}
+        return (named + [r for r in results if r.get("name") not in names])[:max(top_k, len(named))]
+
+    def _batch_query(self, collection: str, vecs: List[Any], limit: int,
+                     params: Optional[models.SearchParams], with_vectors: bool = False) -> List[List[Any]]:
+        """One round-trip for several vectors against one collection (old and new client APIs)."""
+        if hasattr(self.client, "query_batch_points"):
+            responses = self.client.query_batch_points(
+                collection_name=collection,
+                requests=[models.QueryRequest(query=v.tolist(), limit=limit, params=params, with_payload=True,
+                                              with_vector=with_vectors) for v in vecs],
+            )
+            return [r.points for r in responses]
+        return self.client.search_batch(
+            collection_name=collection,
+            requests=[models.SearchRequest(vector=v.tolist(), limit=limit, params=params, with_payload=True,
+                                           with_vector=with_vectors) for v in vecs],
+        )
+
+    @staticmethod
+    def _hit_payload(hit: Any, with_vectors: bool = False) -> Dict[str, Any]:
+        """Hit payload, plus its embedding under VECTOR_KEY when requested (unnamed vectors only)."""
+        if with_vectors and isinstance(hit.vector, list):
+            return {**hit.payload, VECTOR_KEY: hit.vector}
+        return hit.payload
+
+    def _shard_collections(self, query: str, location: Optional[str] = None) -> List[str]:
+        """
+        Shard collections for the requested (or detected) location plus its neighbours.
+        Empty = use the global collection (sharding off, no location, or primary shard not built).
+        """
+        if self.shards is None or SHARDED_SEARCH == "off":
+            return []
+        try:
+            regions = get_regions(self.data_dir)
+            primary = regions.route(query, location, include_neighbors=False)
+            if not primary:
+                return []
+            ready = self.shards.ensure if SHARDED_SEARCH == "on" else self.shards.exists
+            if not all(ready(loc) for loc in primary):
+                return []
+            route = primary + [loc for loc in regions.route(query, location)[len(primary):] if ready(loc)]
+        except Exception as e:
+            logger.warning(f"Shard routing failed: {e}")
+            return []
+        for loc in route:
+            self.shards.touch(loc)
+        return [self.shards.collection(loc) for loc in route]
+
+    def _query(self, vec: List[float], limit: int, collection: str = COLLECTION,
+               search_params: Optional[models.SearchParams] = None, **kwargs: Any) -> List[Any]:
+        """Vector query that works on both old (search) and new (query_points) qdrant-client APIs."""
+        if search_params is not None:
+            kwargs["search_params"] = search_params
+        if hasattr(self.client, "query_points"):
+            return self.client.query_points(collection_name=collection, query=vec, limit=limit, **kwargs).points
+        return self.client.search(collection_name=collection, query_vector=vec, limit=limit, **kwargs)
+
+    def _collection_quantization(self, collection: str = COLLECTION) -> str:
+        """none / scalar / binary as configured on the live collection (local mode reports none)."""
+        if collection not in self._quantization:
+            try:
+                config = self.client.get_collection(collection).config.quantization_config
+            except Exception:
+                return "none"  # collection not created yet; check again next time
+            if isinstance(config, models.BinaryQuantization):
+                self._quantization[collection] = "binary"
+            else:
+                self._quantization[collection] = "none" if config is None else "scalar"
+        return self._quantization[collection]
+
+    def _search_params(self, accuracy: str, collection: str = COLLECTION) -> Optional[models.SearchParams]:
+        """Oversampling/rescore params, only for quantized collections."""
+        mode = self._collection_quantization(collection)
+        return None if mode == "none" else search_params(accuracy, mode)
+
+    def _fallback_search(self, query: str, min_eco_score: float, location: Optional[str] = None,
+                         filters: Optional[Dict[str, Any]] = None,
+                         candidates: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Reads from the mmap'd catalog snapshot (or directly from CSV files) if DB fails."""
+        snapshot = get_snapshot(self.data_dir)
+        if snapshot is not None:
+            results = self._snapshot_search(snapshot, query, location, filters, candidates=candidates)
+            return self._with_venues(results, filters, 15)
+
         combined_data = []
-        # Find data directory relative to this file
-        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        data_dir = os.path.join(base_path, "data")
+        data_dir = self.data_dir
         
         files = {
             "hotels.csv": "Hotel", 
@@ -90,16 +352,11 @@ class RAGEngine:
             path = os.path.join(data_dir, filename)
             if os.path.exists(path):
                 try:
-                    df = pd.read_csv(path)
-                    # Convert rows to list of dicts
-                    records = df.to_dict('records')
+                    # Same normalized record shape as the snapshot and the ingested payloads
+                    records = [r for _, chunk in iter_records([path]) for r in to_payloads(chunk)]
                     
                     for rec in records:
                         rec['data_type'] = dtype
-                        # Ensure numerical scores exist
-                        rec['eco_score'] = float(rec.get('eco_score', 5.0))
-                        rec['cost'] = float(rec.get('price_per_night', rec.get('price', rec.get('entry_fee', 0))))
-                        rec['image_url'] = rec.get('image_url', "https://placehold.co/600x400?text=No+Image")
                         
                         # Simple Keyword Match Logic
                         item_text = str(rec).lower()
@@ -121,3 +378,52 @@ class RAGEngine:
         random.shuffle(combined_data)
         return combined_data[:15]
       
+
+    def _snapshot_search(self, snapshot, query: str, location: Optional[str] = None,
+                         filters: Optional[Dict[str, Any]] = None, limit: int = 15,
+                         candidates: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Same filters as the CSV fallback, evaluated on column codes; only the returned rows become dicts."""
+        filters = filters or {}
+        mask = snapshot.mask_in("data_type", FALLBACK_TYPES)
+        regions = get_regions(self.data_dir)
+        locations = [regions.canonical(location) or location] if location else regions.detect(query)
+        if locations:
+            mask &= snapshot.mask_in("location", locations)
+        relaxed = mask
+        if filters.get("categories") or filters.get("price"):
+            strict = self._snapshot_filter_mask(snapshot, filters)
+            if locations:
+                strict &= snapshot.mask_in("location", locations)
+            if strict.any():  # otherwise keep the relaxed mask, like the vector path
+                mask = strict
+        # Return random selection to keep it fresh
+        if candidates is not None and len(candidates):
+            # Only pre-pruned rows; category / price filters are relaxed first when they leave too few
+            pruned = np.zeros(len(snapshot), dtype=bool)
+            pruned[np.asarray(candidates, dtype=np.int64)] = True
+            picked = np.random.permutation(np.flatnonzero(mask & pruned))[:limit]
+            if len(picked) < limit:
+                rest = np.random.permutation(np.flatnonzero(relaxed & pruned & ~mask))[:limit - len(picked)]
+                picked = np.concatenate([picked, rest])
+        else:
+            picked = np.random.permutation(np.flatnonzero(mask))[:limit]
+        return materialize(snapshot.views(picked))
+
+    def _snapshot_filter_mask(self, snapshot, filters: Dict[str, Any]) -> np.ndarray:
+        """Row mask for extracted categories / price band on the snapshot columns."""
+        categories = filters.get("categories") or []
+        mask = snapshot.mask_in("data_type", categories) if categories else np.ones(len(snapshot), dtype=bool)
+        price = filters.get("price")
+        cost = np.asarray(snapshot.numeric["cost"])
+        if price == "free":
+            mask &= cost <= 0
+        elif price in ("low", "high"):
+            limits = get_gazetteer(self.data_dir).price_limits
+            # Per-category threshold looked up by data_type code
+            bound = np.full(len(snapshot.dictionaries["data_type"]), np.inf if price == "low" else -np.inf)
+            for code, data_type in enumerate(snapshot.dictionaries["data_type"]):
+                if data_type in limits:
+                    bound[code] = limits[data_type][0] if price == "low" else limits[data_type][1]
+            row_bound = bound[np.asarray(snapshot.codes["data_type"])]
+            mask &= (cost <= row_bound) if price == "low" else (cost >= row_bound)
+        return mask
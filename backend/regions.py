@@ -0,0 +1,97 @@
+"""
+Region registry: every catalog location plus the aliases / neighbours in data/regions.json.
+Used to route searches to location shards and to filter the CSV fallback.
+"""
+import os
+import json
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.logger import logger
+from backend.catalog_snapshot import DATA_DIR, get_snapshot
+from backend.gazetteer import AhoCorasick
+
+REGIONS_FILENAME = "regions.json"
+DEFAULT_LOCATIONS = ["Dubai", "Abu Dhabi", "Sharjah"]
+
+
+class RegionRegistry:
+    def __init__(self, config: Dict[str, Dict[str, List[str]]], catalog_locations: Iterable[str] = ()) -> None:
+        self.catalog_locations = sorted({loc for loc in catalog_locations if loc})
+        self._neighbors: Dict[str, List[str]] = {}
+        self._canonical: Dict[str, str] = {}
+        for name in list(config) + self.catalog_locations:
+            self._canonical[name.lower()] = name
+        for name, entry in config.items():
+            self._neighbors[name] = list(entry.get("neighbors", []))
+            for alias in entry.get("aliases", []):
+                self._canonical.setdefault(alias.lower(), name)
+        self._matcher = AhoCorasick()
+        for term, name in self._canonical.items():
+            self._matcher.add(term, name)
+        self._matcher.build()
+
+    @property
+    def names(self) -> List[str]:
+        return sorted(set(self._canonical.values()))
+
+    def terms(self) -> Iterable[Tuple[str, str]]:
+        """(lower-cased name or alias, canonical location) pairs."""
+        return self._canonical.items()
+
+    def canonical(self, name: Optional[str]) -> Optional[str]:
+        return self._canonical.get(name.strip().lower()) if name else None
+
+    def neighbors(self, location: str) -> List[str]:
+        return self._neighbors.get(location, [])
+
+    def detect(self, text: str) -> List[str]:
+        """Canonical locations mentioned in `text`, in order of first mention."""
+        found: List[str] = []
+        for _, _, pid in self._matcher.find(text or ""):
+            for name in self._matcher.values[pid]:
+                if name not in found:
+                    found.append(name)
+        return found
+
+    def route(self, query: str, location: Optional[str] = None, include_neighbors: bool = True) -> List[str]:
+        """Requested location (explicit, else detected in the query) followed by its neighbours."""
+        primary = [self.canonical(location)] if self.canonical(location) else self.detect(query)
+        out = list(primary)
+        if include_neighbors:
+            for loc in primary:
+                out += [n for n in self.neighbors(loc) if n not in out]
+        return out
+
+
+_registries: Dict[str, RegionRegistry] = {}
+_registry_versions: Dict[str, Optional[str]] = {}
+_registry_lock = threading.Lock()
+
+
+def _load_config(data_dir: str) -> Dict[str, Dict[str, List[str]]]:
+    path = os.path.join(data_dir, REGIONS_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Invalid {path}: {e}")
+        return {}
+
+
+def get_regions(data_dir: str = DATA_DIR) -> RegionRegistry:
+    """Process-wide registry for data_dir, rebuilt when the catalog snapshot changes."""
+    snapshot = get_snapshot(data_dir)
+    version = snapshot.version if snapshot is not None else None
+    with _registry_lock:
+        if data_dir not in _registries or _registry_versions.get(data_dir) != version:
+            locations = snapshot.dictionaries.get("location", []) if snapshot is not None else DEFAULT_LOCATIONS
+            _registries[data_dir] = RegionRegistry(_load_config(data_dir), locations)
+            _registry_versions[data_dir] = version
+        return _registries[data_dir]
+
+
+def known_locations(data_dir: str = DATA_DIR) -> List[str]:
+    """Locations that actually have catalog rows (for pickers); the original three if unavailable."""
+    return get_regions(data_dir).catalog_locations or list(DEFAULT_LOCATIONS)
@@ -0,0 +1,123 @@
+"""
+Priority-aware re-ranking of retrieved candidates.
+
+Retrieval ranks by text similarity only. This stage scores each candidate
+with one NumPy expression over eco_score, cost against the per-day budget,
+avg_rating, retrieval rank and interest matches, weighted by the eco /
+budget / comfort sliders. Candidates close to the best-scoring hotel then get
+a proximity bonus (PROXIMITY_WEIGHT), so a day's stops stay within reach of
+the base. The scores are the relevance term of an MMR selection
+(backend/diversity.py) with per-category quotas, so the prompt carries fewer,
+better and more varied candidates.
+"""
+import os
+import math
+import re
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from backend.facets import INTEREST_TERMS
+from backend.diversity import CATEGORY_QUOTAS, MMR_LAMBDA, candidate_vectors, mmr_select, strip_vectors
+from backend.geo import coordinates, proximity_scores
+
+RERANK_TOP_K: int = int(os.getenv("RERANK_TOP_K", "10"))                    # 0 = pass candidates through
+MAX_CATEGORY_SHARE: float = float(os.getenv("RERANK_MAX_CATEGORY_SHARE", "0.4"))  # cap for categories without a quota
+SIMILARITY_WEIGHT = 0.25   # share of the score kept for retrieval rank
+INTEREST_WEIGHT = 0.15     # bonus share for candidates matching a selected interest
+# Share of the per-day budget one item may take before it counts as expensive
+DAILY_BUDGET_SHARE = {"Hotel": 0.6, "Transport": 0.1}
+DEFAULT_BUDGET_SHARE = 0.2
+REQUIRED_CATEGORIES = ("Hotel",)  # every plan needs somewhere to stay
+PROXIMITY_WEIGHT: float = float(os.getenv("RERANK_PROXIMITY_WEIGHT", "0.15"))  # bonus for items near the chosen hotel
+
+
+def _column(candidates: Sequence[Dict[str, Any]], key: str, default: float) -> np.ndarray:
+    return np.fromiter((_number(c.get(key), default) for c in candidates), dtype=np.float64, count=len(candidates))
+
+
+def _number(value: Any, default: float) -> float:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if math.isnan(value) else value
+
+
+def _interest_matches(candidates: Sequence[Dict[str, Any]], interests: Sequence[str]) -> np.ndarray:
+    words = [w for i in interests for w in INTEREST_TERMS.get(i, [i.lower()])]
+    if not words:
+        return np.zeros(len(candidates))
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(w) for w in words) + ")", re.IGNORECASE)
+    return np.fromiter(
+        (bool(pattern.search(f"{c.get('name', '')} {c.get('description', '')} {c.get('tag') or ''} {c.get('data_type', '')}"))
+         for c in candidates),
+        dtype=np.float64, count=len(candidates),
+    )
+
+
+def score_candidates(candidates: Sequence[Dict[str, Any]], priorities: Optional[Dict[str, float]] = None,
+                     budget: float = 1500, days: int = 3, travelers: int = 1,
+                     interests: Sequence[str] = ()) -> np.ndarray:
+    """One score per candidate in [0, 1] (higher is better)."""
+    n = len(candidates)
+    priorities = priorities or {}
+    eco_p, budget_p, comfort_p = (max(0.0, float(priorities.get(k, 5))) for k in ("eco", "budget", "comfort"))
+
+    eco = np.clip(_column(candidates, "eco_score", 5.0) / 10.0, 0, 1)
+    rating = _column(candidates, "avg_rating", np.nan)
+    missing = np.isnan(rating)
+    rating[missing] = rating[~missing].mean() if (~missing).any() else 3.5
+    comfort = np.clip(rating / 5.0, 0, 1)
+
+    # What one item costs the group per day, against its share of the per-day budget
+    cost = np.maximum(_column(candidates, "cost", 0.0), 0)
+    per_night = np.array([c.get("cost_type") == "per_night" or c.get("data_type") == "Hotel" for c in candidates])
+    item_cost = np.where(per_night, cost, cost * max(1, travelers))
+    share = np.array([DAILY_BUDGET_SHARE.get(c.get("data_type"), DEFAULT_BUDGET_SHARE) for c in candidates])
+    daily_budget = max(1.0, float(budget) / max(1, days))
+    affordability = np.clip(1.0 - item_cost / (daily_budget * share), 0, 1)
+
+    similarity = 1.0 - np.arange(n) / max(1, n)  # candidates arrive best match first
+
+    total_p = eco_p + budget_p + comfort_p or 1.0
+    preference = (eco_p * eco + budget_p * affordability + comfort_p * comfort) / total_p
+    interest = _interest_matches(candidates, interests)
+    return ((1 - SIMILARITY_WEIGHT - INTEREST_WEIGHT) * preference
+            + SIMILARITY_WEIGHT * similarity
+            + INTEREST_WEIGHT * interest)
+
+
+def hotel_anchor(candidates: Sequence[Dict[str, Any]], scores: np.ndarray) -> Optional[tuple]:
+    """Coordinates of the best-scoring hotel that has them (the base the other items should be near)."""
+    hotels = [i for i, c in enumerate(candidates) if c.get("data_type") == "Hotel" and coordinates(c)]
+    return coordinates(candidates[max(hotels, key=lambda i: scores[i])]) if hotels else None
+
+
+def category_quotas(categories: Sequence[str], k: int) -> Dict[str, int]:
+    """CATEGORY_QUOTAS for known categories, ceil(k * MAX_CATEGORY_SHARE) for the rest."""
+    cap = max(1, math.ceil(k * MAX_CATEGORY_SHARE))
+    return {c: CATEGORY_QUOTAS.get(c, cap) for c in set(categories)}
+
+
+def rerank(candidates: List[Dict[str, Any]], top_k: int = RERANK_TOP_K, **trip: Any) -> List[Dict[str, Any]]:
+    """
+    Top-k candidates for this trip's priorities, budget and interests, chosen by MMR with
+    category quotas (required categories first). Attached embeddings are stripped.
+    """
+    if top_k <= 0 or not candidates:
+        return strip_vectors(candidates)
+    scores = score_candidates(
+        candidates,
+        priorities=trip.get("priorities"),
+        budget=trip.get("budget", 1500),
+        days=trip.get("days", 3),
+        travelers=trip.get("travelers", 1),
+        interests=trip.get("interests") or [],
+    )
+    proximity_weight = trip.get("proximity_weight", PROXIMITY_WEIGHT)
+    anchor = hotel_anchor(candidates, scores) if proximity_weight > 0 else None
+    if anchor:
+        scores = scores + proximity_weight * proximity_scores(candidates, anchor)
+    categories = [str(c.get("data_type")) for c in candidates]
+    keep = mmr_select(scores, candidate_vectors(candidates), categories, top_k, lam=trip.get("mmr_lambda", MMR_LAMBDA),
+                      quotas=category_quotas(categories, top_k), required=REQUIRED_CATEGORIES)
+    return strip_vectors([candidates[i] for i in keep])
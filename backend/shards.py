@@ -0,0 +1,249 @@
+"""
+Per-location shard collections.
+
+    python -m backend.shards build --all        # (re)build every location shard
+    python -m backend.shards build Dubai        # rebuild one shard
+    python -m backend.shards warm Dubai | evict Dubai | list
+
+Each catalog location gets its own collection (<base>__<slug>__<snapshot
+version>), built from the catalog snapshot. RAGEngine routes a query to the
+shards of the requested location and its neighbours, so per-query work tracks
+the size of one region instead of the whole catalog. Shards are built, warmed
+and evicted independently; MAX_ACTIVE_SHARDS evicts the least recently used ones.
+Point ids are snapshot rows, so a new snapshot version rebuilds a location's
+shard in the background the next time it is routed to, and drops the old one. A shard that
+another process evicted is rebuilt when a query finds it missing.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import numpy as np
+from qdrant_client import models
+from utils.logger import logger
+from backend.catalog_snapshot import DATA_DIR, get_snapshot
+from backend.quantization import collection_params
+from backend.single_flight import SingleFlight
+
+SHARDED_SEARCH: str = os.getenv("SHARDED_SEARCH", "auto").lower()  # off | auto (use built shards) | on (build on demand)
+MAX_ACTIVE_SHARDS: int = int(os.getenv("MAX_ACTIVE_SHARDS", "0"))   # 0 = unlimited
+SHARD_BUILD_BATCH: int = 1024
+SHARD_VERSION_CHARS = 8
+SHARD_MISSING_TTL_S: float = float(os.getenv("SHARD_MISSING_TTL_S", "30"))  # how long "not built" is trusted
+
+
+def _slug(location: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", location.lower()).strip("_")
+
+
+def index_text(row: Dict[str, Any]) -> str:
+    """Text that gets embedded for a catalog row (same shape as utils/setup_db.py)."""
+    return f"{row.get('data_type')}: {row.get('name')} in {row.get('location')}. {row.get('description')}"
+
+
+class ShardManager:
+    def __init__(self, client, embedder, base_collection: str, data_dir: str = DATA_DIR,
+                 max_active: int = MAX_ACTIVE_SHARDS) -> None:
+        self.client = client
+        self.embedder = embedder
+        self.base = base_collection
+        self.data_dir = data_dir
+        self.max_active = max_active
+        self.meta: Dict[str, Dict[str, Any]] = {}  # location -> points, build_ms, last_used
+        self._exists: Dict[str, bool] = {}      # collection name -> known to exist
+        self._missing: Dict[str, float] = {}    # collection name -> monotonic time "missing" expires
+        self._rebuilding: Set[str] = set()      # locations with a background rebuild running
+        self._locations: Dict[str, str] = {}    # collection name -> location
+        self._lock = threading.Lock()
+        self._builds = SingleFlight("shard-build")  # concurrent queries wait for one build
+
+    def _version(self) -> str:
+        snapshot = get_snapshot(self.data_dir)
+        return snapshot.version[:SHARD_VERSION_CHARS] if snapshot is not None else "none"
+
+    def collection(self, location: str, version: Optional[str] = None) -> str:
+        """Collection of the location's shard for `version` (default: the current snapshot)."""
+        name = f"{self.base}__{_slug(location)}__{version or self._version()}"
+        self._locations[name] = location
+        return name
+
+    def location_of(self, collection: str) -> Optional[str]:
+        return self._locations.get(collection)
+
+    def _stale_collections(self, location: str) -> List[str]:
+        """The location's shards built from other snapshot versions (or before shards were versioned)."""
+        prefix, current = f"{self.base}__{_slug(location)}", self.collection(location)
+        names = [c.name for c in self.client.get_collections().collections]
+        return [n for n in names if n != current and (n == prefix or n.startswith(prefix + "__"))]
+
+    # -- lifecycle --
+    def exists(self, location: str) -> bool:
+        """
+        True if the shard for the current snapshot exists. A missing shard is remembered for
+        SHARD_MISSING_TTL_S; if the location has a stale shard, it is rebuilt in the background
+        and searches use the main collection until it is ready.
+        """
+        name = self.collection(location)
+        if self._exists.get(name):
+            return True
+        if self._missing.get(name, 0.0) > time.monotonic():
+            return False
+        try:
+            if self.client.collection_exists(name):
+                with self._lock:
+                    self._exists[name] = True
+                    self._missing.pop(name, None)
+                return True
+            with self._lock:
+                self._missing[name] = time.monotonic() + SHARD_MISSING_TTL_S
+            if self._stale_collections(location):
+                self._rebuild_in_background(location)
+        except Exception:
+            pass
+        return False
+
+    def _rebuild_in_background(self, location: str) -> None:
+        with self._lock:
+            if location in self._rebuilding:
+                return
+            self._rebuilding.add(location)
+
+        def run() -> None:
+            try:
+                self.ensure(location)
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(location)
+
+        threading.Thread(target=run, name=f"shard-rebuild-{_slug(location)}", daemon=True).start()
+
+    def invalidate(self, location: str) -> None:
+        """Forgets that the location's shard exists (e.g. after another process evicted it)."""
+        name = self.collection(location)
+        with self._lock:
+            self._exists.pop(name, None)
+            self._missing.pop(name, None)
+
+    def build(self, location: str) -> int:
+        """(Re)builds one shard from the catalog snapshot; returns the number of points."""
+        snapshot = get_snapshot(self.data_dir)
+        if snapshot is None:
+            return 0
+        start = time.perf_counter()
+        indices = np.flatnonzero(snapshot.mask_in("location", [location]))
+        name = self.collection(location, snapshot.version[:SHARD_VERSION_CHARS])
+        if self.client.collection_exists(name):
+            self.client.delete_collection(name)
+        self.client.create_collection(collection_name=name, **collection_params())
+        for offset in range(0, len(indices), SHARD_BUILD_BATCH):
+            rows = snapshot.rows_at(indices[offset:offset + SHARD_BUILD_BATCH])
+            vectors = self.embedder.encode([index_text(r) for r in rows])
+            self.client.upsert(collection_name=name, points=[
+                models.PointStruct(id=int(i), vector=v.tolist(), payload=r)
+                for i, v, r in zip(indices[offset:offset + SHARD_BUILD_BATCH], vectors, rows)
+            ])
+        build_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._exists[name] = True
+            self._missing.pop(name, None)
+            self.meta[location] = {"points": int(len(indices)), "build_ms": round(build_ms, 1), "last_used": time.time(),
+                                   "version": snapshot.version}
+        for stale in self._stale_collections(location):
+            self.client.delete_collection(stale)
+            self._exists.pop(stale, None)
+        logger.info(f"Shard {name}: {len(indices)} points built in {build_ms:.0f}ms")
+        self._enforce_limit(keep=location)
+        return int(len(indices))
+
+    def ensure(self, location: str) -> bool:
+        """True if the shard is available, building it first when missing (deduplicated across threads)."""
+        name = self.collection(location)
+        if self._exists.get(name):
+            return True
+        try:
+            if self.client.collection_exists(name):
+                self._exists[name] = True
+                return True
+            return self._builds.do(name, lambda: self.build(location)) > 0
+        except Exception as e:
+            logger.warning(f"Shard build failed for {location}: {e}")
+            return False
+
+    def warm(self, location: str) -> None:
+        """Runs one query so the shard's index and payload pages are resident before real traffic."""
+        vec = np.asarray(self.embedder.encode(location)).tolist()
+        if hasattr(self.client, "query_points"):
+            self.client.query_points(collection_name=self.collection(location), query=vec, limit=1)
+        else:
+            self.client.search(collection_name=self.collection(location), query_vector=vec, limit=1)
+        self.touch(location)
+
+    def evict(self, location: str) -> None:
+        """Drops a shard; it is rebuilt from the snapshot the next time it is needed."""
+        name = self.collection(location)
+        try:
+            self.client.delete_collection(name)
+        finally:
+            with self._lock:
+                self._exists.pop(name, None)
+                self._missing.pop(name, None)
+                self.meta.pop(location, None)
+        logger.info(f"Shard {self.collection(location)} evicted")
+
+    def touch(self, location: str) -> None:
+        with self._lock:
+            self.meta.setdefault(location, {})["last_used"] = time.time()
+
+    def _enforce_limit(self, keep: str) -> None:
+        if not self.max_active:
+            return
+        with self._lock:
+            active = sorted((m.get("last_used", 0), loc) for loc, m in self.meta.items() if loc != keep)
+            excess = len(active) + 1 - self.max_active
+        for _, location in active[:max(0, excess)]:
+            self.evict(location)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": SHARDED_SEARCH, "shards": {loc: dict(m) for loc, m in self.meta.items()}}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage per-location shard collections")
+    parser.add_argument("action", choices=["build", "warm", "evict", "list"])
+    parser.add_argument("locations", nargs="*")
+    parser.add_argument("--all", action="store_true", help="All catalog locations")
+    args = parser.parse_args(argv)
+
+    from backend.rag_engine import RAGEngine
+    from backend.regions import known_locations
+
+    rag = RAGEngine()
+    if rag.shards is None:
+        print("❌ Qdrant is not reachable.")
+        return 1
+    locations = known_locations(rag.data_dir) if args.all or args.action == "list" else args.locations
+    for location in locations:
+        if args.action == "build":
+            print(f"🧱 {location}: {rag.shards.build(location)} points -> {rag.shards.collection(location)}")
+        elif args.action == "warm":
+            rag.shards.warm(location)
+            print(f"🔥 {location} warmed")
+        elif args.action == "evict":
+            rag.shards.evict(location)
+            print(f"🗑️ {location} evicted")
+        else:
+            print(f"{location:>20}: {'built' if rag.shards.exists(location) else '-'} ({rag.shards.collection(location)})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Single-flight de-duplication of identical concurrent calls.
+
+If a call with the same key is already running, later callers do not start
+their own execution; they wait for the running one and all receive its result
+(or its exception). Only in-flight calls are merged — nothing is cached once
+the call finishes.
+"""
+import re
+import hashlib
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+_WS = re.compile(r"\s+")
+
+
+def make_key(*parts: Any, lower: bool = False) -> str:
+    """Stable key from whitespace-normalised parts (optionally case-folded)."""
+    norm = "\x1f".join(_WS.sub(" ", str(p)).strip() for p in parts)
+    if lower:
+        norm = norm.lower()
+    return hashlib.sha1(norm.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, name: str = "flight") -> None:
+        self.name = name
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.merged = 0
+        self.timeouts = 0
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None,
+           copy: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        Runs fn() once per key among concurrent callers.
+        timeout: how long a merged caller waits (raises concurrent.futures.TimeoutError).
+        copy: applied to the shared result for merged callers, so they can mutate it safely.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executed += 1
+            else:
+                self.merged += 1
+
+        if not leader:
+            try:
+                result = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                with self._lock:
+                    self.timeouts += 1
+                raise
+            return copy(result) if copy else result
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def _finish(self, key: str, future: Future, result: Any = None, exception: Optional[BaseException] = None) -> None:
+        with self._lock:
+            del self._calls[key]
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "inflight": len(self._calls),
+                "executed": self.executed,
+                "merged": self.merged,
+                "timeouts": self.timeouts,
+            }
+
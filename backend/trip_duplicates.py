@@ -0,0 +1,182 @@
+"""
+Near-duplicate trip detection with MinHash + LSH.
+
+Each itinerary becomes a set of shingles: its activity names plus word
+3-grams of the plan text. That set is summarised by a NUM_PERM MinHash
+signature. The share of equal slots between two signatures estimates the
+sets' Jaccard similarity.
+
+Signatures are split into LSH_BANDS bands. A trip is filed under one
+bucket key per band, in SQLite (WITHOUT ROWID, so lookups hit the primary
+key). A lookup reads LSH_BANDS keys and compares only the trips that
+collide in some band, so it takes milliseconds regardless of history size.
+With 32 bands of 4 rows, a pair collides with probability 0.99 at 0.6
+Jaccard, 0.87 at 0.5 and 0.05 at 0.2.
+
+The index sits next to the trip history (backend/trip_history.py) and
+fills the itinerary's duplicate_trip_detector field.
+"""
+import os
+import re
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from utils.logger import logger
+
+TRIP_LSH_DB = os.getenv("TRIP_LSH_DB", "data/trip_lsh.db")
+DUPLICATE_MIN_JACCARD = float(os.getenv("DUPLICATE_MIN_JACCARD", "0.5"))
+DUPLICATE_TOP_K = 3
+NUM_PERM = 128
+LSH_BANDS = 32
+LSH_ROWS = NUM_PERM // LSH_BANDS
+MAX_CANDIDATES = 500  # colliding trips verified per lookup (most collisions first)
+BUCKET_SCAN = 100     # newest trips read per bucket, so a crowded bucket cannot slow lookups
+_MERSENNE_61 = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)  # fixed: signatures must stay comparable across runs
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM).astype(np.uint64)
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def shingles(itinerary: Dict[str, Any]) -> set:
+    """Activity names and plan word 3-grams."""
+    items = {"a:" + " ".join(_WORD.findall(str(a.get("name", "")).lower()))
+             for a in itinerary.get("activities") or [] if isinstance(a, dict)}
+    words = _WORD.findall(str(itinerary.get("plan") or "").lower())
+    items.update(" ".join(words[i:i + 3]) for i in range(len(words) - 2))
+    items.discard("a:")
+    return items
+
+
+def minhash(items: set) -> np.ndarray:
+    """uint32 signature of NUM_PERM slots (all-max for an empty set)."""
+    if not items:
+        return np.full(NUM_PERM, 0xFFFFFFFF, dtype=np.uint32)
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in items), dtype=np.uint64, count=len(items))
+    hashed = (np.outer(x, _A) + _B) % _MERSENNE_61  # a < 2^31, x < 2^32: no uint64 overflow
+    return (hashed.min(axis=0) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit bucket key per band (the band number is part of the key)."""
+    rows = signature.reshape(LSH_BANDS, LSH_ROWS)
+    return [
+        int.from_bytes(hashlib.blake2b(bytes([band]) + rows[band].tobytes(), digest_size=8).digest(), "little", signed=True)
+        for band in range(LSH_BANDS)
+    ]
+
+
+class DuplicateIndex:
+    def __init__(self, path: str = TRIP_LSH_DB) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS signatures (trip_id INTEGER PRIMARY KEY, sig BLOB NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key INTEGER NOT NULL, trip_id INTEGER NOT NULL, "
+                "PRIMARY KEY (key, trip_id)) WITHOUT ROWID"
+            )
+
+    def add(self, trip_id: int, signature: np.ndarray) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO signatures (trip_id, sig) VALUES (?, ?)", (trip_id, signature.tobytes()))
+            self._conn.executemany("INSERT OR IGNORE INTO buckets (key, trip_id) VALUES (?, ?)",
+                                   [(key, trip_id) for key in band_keys(signature)])
+
+    def query(self, signature: np.ndarray, top_k: int = DUPLICATE_TOP_K,
+              min_jaccard: float = DUPLICATE_MIN_JACCARD) -> List[Tuple[int, float]]:
+        """[(trip_id, estimated Jaccard)] of the most similar indexed trips, best first."""
+        keys = band_keys(signature)
+        per_band = " UNION ALL ".join(
+            ["SELECT * FROM (SELECT trip_id FROM buckets WHERE key = ? ORDER BY trip_id DESC LIMIT ?)"] * len(keys)
+        )
+        with self._lock:
+            collided = self._conn.execute(per_band, [v for key in keys for v in (key, BUCKET_SCAN)]).fetchall()
+            if not collided:
+                return []
+            trip_ids, hits = np.unique(np.fromiter((r[0] for r in collided), dtype=np.int64), return_counts=True)
+            ids = trip_ids[np.argsort(-hits, kind="stable")[:MAX_CANDIDATES]].tolist()
+            sigs = self._conn.execute(
+                f"SELECT trip_id, sig FROM signatures WHERE trip_id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        if not sigs:
+            return []
+        matrix = np.frombuffer(b"".join(s for _, s in sigs), dtype=np.uint32).reshape(len(sigs), NUM_PERM)
+        jaccard = (matrix == signature).mean(axis=1)
+        order = np.argsort(-jaccard, kind="stable")[:top_k]
+        return [(sigs[i][0], float(jaccard[i])) for i in order if jaccard[i] >= min_jaccard]
+
+    def prune(self, before_id: int) -> None:
+        """Drops trips the history no longer keeps (ids below before_id)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM signatures WHERE trip_id < ?", (before_id,))
+            self._conn.execute("DELETE FROM buckets WHERE trip_id < ?", (before_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+
+
+def find_duplicates(itinerary: Dict[str, Any], history) -> Tuple[Optional[np.ndarray], List[Dict[str, Any]]]:
+    """(signature, matches): the closest stored trips as history summaries plus "similarity", best first."""
+    index = get_duplicate_index()
+    if index is None or history is None:
+        return None, []
+    signature = minhash(shingles(itinerary))
+    try:
+        hits = index.query(signature)
+        summaries = {s["id"]: s for s in history.summaries([trip_id for trip_id, _ in hits])}
+    except Exception as e:
+        logger.warning(f"Duplicate lookup failed: {e}")
+        return signature, []
+    return signature, [{**summaries[trip_id], "similarity": sim} for trip_id, sim in hits if trip_id in summaries]
+
+
+def index_trip(trip_id: Optional[int], signature: Optional[np.ndarray], max_trips: int) -> None:
+    """Adds a stored trip to the LSH index and, now and then, drops trips the history has pruned."""
+    index = get_duplicate_index()
+    if index is None or trip_id is None or signature is None:
+        return
+    try:
+        index.add(trip_id, signature)
+        if trip_id % 1000 == 0:
+            index.prune(trip_id - max_trips + 1)
+    except Exception as e:
+        logger.warning(f"Could not index trip {trip_id}: {e}")
+
+
+def describe(matches: List[Dict[str, Any]]) -> str:
+    """Deterministic duplicate_trip_detector text."""
+    if not matches:
+        return "This is a unique trip plan: no similar plans in the trip history."
+    best = matches[0]
+    lines = [f"{len(matches)} similar plan(s) in the trip history. Closest: ~{best['similarity']:.0%} overlap."]
+    for m in matches:
+        when = time.strftime("%d %b %Y", time.localtime(m["created_at"])) if m.get("created_at") else "earlier"
+        lines.append(f"- Trip #{m['id']}: {m.get('days', '?')}-day {m.get('location') or 'trip'} ({when}), ~{m['similarity']:.0%} similar")
+    return "\n".join(lines)
+
+
+_index: Optional[DuplicateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_duplicate_index() -> Optional[DuplicateIndex]:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = DuplicateIndex()
+                except Exception as e:
+                    logger.error(f"Duplicate index unavailable: {e}")
+                    return None
+    return _index
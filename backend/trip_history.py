@@ -0,0 +1,196 @@
+"""
+Persistent trip history.
+
+Every validated itinerary is stored in SQLite as zlib-compressed JSON. The
+request parameters that produced it are stored alongside. Summary columns
+(user, location, days, budget bucket, creation time, cost, eco score) are
+indexed, so listing and filtering never decompress an itinerary; only
+load() does. Writes go through a single background thread and never delay
+a plan.
+
+Disk use is bounded by TRIP_HISTORY_MAX_TRIPS. Past the cap the oldest
+trips are deleted, and SQLite reuses their pages for new rows.
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from utils.logger import logger
+
+TRIP_HISTORY_DB = os.getenv("TRIP_HISTORY_DB", "data/trip_history.db")
+TRIP_HISTORY_MAX_TRIPS = int(os.getenv("TRIP_HISTORY_MAX_TRIPS", "1000000"))
+BUDGET_BUCKET = 500  # budget_bucket = budget // 500
+PRUNE_EVERY = 1000   # inserts between retention checks
+SUMMARY_COLUMNS = ("id", "user", "location", "days", "budget", "travelers", "created_at", "total_cost", "eco_score")
+
+
+def budget_bucket(budget: Any) -> int:
+    try:
+        return int(float(budget) // BUDGET_BUCKET)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, default=str, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def _unpack(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class TripHistory:
+    def __init__(self, path: str = TRIP_HISTORY_DB, max_trips: int = TRIP_HISTORY_MAX_TRIPS) -> None:
+        self.path = path
+        self.max_trips = max_trips
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trip-history")
+        self._inserts = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS trips (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user TEXT NOT NULL DEFAULT '',
+                    location TEXT NOT NULL DEFAULT '',
+                    days INTEGER NOT NULL DEFAULT 0,
+                    budget REAL NOT NULL DEFAULT 0,
+                    budget_bucket INTEGER NOT NULL DEFAULT 0,
+                    travelers INTEGER NOT NULL DEFAULT 1,
+                    created_at REAL NOT NULL,
+                    total_cost REAL,
+                    eco_score REAL,
+                    params BLOB NOT NULL,
+                    itinerary BLOB NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS trips_user ON trips (user, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS trips_search ON trips (location, days, budget_bucket, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS trips_created ON trips (created_at)")
+
+    def add(self, itinerary: Dict[str, Any], user: str = "", params: Optional[Dict[str, Any]] = None) -> int:
+        """Stores one trip synchronously; returns its id."""
+        params = dict(params or {})
+        row = (
+            user or "", str(params.get("location") or ""), int(params.get("days") or 0),
+            float(params.get("budget") or 0), budget_bucket(params.get("budget")), int(params.get("travelers") or 1),
+            time.time(), itinerary.get("total_cost"), itinerary.get("eco_score"), _pack(params), _pack(itinerary),
+        )
+        with self._lock, self._conn:
+            trip_id = self._conn.execute(
+                "INSERT INTO trips (user, location, days, budget, budget_bucket, travelers, created_at, total_cost, "
+                "eco_score, params, itinerary) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row,
+            ).lastrowid
+            self._inserts += 1
+            if self._inserts % PRUNE_EVERY == 1:
+                self._prune()
+        return trip_id
+
+    def record(self, itinerary: Dict[str, Any], user: str = "", params: Optional[Dict[str, Any]] = None) -> Future:
+        """add() on the writer thread (never blocks the caller; failures are logged)."""
+        def write() -> Optional[int]:
+            try:
+                return self.add(itinerary, user, params)
+            except Exception as e:
+                logger.error(f"Could not save trip to history: {e}")
+                return None
+        return self._writer.submit(write)
+
+    def _prune(self) -> None:
+        """Deletes the oldest trips beyond max_trips (caller holds the lock and transaction)."""
+        newest = self._conn.execute("SELECT MAX(id) FROM trips").fetchone()[0] or 0
+        deleted = self._conn.execute("DELETE FROM trips WHERE id <= ?", (newest - self.max_trips,)).rowcount
+        if deleted:
+            logger.info(f"Trip history: removed {deleted} trips beyond the {self.max_trips} cap")
+
+    def _summaries(self, where: str, args: Tuple[Any, ...], limit: int) -> List[Dict[str, Any]]:
+        sql = f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM trips {where} ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, args + (limit,)).fetchall()
+        return [dict(zip(SUMMARY_COLUMNS, row)) for row in rows]
+
+    def recent(self, user: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Newest trip summaries (optionally for one user), without decompressing anything."""
+        if user is None:
+            return self._summaries("", (), limit)
+        return self._summaries("WHERE user = ?", (user,), limit)
+
+    def find(self, location: Optional[str] = None, days: Optional[int] = None, budget: Optional[float] = None,
+             user: Optional[str] = None, since: Optional[float] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Trip summaries matching every given filter (budget matches by bucket), newest first."""
+        clauses, args = [], []
+        for column, value in (("location", location), ("days", days), ("user", user)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if budget is not None:
+            clauses.append("budget_bucket = ?")
+            args.append(budget_bucket(budget))
+        if since is not None:
+            clauses.append("created_at >= ?")
+            args.append(since)
+        return self._summaries("WHERE " + " AND ".join(clauses) if clauses else "", tuple(args), limit)
+
+    def summaries(self, trip_ids: List[int]) -> List[Dict[str, Any]]:
+        """Summaries of the given trips that still exist."""
+        if not trip_ids:
+            return []
+        return self._summaries(f"WHERE id IN ({','.join('?' * len(trip_ids))})", tuple(trip_ids), len(trip_ids))
+
+    def load(self, trip_id: int) -> Optional[Dict[str, Any]]:
+        """{"itinerary", "params", **summary} for one trip, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)}, params, itinerary FROM trips WHERE id = ?", (trip_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        trip = dict(zip(SUMMARY_COLUMNS, row[:len(SUMMARY_COLUMNS)]))
+        trip["params"], trip["itinerary"] = _unpack(row[-2]), _unpack(row[-1])
+        return trip
+
+    def iter_itineraries(self, since_id: int = 0, batch: int = 1000) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(id, itinerary) for every trip after since_id, read in id order in batches."""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, itinerary FROM trips WHERE id > ? ORDER BY id LIMIT ?", (since_id, batch)
+                ).fetchall()
+            if not rows:
+                return
+            for trip_id, blob in rows:
+                yield trip_id, _unpack(blob)
+            since_id = rows[-1][0]
+
+    def flush(self) -> None:
+        """Waits for queued writes."""
+        self._writer.submit(lambda: None).result()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM trips").fetchone()[0]
+
+
+_history: Optional[TripHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_trip_history() -> Optional[TripHistory]:
+    """Process-wide store, or None if the database cannot be opened."""
+    global _history
+    if _history is None:
+        with _history_lock:
+            if _history is None:
+                try:
+                    _history = TripHistory()
+                except Exception as e:
+                    logger.error(f"Trip history unavailable: {e}")
+                    return None
+    return _history
@@ -0,0 +1,174 @@
+import os
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from utils.logger import logger
+from backend.catalog_snapshot import DATA_DIR, get_snapshot
+from backend.facets import get_facets
+from backend.regions import get_regions
+from backend.reranker import rerank
+from backend.geo import UNROUTED_TYPES, attach_coordinates, coordinates, nearby_rows, plan_routes
+from backend.diversity import VECTOR_KEY
+from backend.shards import index_text
+from backend.carbon import apply_metrics, attach_catalog_fields
+from backend.trip_history import get_trip_history
+from backend.trip_duplicates import describe, find_duplicates, index_trip
+
+# Shared "search → generate" pipeline used by the sidebar, the HTTP API and batch jobs.
+
+HISTORY_PARAMS = ("location", "days", "budget", "travelers", "interests", "priorities", "min_eco_score")
+NEARBY_EXTRA: int = int(os.getenv("NEARBY_EXTRA", "5"))  # catalog rows near the top hotel added to retrieval
+
+
+def build_trip_query(days: int, location: str, travelers: int, interests: List[str]) -> str:
+    return (
+        f"A {days}-day trip to {location} for {travelers} people "
+        f"with interests: {', '.join(interests)}."
+    )
+
+
+def prune_candidates(rag, location: Optional[str] = None, interests: Optional[List[str]] = None,
+                     min_eco_score: float = 0.0) -> Optional[np.ndarray]:
+    """
+    Catalog rows matching the trip's location / interests / eco floor, from the facet index.
+    An empty array means nothing can match; None means the index is unavailable (search unpruned).
+    """
+    data_dir = getattr(rag, "data_dir", DATA_DIR)
+    index = get_facets(data_dir)
+    if index is None:
+        return None
+    try:
+        locations = [get_regions(data_dir).canonical(location) or location] if location else None
+        return index.indices(index.select(locations=locations, interests=interests, min_eco=min_eco_score))
+    except Exception as e:
+        logger.warning(f"Facet pruning failed: {e}")
+        return None
+
+
+def retrieve_candidates(rag, query: str, min_eco_score: float, top_k: int = 20, **search_kwargs: Any) -> List[Dict[str, Any]]:
+    results = rag.search(query=query, top_k=top_k, min_eco_score=min_eco_score, **search_kwargs)
+    return add_nearby_candidates(rag, results, search_kwargs.get("candidates"), min_eco_score)
+
+
+def add_nearby_candidates(rag, results: List[Dict[str, Any]], candidates: Optional[np.ndarray] = None,
+                          min_eco_score: float = 0.0, limit: int = NEARBY_EXTRA) -> List[Dict[str, Any]]:
+    """
+    Appends the best-rated catalog rows around the top retrieved hotel (geo index radius query,
+    within the pruned candidates) that text search did not return, so the planner has nearby options.
+    """
+    anchor = next((ll for r in results if r.get("data_type") == "Hotel" for ll in [coordinates(r)] if ll), None)
+    if anchor is None or limit <= 0:
+        return results
+    try:
+        data_dir = getattr(rag, "data_dir", DATA_DIR)
+        snapshot = get_snapshot(data_dir)
+        rows = nearby_rows(anchor[0], anchor[1], allowed=candidates, data_dir=data_dir)
+        if snapshot is None or not len(rows):
+            return results
+        keep = ~snapshot.mask_in("data_type", UNROUTED_TYPES)[rows] & (snapshot.numeric["eco_score"][rows] >= min_eco_score)
+        known = {str(r.get("name", "")).strip().lower() for r in results}
+        extra = [r for r in snapshot.rows_at(snapshot.top_k(rows[keep], limit + len(known)))
+                 if str(r.get("name", "")).strip().lower() not in known][:limit]
+        if extra and all(VECTOR_KEY in r for r in results):  # keep MMR on embeddings rather than lexical vectors
+            for r, vector in zip(extra, rag.embedder.encode([index_text(r) for r in extra])):
+                r[VECTOR_KEY] = np.asarray(vector).tolist()
+        return list(results) + extra
+    except Exception as e:
+        logger.warning(f"Nearby candidates skipped: {e}")
+        return results
+
+
+def retrieve_candidates_batch(rag, queries: List[str], min_eco_score: float, top_k: int = 20,
+                              **search_kwargs: Any) -> List[List[Dict[str, Any]]]:
+    return rag.search_batch(queries, top_k=top_k, min_eco_score=min_eco_score, **search_kwargs)
+
+
+def generate_itinerary(agent, query: str, rag_results: List[Dict[str, Any]], strict: bool = False, **trip: Any) -> Dict[str, Any]:
+    """
+    strict=True raises on LLM / validation failure instead of returning the mock plan.
+    Candidates are re-ranked for the trip's priorities / budget / interests before the prompt, and
+    grouped into per-day routes. Real plans get catalog coordinates and computed sustainability metrics.
+    """
+    run = agent.run_strict if strict else agent.run
+    candidates = add_route_hints(rerank(rag_results, **trip), trip.get("days", 3))
+    itinerary = run(
+        query=query,
+        rag_data=candidates,
+        budget=trip.get("budget", 1500),
+        interests=trip.get("interests", []),
+        days=trip.get("days", 3),
+        location=trip.get("location", "Dubai"),
+        travelers=trip.get("travelers", 1),
+        user_profile=trip.get("user_profile", {}),
+        priorities=trip.get("priorities", {}),
+    )
+    if agent.is_fallback_plan(itinerary):
+        return itinerary  # mock plan: not enriched or stored
+    enrich_itinerary(itinerary, candidates, trip.get("days", 3), trip.get("travelers", 1))
+    record_trip(query, itinerary, **trip)
+    return itinerary
+
+
+def enrich_itinerary(itinerary: Dict[str, Any], candidates: List[Dict[str, Any]], days: int, travelers: int) -> Dict[str, Any]:
+    """Catalog coordinates, types and eco scores for the activities, then computed carbon / eco / waste metrics (in place)."""
+    attach_coordinates(itinerary.get("activities") or [], candidates)
+    attach_catalog_fields(itinerary.get("activities") or [], candidates)
+    try:
+        apply_metrics(itinerary, days, travelers)
+    except Exception as e:
+        logger.warning(f"Carbon metrics failed: {e}")
+    return itinerary
+
+
+def add_route_hints(candidates: List[Dict[str, Any]], days: int) -> List[Dict[str, Any]]:
+    """Tags located candidates with the "day" and "stop" of a compact per-day route from the hotel."""
+    try:
+        for route in plan_routes(candidates, days):
+            for stop, item in enumerate(route["stops"]):
+                if item.get("data_type") != "Hotel":
+                    item["day"], item["stop"] = route["day"], stop
+    except Exception as e:
+        logger.warning(f"Route hints failed: {e}")
+    return candidates
+
+
+def record_trip(query: str, itinerary: Dict[str, Any], **trip: Any) -> None:
+    """
+    Fills duplicate_trip_detector from the closest stored trips, then queues the itinerary for the
+    trip history and the duplicate index.
+    """
+    history = get_trip_history()
+    if history is None or not itinerary:
+        return
+    signature, matches = find_duplicates(itinerary, history)
+    if signature is not None:
+        itinerary["duplicate_trip_detector"] = describe(matches)
+    params = {key: trip[key] for key in HISTORY_PARAMS if key in trip}
+    future = history.record(itinerary, user=(trip.get("user_profile") or {}).get("name", ""), params={"query": query, **params})
+    future.add_done_callback(lambda f: index_trip(f.result(), signature, history.max_trips))
+
+
+def plan_trip(agent, rag, on_step: Optional[Callable[[str], None]] = None, **trip: Any) -> Optional[Dict[str, Any]]:
+    """
+    Runs the full planning flow for one trip request.
+    Returns the itinerary dict, or None when retrieval finds no candidates.
+    """
+    step = on_step or (lambda msg: None)
+    query = trip.pop("query", None) or build_trip_query(
+        trip.get("days", 3), trip.get("location", "Dubai"), trip.get("travelers", 1), trip.get("interests", [])
+    )
+
+    step("🔍 Step 2: Searching eco-friendly locations...")
+    candidates = prune_candidates(rag, trip.get("location"), trip.get("interests"), trip.get("min_eco_score", 0.0))
+    if candidates is not None and not len(candidates):
+        # Nothing in the catalog can satisfy these filters: skip the search and the LLM call
+        logger.warning(f"No catalog rows match the trip filters: {query}")
+        return None
+    search_kwargs = {"candidates": candidates} if candidates is not None else {}
+    rag_results = retrieve_candidates(rag, query, trip.get("min_eco_score", 0.0), location=trip.get("location"),
+                                      with_vectors=True, **search_kwargs)
+    if not rag_results:
+        logger.warning(f"No candidates for query: {query}")
+        return None
+
+    step("🤖 Step 3: Creating itinerary...")
+    return generate_itinerary(agent, query, rag_results, **trip)
@@ -0,0 +1 @@
+# This file makes the 'benchmarks' folder a Python package.
@@ -0,0 +1,313 @@
+"""
+Offline end-to-end benchmark suite.
+
+    python -m benchmarks.run_benchmarks --rows 88,10000,100000,1000000 --out bench_results.json
+    python -m benchmarks.run_benchmarks --compare old.json --out new.json
+
+The ONNX embedding runtimes are also checked against PyTorch (--parity); the
+run exits non-zero when one of them drifts. Skipped without onnxruntime.
+
+Everything runs locally: synthetic catalog (benchmarks.synthetic), in-memory
+Qdrant, hashing embedder and a deterministic fake Gemini model.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from benchmarks.synthetic import generate_catalog, HashEmbedder, FakeGeminiModel, fake_itinerary_text
+
+QUERIES = [
+    "A 3-day trip to Dubai for 2 people with interests: Beach, Nature.",
+    "A 5-day trip to Abu Dhabi for 1 people with interests: History, Food.",
+    "A 2-day trip to Sharjah for 4 people with interests: Adventure.",
+    "Add more beach activities near Sharjah",
+    "Find cheaper alternatives to reduce cost.",
+]
+PLAN_LOCATIONS = ["Dubai", "Abu Dhabi", "Sharjah"]  # of QUERIES[:3]
+IMPORT_MODULES = ["backend.rag_engine", "backend.agent_workflow", "backend.utils", "utils.schemas", "utils.pdf", "utils.cost"]
+
+
+# -----------------------------------------
+# Measurement helpers
+# -----------------------------------------
+def peak_rss_mb() -> float:
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def measure(name: str, fn: Callable[[int], Any], iterations: int, warmup: int = 1, **meta: Any) -> Dict[str, Any]:
+    """Runs fn(i) `iterations` times and returns latency percentiles in ms."""
+    for i in range(warmup):
+        fn(i)
+    timings = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    arr = np.array(timings)
+    result = {
+        "name": name,
+        **meta,
+        "iterations": iterations,
+        "p50_ms": round(float(np.percentile(arr, 50)), 4),
+        "p95_ms": round(float(np.percentile(arr, 95)), 4),
+        "mean_ms": round(float(arr.mean()), 4),
+        "ops_per_sec": round(1000 / arr.mean(), 2) if arr.mean() else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"  {name:<32} {str(meta.get('rows', '')):>8}  p50={result['p50_ms']:>10.3f}ms  p95={result['p95_ms']:>10.3f}ms")
+    return result
+
+
+def scaled_iterations(base: int, rows: int) -> int:
+    """Fewer iterations for large catalogs so the full suite stays practical."""
+    return max(3, int(base * min(1.0, 10_000 / max(rows, 1))))
+
+
+def import_times(repeats: int = 3) -> List[Dict[str, Any]]:
+    """Cold import time of each core module in a fresh interpreter."""
+    results = []
+    for module in IMPORT_MODULES:
+        code = f"import time; t=time.perf_counter(); import {module}; print((time.perf_counter()-t)*1000)"
+        timings = []
+        for _ in range(repeats):
+            out = subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, capture_output=True, text=True)
+            if out.returncode != 0:
+                break
+            timings.append(float(out.stdout.strip().splitlines()[-1]))
+        if timings:
+            results.append({"name": f"import:{module}", "iterations": len(timings),
+                            "p50_ms": round(float(np.median(timings)), 3), "p95_ms": round(max(timings), 3)})
+            print(f"  import {module:<25} p50={results[-1]['p50_ms']:.1f}ms")
+    return results
+
+
+# -----------------------------------------
+# Benchmarks
+# -----------------------------------------
+def index_catalog(rag, data_dir: str, batch_size: int = 1024) -> int:
+    """Embeds and upserts a CSV catalog into the engine's collection (the utils/setup_db.py pipeline)."""
+    from backend.ingest import ingest
+    from backend.rag_engine import COLLECTION
+
+    stats = ingest([data_dir], rag.client, rag.embedder, COLLECTION, embed_batch=batch_size, recreate=True)
+    rag._quantization.pop(COLLECTION, None)
+    return stats["indexed"]
+
+def bench_retrieval(rows: int, data_dir: str, iterations: int, vector_max_rows: int) -> List[Dict[str, Any]]:
+    from qdrant_client import QdrantClient
+    from backend.rag_engine import RAGEngine
+
+    results = []
+    rag = RAGEngine(client=QdrantClient(":memory:"), embedder=HashEmbedder(), data_dir=data_dir)
+    n = scaled_iterations(iterations, rows)
+    results.append(measure("rag._fallback_search", lambda i: rag._fallback_search(QUERIES[i % len(QUERIES)], 8.0), n, rows=rows))
+
+    if rows <= vector_max_rows:
+        start = time.perf_counter()
+        indexed = index_catalog(rag, data_dir)
+        results.append({"name": "rag.index", "rows": rows, "iterations": 1,
+                        "p50_ms": round((time.perf_counter() - start) * 1000, 2),
+                        "items_per_sec": round(indexed / (time.perf_counter() - start), 1),
+                        "peak_rss_mb": peak_rss_mb()})
+        results.append(measure("rag.search", lambda i: rag.search(QUERIES[i % len(QUERIES)], top_k=20), iterations, rows=rows))
+    return results
+
+
+def bench_generation(data_dir: str, iterations: int) -> List[Dict[str, Any]]:
+    from qdrant_client import QdrantClient
+    from backend import agent_workflow
+    from backend.rag_engine import RAGEngine
+    from backend.utils import extract_json
+    from utils.schemas import ItinerarySchema
+    from utils.cost import calculate_real_cost
+    from utils.pdf import generate_pdf
+    from backend.trip_planner import plan_trip
+
+    results = []
+    agent_workflow.model = FakeGeminiModel()
+    agent = agent_workflow.AgentWorkflow()
+    rag = RAGEngine(client=QdrantClient(":memory:"), embedder=HashEmbedder(), data_dir=data_dir)
+    index_catalog(rag, data_dir)
+
+    rag_items = rag.search(QUERIES[0], top_k=20)
+    prompt = agent_workflow.ITINERARY_PROMPT_TEMPLATE.format(
+        query=QUERIES[0], budget=1500, days=3, travelers=2, eco_priority=8, budget_priority=6,
+        comfort_priority=5, user_name="Bench", user_interests="['Beach']", profile_ack="",
+        rag_data=json.dumps(rag_items, default=str),
+    )
+    fenced = fake_itinerary_text(prompt)
+    responses = {"fenced": fenced, "raw": json.dumps(extract_json(fenced))}
+    for kind, text in responses.items():
+        results.append(measure(f"extract_json[{kind}]", lambda i: extract_json(text), iterations * 10))
+
+    parsed = extract_json(responses["fenced"])
+    results.append(measure("ItinerarySchema.validate", lambda i: ItinerarySchema(**parsed).model_dump(), iterations * 10))
+
+    itinerary = ItinerarySchema(**parsed).model_dump()
+    big_list = itinerary["activities"] * 100
+    results.append(measure("calculate_real_cost", lambda i: calculate_real_cost(itinerary["activities"], 3, 2), iterations * 10, items=len(itinerary["activities"])))
+    results.append(measure("calculate_real_cost", lambda i: calculate_real_cost(big_list, 3, 2), iterations, items=len(big_list)))
+
+    def pdf(i: int) -> None:
+        out = generate_pdf(itinerary)
+        if not isinstance(out, bytes) or not out:
+            raise RuntimeError("generate_pdf returned no PDF")  # errors are logged, not raised
+
+    def full_plan(i: int) -> None:
+        # Retrieval, rerank, route hints, LLM, enrichment, metrics and trip history, as the app runs it
+        plan = plan_trip(agent, rag, query=QUERIES[i % 3], location=PLAN_LOCATIONS[i % 3], days=3, travelers=2,
+                         budget=1500, interests=["Beach"], min_eco_score=8.0,
+                         user_profile={"name": "Bench", "interests": ["Beach"]},
+                         priorities={"eco": 8, "budget": 6, "comfort": 5})
+        if not plan or agent.is_fallback_plan(plan):
+            raise RuntimeError(f"no plan for {QUERIES[i % 3]!r}")
+
+    for name, fn in (("generate_pdf", pdf), ("plan.generate[end-to-end]", full_plan)):
+        try:
+            results.append(measure(name, fn, iterations))
+        except Exception as e:
+            print(f"  ❌ {name}: {e}")
+            results.append({"name": name, "passed": False, "error": str(e)})
+    return results
+
+
+# -----------------------------------------
+# Compare / CLI
+# -----------------------------------------
+def embedding_parity(backends: List[str], samples: int = 64) -> List[Dict[str, Any]]:
+    """Cosine agreement of each ONNX runtime with PyTorch on catalog texts; skipped without onnxruntime."""
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        print("  onnxruntime not installed, skipping")
+        return []
+    from backend.embedder import parity_check, catalog_texts
+
+    texts = catalog_texts()[:samples]
+    results = []
+    for backend in backends:
+        try:
+            report = parity_check(backend, texts)
+        except Exception as e:
+            print(f"  ❌ {backend:<10} {e}")
+            results.append({"name": f"parity:{backend}", "passed": False, "error": str(e)})
+            continue
+        flag = "✅" if report["passed"] else "❌"
+        print(f"  {flag} {backend:<10} cosine mean={report['cosine_mean']} min={report['cosine_min']}")
+        results.append({"name": f"parity:{backend}", "passed": report["passed"],
+                        "cosine_mean": report["cosine_mean"], "cosine_min": report["cosine_min"],
+                        "p50_ms": report[backend]["query_ms"]})
+    return results
+
+
+def _key(r: Dict[str, Any]) -> str:
+    return f"{r['name']}|rows={r.get('rows', '')}|items={r.get('items', '')}"
+
+
+def compare(old_path: str, new: Dict[str, Any], threshold: float) -> int:
+    """Prints p50 ratios against an earlier run; returns number of regressions."""
+    with open(old_path) as f:
+        old = {_key(r): r for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"\n📊 p50 compared against {old_path}")
+    for r in new["results"]:
+        base = old.get(_key(r))
+        if not base or not base.get("p50_ms"):
+            continue
+        ratio = r["p50_ms"] / base["p50_ms"]
+        flag = "❌" if ratio > threshold else "✅"
+        regressions += ratio > threshold
+        print(f"  {flag} {_key(r):<55} {base['p50_ms']:>10.3f} -> {r['p50_ms']:>10.3f} ms  x{ratio:.2f}")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EcoGuide offline benchmarks")
+    parser.add_argument("--rows", default="88,10000,100000,1000000", help="Comma-separated catalog sizes")
+    parser.add_argument("--vector-max-rows", type=int, default=100_000, help="Skip in-memory vector index above this size")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 ratio counted as a regression")
+    parser.add_argument("--skip-imports", action="store_true")
+    parser.add_argument("--parity", default="onnx,onnx-int8",
+                        help="Embedding runtimes checked against PyTorch (empty to skip)")
+    args = parser.parse_args(argv)
+
+    sizes = [int(x) for x in args.rows.split(",") if x.strip()]
+    work_dir = tempfile.mkdtemp(prefix="ecoguide-bench-")
+    # Planning records trip history; keep it out of data/
+    os.environ.setdefault("TRIP_HISTORY_DB", os.path.join(work_dir, "trip_history.db"))
+    os.environ.setdefault("TRIP_LSH_DB", os.path.join(work_dir, "trip_lsh.db"))
+    results: List[Dict[str, Any]] = []
+    try:
+        if not args.skip_imports:
+            print("⏱️ Import / startup")
+            results += import_times()
+
+        for rows in sizes:
+            print(f"🔍 Retrieval @ {rows} rows")
+            data_dir = os.path.join(work_dir, f"catalog_{rows}")
+            generate_catalog(rows, data_dir)
+            results += bench_retrieval(rows, data_dir, args.iterations, args.vector_max_rows)
+
+        backends = [x for x in args.parity.split(",") if x.strip()]
+        if backends:
+            print("🧠 Embedding parity")
+            results += embedding_parity(backends)
+
+        print("🤖 Generation / validation / rendering")
+        data_dir = os.path.join(work_dir, "catalog_gen")
+        generate_catalog(1000, data_dir)
+        results += bench_generation(data_dir, args.iterations)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written to {args.out}")
+
+    failed = [r["name"] for r in results if r.get("passed") is False]
+    if failed:
+        print(f"❌ Failed: {', '.join(failed)}")
+    if args.compare:
+        return 1 if compare(args.compare, report, args.threshold) or failed else 0
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
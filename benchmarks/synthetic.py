@@ -0,0 +1,147 @@
+"""
+Offline stand-ins for the benchmark suite:
+- a synthetic catalog scaled up from the real data/*.csv rows
+- a deterministic hashing embedder (same interface as SentenceTransformer.encode)
+- a deterministic fake Gemini model (same interface as GenerativeModel.generate_content)
+"""
+import os
+import re
+import json
+import time
+import hashlib
+from types import SimpleNamespace
+from typing import Any, Dict, List, Union
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DATA_DIR = os.path.join(BASE_DIR, "data")
+EMBEDDING_DIM = 384
+
+CITIES = [
+    "Dubai", "Abu Dhabi", "Sharjah", "Ajman", "Fujairah", "Ras Al Khaimah", "Al Ain",
+    "Muscat", "Doha", "Manama", "Riyadh", "Jeddah", "Amman", "Cairo", "Istanbul", "Baku",
+]
+CITY_COORDS = {
+    "Dubai": (25.20, 55.27), "Abu Dhabi": (24.45, 54.38), "Sharjah": (25.35, 55.42), "Ajman": (25.41, 55.45),
+    "Fujairah": (25.13, 56.33), "Ras Al Khaimah": (25.79, 55.94), "Al Ain": (24.21, 55.74), "Muscat": (23.59, 58.41),
+    "Doha": (25.29, 51.53), "Manama": (26.23, 50.59), "Riyadh": (24.71, 46.68), "Jeddah": (21.49, 39.19),
+    "Amman": (31.95, 35.93), "Cairo": (30.04, 31.24), "Istanbul": (41.01, 28.98), "Baku": (40.41, 49.87),
+}
+
+
+def generate_catalog(rows: int, out_dir: str, seed: int = 42) -> Dict[str, int]:
+    """
+    Writes a synthetic catalog of ~`rows` items to out_dir, keeping each source
+    file's columns and its share of the real catalog. Returns rows per file.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    sources = {}
+    for filename in sorted(os.listdir(SOURCE_DATA_DIR)):
+        if filename.endswith(".csv"):
+            sources[filename] = pd.read_csv(os.path.join(SOURCE_DATA_DIR, filename))
+    total_real = sum(len(df) for df in sources.values())
+
+    written = {}
+    for filename, df in sources.items():
+        n = max(1, round(rows * len(df) / total_real))
+        picks = rng.integers(0, len(df), size=n)
+        out = df.iloc[picks].reset_index(drop=True)
+
+        if n > len(df):
+            # Unique names / locations beyond the original rows
+            suffix = pd.Series(np.arange(n)).astype(str)
+            out["name"] = out["name"].astype(str) + " #" + suffix
+            out["location"] = np.array(CITIES)[rng.integers(0, len(CITIES), size=n)]
+            if "lat" in out.columns:  # scatter around the new city (~10 km)
+                centre = np.array([CITY_COORDS[c] for c in out["location"]])
+                out["lat"] = (centre[:, 0] + rng.normal(0, 0.09, n)).round(5)
+                out["lon"] = (centre[:, 1] + rng.normal(0, 0.09, n)).round(5)
+                out.loc[df.iloc[picks]["lat"].isna().to_numpy(), ["lat", "lon"]] = np.nan
+
+        out["eco_score"] = np.clip(out["eco_score"].astype(float) + rng.normal(0, 0.4, n), 5.0, 10.0).round(1)
+        out["avg_rating"] = np.clip(out["avg_rating"].astype(float) + rng.normal(0, 0.2, n), 3.0, 5.0).round(1)
+        for price_col in ("price", "price_per_night", "entry_fee"):
+            if price_col in out.columns:
+                out[price_col] = (out[price_col].astype(float) * rng.uniform(0.7, 1.3, n)).round(0)
+
+        out.to_csv(os.path.join(out_dir, filename), index=False)
+        written[filename] = n
+    return written
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words feature-hashing embedder (no model download)."""
+
+    def __init__(self, dim: int = EMBEDDING_DIM) -> None:
+        self.dim = dim
+
+    def _embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs: Any) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self._embed(sentences)
+        return np.stack([self._embed(s) for s in sentences]) if sentences else np.zeros((0, self.dim), np.float32)
+
+
+class FakeGeminiModel:
+    """Returns a deterministic, schema-valid itinerary built from the prompt's RAG data."""
+
+    def __init__(self, latency_s: float = 0.0) -> None:
+        self.latency_s = latency_s
+        self.calls = 0
+
+    def generate_content(self, prompt: str, **kwargs: Any) -> SimpleNamespace:
+        self.calls += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return SimpleNamespace(text=fake_itinerary_text(prompt))
+
+
+def fake_itinerary_text(prompt: str) -> str:
+    seed = int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:4], "little")
+    rng = np.random.default_rng(seed)
+
+    days_match = re.search(r"Days: (\d+)", prompt)
+    days = int(days_match.group(1)) if days_match else 3
+
+    items: List[Dict[str, Any]] = []
+    rag_match = re.search(r"RAG Data: (\[.*\])", prompt)
+    if rag_match:
+        try:
+            items = json.loads(rag_match.group(1))
+        except json.JSONDecodeError:
+            items = []
+
+    activities = [
+        {k: item.get(k) for k in ("name", "location", "eco_score", "cost", "cost_type", "data_type", "description", "image_url")}
+        for item in items[: 3 * days]
+    ]
+    plan = "\n\n".join(
+        f"### Day {d + 1}\n" + "\n".join(
+            f"* **{9 + 2 * i:02d}:00**: Visit *{a['name']}*." for i, a in enumerate(activities[3 * d: 3 * d + 3])
+        )
+        for d in range(days)
+    )
+    data = {
+        "plan": plan,
+        "activities": activities,
+        "total_cost": int(rng.integers(300, 3000)),
+        "eco_score": round(float(rng.uniform(7, 10)), 1),
+        "carbon_saved": f"{int(rng.integers(5, 60))}kg",
+        "waste_free_score": int(rng.integers(5, 10)),
+        "plan_health_score": int(rng.integers(60, 100)),
+        "budget_breakdown": {"Accommodation": 900, "Activities": 150, "Food": 200, "Transport": 50},
+        "experience_highlights": [a["name"] for a in activities[:3]],
+        "trip_mood_indicator": {"Adventure": 40, "Culture": 80, "Relax": 50, "Luxury": 60},
+    }
+    # Wrap like Gemini usually does, so extract_json takes its regex path
+    return "Here is your plan:\n```json\n" + json.dumps(data, default=str) + "\n```"
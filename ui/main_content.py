@@ -4,6 +4,7 @@ import json
 import time  
 from utils.cards import get_card_css
 from utils.cost import calculate_real_cost
+from backend.trip_planner import enrich_itinerary
 
 # Import ALL tabs
 from ui.tabs import (
@@ -60,8 +61,8 @@ def render_main_content(agent, rag):
     with tabs[3]: list_tab.render_list(data)
     with tabs[4]: packing_tab.render_packing_tab(agent, data, user)
     with tabs[5]: story_tab.render_story_tab(agent, data, user)
-    with tabs[6]: chat_tab.render_chat_tab(agent, data)
-    with tabs[7]: map_tab.render_map_tab(loc)
+    with tabs[6]: chat_tab.render_chat_tab(agent, data, getattr(rag, "embedder", None))
+    with tabs[7]: map_tab.render_map_tab(loc, data, days)
     with tabs[8]: share_tab.render_share_tab(days, loc, interests, budget)
 
     # --- Refine Plan Section ---
@@ -93,11 +94,10 @@ def render_main_content(agent, rag):
                 try:
                     status.write("🧠 Re-analyzing request...")
                     from utils.profile import load_profile
-                    from backend.rag_engine import RAGEngine 
                     
-                    # Re-init RAG just for search context
-                    rag = RAGEngine()
-                    rag_results = rag.search(refinement_query)
+                    # Feedback like "cheaper hotels" becomes category / price filters
+                    rag_results = rag.search(refinement_query, location=loc,
+                                             filters=rag.extract_filters(refinement_query))
                     
                     user_profile = load_profile(user)
                     user_profile['name'] = user
@@ -119,6 +119,7 @@ def render_main_content(agent, rag):
                     if new_itinerary:
                         if isinstance(new_itinerary, str):
                             new_itinerary = json.loads(new_itinerary)
+                        enrich_itinerary(new_itinerary, list(rag_results) + list(activities), days, pax)
                             
                         st.session_state.itinerary = new_itinerary
                         status.update(label="✅ Plan Refined!", state="complete")
@@ -1,6 +1,10 @@
 import streamlit as st
 from utils.profile import load_profile, save_profile
 from utils.logger import logger
+from backend.trip_planner import build_trip_query, plan_trip
+from backend.regions import known_locations
+from backend.facets import get_facets
+from backend.trip_history import get_trip_history
 import time
 
 
@@ -58,6 +62,9 @@ def render_sidebar(agent, rag, app_version: str):
                 save_profile(user_name, fav_interests, pref_budget)
                 st.success("Profile Saved!")
 
+        if user_name:
+            _render_recent_trips(user_name)
+
         st.divider()
 
         # -------------------------
@@ -90,9 +97,11 @@ def render_sidebar(agent, rag, app_version: str):
         days = st.number_input("Number of Days", 1, 30, 3, key="trip_days")
         travelers = st.number_input("Travelers", 1, 20, 1, key="trip_travelers")
 
+        locations = known_locations(rag.data_dir)
         location = st.selectbox(
             "Base Location",
-            ["Dubai", "Abu Dhabi", "Sharjah"],
+            locations,
+            index=locations.index("Dubai") if "Dubai" in locations else 0,
             key="trip_location",
         )
 
@@ -101,10 +110,12 @@ def render_sidebar(agent, rag, app_version: str):
             key="trip_min_eco"
         )
 
+        matches = _render_match_counts(rag, location, st.session_state.trip_interests, min_eco)
+
         # -------------------------
         # GENERATE PLAN BUTTON
         # -------------------------
-        if st.button("Generate Plan 🚀", use_container_width=True):
+        if st.button("Generate Plan 🚀", use_container_width=True, disabled=matches == 0):
 
             if not user_name:
                 st.error("Please enter your name first.")
@@ -127,33 +138,17 @@ def render_sidebar(agent, rag, app_version: str):
                         "comfort": comfort_priority,
                     }
 
-                    query = (
-                        f"A {days}-day trip to {location} for {travelers} people "
-                        f"with interests: {', '.join(st.session_state.trip_interests)}."
-                    )
+                    query = build_trip_query(days, location, travelers, st.session_state.trip_interests)
 
                     user_profile = load_profile(user_name)
                     user_profile["name"] = user_name
 
-                    # Step 2
-                    status.write("🔍 Step 2: Searching eco-friendly locations...")
-
-                    rag_results = rag.search(
+                    # Step 2 + 3 (shared pipeline)
+                    itinerary = plan_trip(
+                        agent, rag,
+                        on_step=status.write,
                         query=query,
-                        top_k=20,
-                        min_eco_score=min_eco
-                    )
-
-                    if not rag_results:
-                        status.update(label="❌ No eco-friendly results found.", state="error")
-                        return
-
-                    # Step 3
-                    status.write("🤖 Step 3: Creating itinerary...")
-
-                    itinerary = agent.run(
-                        query=query,
-                        rag_data=rag_results,
+                        min_eco_score=min_eco,
                         budget=trip_budget,
                         interests=st.session_state.trip_interests,
                         days=days,
@@ -163,6 +158,10 @@ def render_sidebar(agent, rag, app_version: str):
                         priorities=priorities
                     )
 
+                    if itinerary is None:
+                        status.update(label="❌ No eco-friendly results found.", state="error")
+                        return
+
                     if itinerary:
                         _save_generated(itinerary, query, priorities)
                         status.update(label="✅ Done!", state="complete")
@@ -182,9 +181,56 @@ def render_sidebar(agent, rag, app_version: str):
 # ======================================================
 # HELPERS
 # ======================================================
+def _render_match_counts(rag, location, interests, min_eco):
+    """Live catalog matches for the current filters; returns the total (None if no index)."""
+    index = get_facets(rag.data_dir)
+    if index is None:
+        return None
+    counts = index.counts([location], interests, min_eco)
+    if counts["total"] == 0:
+        st.warning("No places match this location and eco score. Lower the minimum eco score.")
+    else:
+        by_type = ", ".join(f"{n} {t}" for t, n in sorted(counts["by_type"].items(), key=lambda kv: -kv[1]))
+        st.caption(f"🔢 {counts['total']} matches ({by_type})")
+    return counts["total"]
+
+
+def _render_recent_trips(user_name):
+    """Reloads one of the user's saved trips without regenerating it."""
+    history = get_trip_history()
+    trips = history.recent(user=user_name, limit=10) if history else []
+    if not trips:
+        return
+    labels = {
+        t["id"]: f"{t['location']} · {t['days']}d · ${t['budget']:.0f} · {time.strftime('%d %b %H:%M', time.localtime(t['created_at']))}"
+        for t in trips
+    }
+    with st.expander("🕘 Recent Trips"):
+        trip_id = st.selectbox("Saved trips", list(labels), format_func=labels.get, key="history_trip")
+        if st.button("Load Trip", use_container_width=True):
+            trip = history.load(trip_id)
+            if trip:
+                _clear_session()
+                _restore_trip(trip)
+                st.toast("Trip loaded from history 🗂️")
+
+
+def _restore_trip(trip):
+    params = trip["params"]
+    st.session_state.itinerary = trip["itinerary"]
+    st.session_state.query = params.get("query", "")
+    st.session_state.current_trip_days = params.get("days", 3)
+    st.session_state.current_trip_budget = params.get("budget", 1500)
+    st.session_state.current_trip_location = params.get("location", "Dubai")
+    st.session_state.current_trip_travelers = params.get("travelers", 1)
+    st.session_state.current_trip_interests = params.get("interests", [])
+    st.session_state.current_trip_priorities = params.get("priorities", {})
+
+
 def _clear_session():
     st.session_state.itinerary = None
     st.session_state.chat_history = []
+    st.session_state.pop("chat_memory", None)
     st.session_state.packing_list = {}
     st.session_state.travel_story = ""
     st.session_state.upgrade_suggestions = ""
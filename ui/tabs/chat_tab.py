@@ -2,8 +2,10 @@ import streamlit as st
 import json
 from utils.logger import logger
 from datetime import datetime
+from backend.chat_cache import SUGGESTED_QUESTIONS, answer_question, precompute_suggested
+from backend.chat_memory import ChatMemory
 
-def render_chat_tab(agent, itinerary):
+def render_chat_tab(agent, itinerary, embedder=None):
     """
     Interactive AI chat interface for asking questions about your travel itinerary.
     
@@ -16,6 +18,7 @@ def render_chat_tab(agent, itinerary):
     Args:
         agent: AI agent workflow instance with ask_question method
         itinerary: Complete travel plan dictionary
+        embedder: Optional sentence embedder for the itinerary chunk index (lexical scoring without it)
     """
     st.subheader("🤖 Ask AI About Your Trip")
     
@@ -25,6 +28,10 @@ def render_chat_tab(agent, itinerary):
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
     
+    # Rolling summary of older turns (keeps the prompt size flat in long chats)
+    if "chat_memory" not in st.session_state:
+        st.session_state.chat_memory = ChatMemory()
+    
     # Initialize itinerary hash for change detection
     if "chat_itinerary_hash" not in st.session_state:
         st.session_state.chat_itinerary_hash = None
@@ -51,25 +58,21 @@ def render_chat_tab(agent, itinerary):
             st.warning("🔄 Your itinerary has changed. Previous chat context may be outdated.")
             if st.button("Clear Chat History"):
                 st.session_state.chat_history = []
+                st.session_state.chat_memory.reset()
                 st.session_state.chat_itinerary_hash = current_hash
                 st.rerun()
         st.session_state.chat_itinerary_hash = current_hash
     
+    # Answer the suggested questions in the background (one batched call per itinerary)
+    try:
+        precompute_suggested(agent, itinerary, embedder)
+    except Exception as e:
+        logger.warning(f"Could not start suggested-answer precompute: {e}")
+    
     # Sidebar with helpful prompts
     with st.sidebar:
         st.markdown("### 💡 Suggested Questions")
-        sample_questions = [
-            "Is this place safe at night?",
-            "What are the best local restaurants?",
-            "How do I get around the city?",
-            "What should I pack for the weather?",
-            "Are there any cultural customs I should know?",
-            "What's the best time to visit these attractions?",
-            "Can you suggest alternatives if it rains?",
-            "What are some hidden gems nearby?"
-        ]
-        
-        for q in sample_questions:
+        for q in SUGGESTED_QUESTIONS:
             if st.button(q, key=f"sample_{hash(q)}", use_container_width=True):
                 # Trigger question programmatically
                 st.session_state.pending_question = q
@@ -89,6 +92,7 @@ def render_chat_tab(agent, itinerary):
         with col1:
             if st.button("🗑️ Clear Chat", help="Delete all chat history"):
                 st.session_state.chat_history = []
+                st.session_state.chat_memory.reset()
                 st.rerun()
         with col2:
             # Export chat as text
@@ -139,34 +143,14 @@ def render_chat_tab(agent, itinerary):
         with st.chat_message("assistant"):
             with st.spinner("🤔 Thinking..."):
                 try:
-                    # Prepare optimized context
-                    # Include recent chat for continuity but limit size
-                    recent_chat = st.session_state.chat_history[-6:]  # Last 3 exchanges
-                    chat_context = "\n".join([
-                        f"{msg['role']}: {msg['content']}" 
-                        for msg in recent_chat[:-1]  # Exclude current question
-                    ])
-                    
-                    # Optimize itinerary context - prioritize relevant sections
-                    plan_summary = _create_smart_context(itinerary, question)
-                    
-                    # Combine contexts efficiently
-                    full_context = f"""
-ITINERARY SUMMARY:
-{plan_summary}
-
-RECENT CONVERSATION:
-{chat_context if chat_context else 'First question'}
-
-CURRENT QUESTION: {question}
-"""
-                    
-                    # Call AI with optimized context (max ~4000 chars)
-                    response = agent.ask_question(
-                        plan_context=full_context[:4000],
-                        question=question
+                    # Summary of earlier turns + recent turns, within a fixed token budget
+                    conversation = st.session_state.chat_memory.context(
+                        st.session_state.chat_history[:-1]  # Exclude current question
                     )
                     
+                    # Cached / precomputed answer if there is one, else the most relevant itinerary chunks
+                    response, _ = answer_question(agent, itinerary, question, embedder, conversation=conversation)
+                    
                     # Validate response
                     if not response or not response.strip():
                         response = "I'm sorry, I couldn't generate an answer. Please try rephrasing your question."
@@ -187,6 +171,9 @@ CURRENT QUESTION: {question}
                         "timestamp": response_timestamp
                     })
                     
+                    # Fold turns that left the verbatim window into the summary (background)
+                    st.session_state.chat_memory.observe(agent, st.session_state.chat_history)
+                    
                 except json.JSONDecodeError as e:
                     logger.error(f"JSON serialization error: {e}")
                     error_msg = "⚠️ Error processing itinerary data. Please regenerate your plan."
@@ -222,76 +209,3 @@ CURRENT QUESTION: {question}
                         "timestamp": datetime.now().strftime("%I:%M %p")
                     })
 
-
-def _create_smart_context(itinerary, question):
-    """
-    Creates an optimized context by extracting relevant parts of itinerary
-    based on the question keywords.
-    
-    Args:
-        itinerary: Complete itinerary dictionary
-        question: User's question string
-    
-    Returns:
-        Optimized context string (~2000 chars max)
-    """
-    try:
-        # Extract key information always needed
-        summary = []
-        
-        # Basic info
-        if "total_cost" in itinerary:
-            summary.append(f"Budget: ${itinerary['total_cost']}")
-        
-        if "eco_score" in itinerary:
-            summary.append(f"Eco Score: {itinerary['eco_score']}/10")
-        
-        # Day-by-day plan (abbreviated)
-        if "plan" in itinerary and itinerary["plan"]:
-            plan_text = str(itinerary["plan"])
-            # Extract just day headers and key activities
-            lines = plan_text.split("\n")
-            key_lines = [l for l in lines if l.strip().startswith("#") or "Day" in l]
-            summary.append("ITINERARY:\n" + "\n".join(key_lines[:15]))
-        
-        # Activities summary
-        if "activities" in itinerary and itinerary["activities"]:
-            activities = itinerary["activities"][:5]  # Top 5 activities
-            activity_text = "KEY ACTIVITIES:\n" + "\n".join([
-                f"- {a.get('name', 'Activity')}: ${a.get('cost', 0)}"
-                for a in activities
-            ])
-            summary.append(activity_text)
-        
-        # Question-specific context
-        question_lower = question.lower()
-        
-        if any(word in question_lower for word in ["safe", "safety", "danger", "security"]):
-            if "risk_safety_report" in itinerary:
-                summary.append(f"SAFETY: {itinerary['risk_safety_report']}")
-        
-        if any(word in question_lower for word in ["weather", "rain", "climate", "temperature"]):
-            if "weather_contingency" in itinerary:
-                summary.append(f"WEATHER: {itinerary['weather_contingency']}")
-        
-        if any(word in question_lower for word in ["cost", "budget", "expensive", "price", "money"]):
-            if "budget_breakdown" in itinerary:
-                breakdown = json.dumps(itinerary["budget_breakdown"])
-                summary.append(f"BUDGET BREAKDOWN: {breakdown}")
-            if "cost_leakage_report" in itinerary:
-                summary.append(f"COST ANALYSIS: {itinerary['cost_leakage_report']}")
-        
-        if any(word in question_lower for word in ["eco", "green", "sustainable", "carbon"]):
-            if "carbon_saved" in itinerary:
-                summary.append(f"CARBON SAVED: {itinerary['carbon_saved']}")
-            if "carbon_offset_suggestion" in itinerary:
-                summary.append(f"OFFSET: {itinerary['carbon_offset_suggestion']}")
-        
-        # Combine and limit size
-        context = "\n\n".join(summary)
-        return context[:2000]  # Hard limit for token efficiency
-        
-    except Exception as e:
-        logger.warning(f"Could not create smart context: {e}")
-        # Fallback to basic JSON
-        return json.dumps(itinerary, default=str)[:2000]
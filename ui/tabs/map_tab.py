@@ -1,5 +1,7 @@
 import streamlit as st
 import pandas as pd
+import pydeck as pdk
+from backend.geo import plan_routes
 
 # ---------------------------------------
 # 🌍 Static Coordinates for Supported Cities
@@ -10,12 +12,63 @@ LOCATION_COORDS = {
     "Sharjah": pd.DataFrame({"lat": [25.3463], "lon": [55.4209]}),
 }
 
+# One colour per day (RGB), reused cyclically
+DAY_COLORS = [
+    [46, 125, 50], [21, 101, 192], [239, 108, 0], [142, 36, 170],
+    [0, 131, 143], [198, 40, 40], [85, 139, 47], [93, 64, 55],
+]
+HOTEL_COLOR = [33, 33, 33]
+
+
+def _route_frames(routes):
+    """(stops DataFrame, paths DataFrame) for pydeck from plan_routes() output."""
+    stops, paths = [], []
+    for route in routes:
+        color = DAY_COLORS[(route["day"] - 1) % len(DAY_COLORS)]
+        points = [[float(s["lon"]), float(s["lat"])] for s in route["stops"]]
+        has_hotel = route["stops"][0].get("data_type") == "Hotel"
+        for order, stop in enumerate(route["stops"]):
+            is_hotel = stop.get("data_type") == "Hotel"
+            stops.append({
+                "name": stop.get("name", ""), "lat": float(stop["lat"]), "lon": float(stop["lon"]),
+                "label": "🏨 Base" if is_hotel else f"Day {route['day']} · stop {order}",
+                "color": HOTEL_COLOR if is_hotel else color, "radius": 140 if is_hotel else 90,
+            })
+        if has_hotel and len(points) > 1:
+            points.append(points[0])  # back to the hotel in the evening
+        paths.append({"name": f"Day {route['day']}", "label": f"{route['km']} km loop", "path": points, "color": color})
+    return pd.DataFrame(stops).drop_duplicates(subset=["name", "label"]), pd.DataFrame(paths)
+
+
 # ---------------------------------------
 # 🗺️ Map Renderer
 # ---------------------------------------
-def render_map_tab(location: str):
+def render_map_tab(location: str, itinerary=None, days: int = 3):
     st.subheader(f"🗺️ Map of {location}")
 
+    routes = plan_routes((itinerary or {}).get("activities") or [], days)
+    if routes:
+        stops, paths = _route_frames(routes)
+        try:
+            st.pydeck_chart(pdk.Deck(
+                map_style=None,
+                initial_view_state=pdk.ViewState(
+                    latitude=float(stops["lat"].mean()), longitude=float(stops["lon"].mean()), zoom=10
+                ),
+                layers=[
+                    pdk.Layer("PathLayer", paths, get_path="path", get_color="color", width_min_pixels=3, pickable=True),
+                    pdk.Layer("ScatterplotLayer", stops, get_position="[lon, lat]", get_fill_color="color",
+                              get_radius="radius", radius_min_pixels=5, pickable=True),
+                ],
+                tooltip={"text": "{name}\n{label}"},
+            ), use_container_width=True)
+            st.caption(" · ".join(
+                f"Day {r['day']}: {sum(s.get('data_type') != 'Hotel' for s in r['stops'])} stops, {r['km']} km" for r in routes
+            ))
+            return
+        except Exception as e:
+            st.warning(f"⚠️ Route map unavailable, showing the city instead ({e}).")
+
     # Fetch coordinates
     map_data = LOCATION_COORDS.get(location)
 
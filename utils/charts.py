@@ -10,8 +10,12 @@ def generate_radar_chart(_itinerary_data: Dict[str, Any], user_budget: int) -> g
     try:
         eco_score = float(_itinerary_data.get('eco_score', 5.0))
         
-        raw_carbon = str(_itinerary_data.get('carbon_saved', "0")).lower().replace('kg', '').strip()
-        carbon_saved = float(raw_carbon) if raw_carbon.replace('.', '').isdigit() else 0
+        # Computed by backend/carbon.py; older saved plans only have the "NNkg" string
+        carbon_saved = float(_itinerary_data.get('carbon_saved_kg') or 0)
+        carbon_baseline = float(_itinerary_data.get('carbon_baseline_kg') or 0)
+        if not carbon_baseline:
+            raw_carbon = str(_itinerary_data.get('carbon_saved', "0")).lower().replace('kg', '').strip()
+            carbon_saved = float(raw_carbon) if raw_carbon.replace('.', '').isdigit() else 0
         
         total_cost = float(_itinerary_data.get('total_cost', 0))
         waste_score = float(_itinerary_data.get('waste_free_score', 5))
@@ -19,6 +23,7 @@ def generate_radar_chart(_itinerary_data: Dict[str, Any], user_budget: int) -> g
         # Default fallback values
         eco_score = 5.0
         carbon_saved = 10
+        carbon_baseline = 0
         total_cost = 0
         waste_score = 5
 
@@ -28,8 +33,11 @@ def generate_radar_chart(_itinerary_data: Dict[str, Any], user_budget: int) -> g
     else:
         budget_efficiency = 5 # Default score
 
-    # Normalize Carbon Score (0-10)
-    carbon_score = max(0, min(10, (carbon_saved / 50) * 10))
+    # Normalize Carbon Score (0-10): share of the baseline footprint avoided
+    if carbon_baseline > 0:
+        carbon_score = max(0, min(10, carbon_saved / carbon_baseline * 10))
+    else:
+        carbon_score = max(0, min(10, (carbon_saved / 50) * 10))
     
     # Data for Chart
     categories = ['Eco Score', 'Carbon Savings', 'Budget Fit', 'Waste-Free']
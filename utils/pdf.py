@@ -80,8 +80,9 @@ def generate_pdf(itinerary_data: Dict[str, Any]) -> bytes:
                     continue
 
         # --- FINAL OUTPUT ---
-        # 'latin-1' encoding is required by FPDF's output method
-        return pdf.output(dest='S').encode('latin-1', 'ignore')
+        # PyFPDF returns a latin-1 str, fpdf2 a bytearray
+        out = pdf.output(dest='S')
+        return out.encode('latin-1', 'ignore') if isinstance(out, str) else bytes(out)
         
     except Exception as e:
         # If all else fails, return a simple error PDF bytes
@@ -1,25 +1,19 @@
-import os
-import json
 import streamlit as st
 from utils.logger import logger
+from utils.profile_store import PROFILE_DIR, get_profile_store
 
-PROFILE_DIR = "data/profiles"
+# Profiles are kept in SQLite behind an in-memory cache (utils/profile_store.py)
 
 def save_profile(name: str, interests: list, budget: int) -> None:
     try:
-        os.makedirs(PROFILE_DIR, exist_ok=True)
-        path = os.path.join(PROFILE_DIR, f"profile_{name}.json")
-        with open(path, 'w') as f:
-            json.dump({"interests": interests, "budget": budget}, f)
+        get_profile_store().put(name, {"interests": interests, "budget": budget})
         st.sidebar.success("Profile Saved!")
     except Exception as e:
         st.sidebar.error(f"Error saving profile: {e}")
 
 def load_profile(name: str) -> dict:
     try:
-        path = os.path.join(PROFILE_DIR, f"profile_{name}.json")
-        if os.path.exists(path):
-            with open(path, 'r') as f: return json.load(f)
-    except: pass
+        return get_profile_store().get(name)
+    except Exception as e:
+        logger.warning(f"Could not load profile {name}: {e}")
     return {}
-  
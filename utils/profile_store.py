@@ -0,0 +1,164 @@
+"""
+SQLite-backed user profile store.
+
+Profiles live in one table keyed (and indexed) by user name instead of one
+JSON file per user. Reads go through a process-wide LRU cache, so a Streamlit
+rerun costs a dict lookup. Misses are cached as well. Cached rows expire after
+PROFILE_CACHE_TTL_S, so profiles saved by another process (the API, another
+Streamlit worker) show up within a few seconds. Writes update the cache
+at once and are flushed to SQLite in batches by a background thread, every
+PROFILE_FLUSH_S seconds or at PROFILE_FLUSH_BATCH pending writes, and again
+at exit.
+
+The old data/profiles/profile_<name>.json files are imported once, the
+first time the database is opened. The files are left in place.
+"""
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from utils.logger import logger
+
+PROFILE_DIR = "data/profiles"  # legacy per-user JSON files
+PROFILE_DB = os.getenv("PROFILE_DB", "data/profiles.db")
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_FLUSH_S = float(os.getenv("PROFILE_FLUSH_S", "0.5"))
+PROFILE_FLUSH_BATCH = 256
+PROFILE_CACHE_TTL_S = float(os.getenv("PROFILE_CACHE_TTL_S", "5"))
+_MISSING: Dict[str, Any] = {}  # cached "no such profile"
+
+
+class ProfileStore:
+    def __init__(self, path: str = PROFILE_DB, legacy_dir: Optional[str] = PROFILE_DIR,
+                 cache_size: int = PROFILE_CACHE_SIZE) -> None:
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()  # name -> (expires, data)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()        # cache + pending
+        self._db_lock = threading.Lock()     # the shared connection
+        self._wake = threading.Event()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._db_lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS profiles (name TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if legacy_dir:
+            self.migrate_json(legacy_dir)
+        self._writer = threading.Thread(target=self._flush_loop, name="profile-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def migrate_json(self, legacy_dir: str) -> int:
+        """Imports profile_<name>.json files once (existing rows win); returns the number imported."""
+        with self._db_lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                return 0
+        rows = []
+        if os.path.isdir(legacy_dir):
+            for entry in os.scandir(legacy_dir):
+                if not (entry.name.startswith("profile_") and entry.name.endswith(".json")):
+                    continue
+                try:
+                    with open(entry.path, "r") as f:
+                        data = json.load(f)
+                    rows.append((entry.name[len("profile_"):-len(".json")], json.dumps(data), entry.stat().st_mtime))
+                except Exception as e:
+                    logger.warning(f"Skipping unreadable profile {entry.name}: {e}")
+        with self._db_lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO profiles (name, data, updated_at) VALUES (?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(time.time()),))
+        if rows:
+            logger.info(f"Imported {len(rows)} JSON profiles into {self.path}")
+        return len(rows)
+
+    def _remember(self, name: str, data: Dict[str, Any]) -> None:
+        self._cache[name] = (time.monotonic() + PROFILE_CACHE_TTL_S, data)
+        self._cache.move_to_end(name)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, name: str) -> Dict[str, Any]:
+        with self._lock:
+            if name in self._pending:  # own unflushed write
+                return dict(self._pending[name])
+            entry = self._cache.get(name)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._cache.move_to_end(name)
+                    return dict(entry[1])
+                del self._cache[name]  # expired: re-read, another process may have saved it
+        with self._db_lock:
+            row = self._conn.execute("SELECT data FROM profiles WHERE name = ?", (name,)).fetchone()
+        data = json.loads(row[0]) if row else _MISSING
+        with self._lock:
+            # A put (and maybe its flush) may have landed since the read: never cache the older row over it
+            data = self._pending.get(name, data)
+            entry = self._cache.get(name)
+            if entry is not None:
+                data = entry[1]
+            else:
+                self._remember(name, data)
+        return dict(data)
+
+    def put(self, name: str, data: Dict[str, Any]) -> None:
+        """Visible to get() immediately; persisted by the writer thread."""
+        data = dict(data)
+        with self._lock:
+            self._remember(name, data)
+            self._pending[name] = data
+            full = len(self._pending) >= PROFILE_FLUSH_BATCH
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Writes pending profiles in one transaction; returns how many were written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        now = time.time()
+        try:
+            with self._db_lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO profiles (name, data, updated_at) VALUES (?, ?, ?)",
+                    [(name, json.dumps(data), now) for name, data in pending.items()],
+                )
+        except Exception as e:
+            logger.error(f"Profile flush failed, will retry: {e}")
+            with self._lock:
+                self._pending = {**pending, **self._pending}  # newer writes win
+            return 0
+        return len(pending)
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._wake.wait(PROFILE_FLUSH_S)
+            self._wake.clear()
+            self.flush()
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+
+_store: Optional[ProfileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfileStore()
+    return _store
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import io
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+import streamlit as st
+from utils.logger import logger
+
+# -----------------------------------------
+# ⚙️ Config (opt-in only)
+# -----------------------------------------
+# Enable with ECOGUIDE_PROFILE=1 or by opening the app with ?profile=1
+PROFILE_ENV = "ECOGUIDE_PROFILE"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_DIR = os.getenv("ECOGUIDE_PROFILE_DIR", "profiles")
+TOP_N = int(os.getenv("ECOGUIDE_PROFILE_TOP_N", "40"))
+SAMPLE_INTERVAL = float(os.getenv("ECOGUIDE_PROFILE_INTERVAL_MS", "5")) / 1000
+INDEX_SIZE = int(os.getenv("ECOGUIDE_PROFILE_INDEX_SIZE", "50"))
+INDEX_FILE = "index.json"
+
+_index_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    """True if profiling is switched on by env var or URL query parameter."""
+    if os.getenv(PROFILE_ENV, "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return str(st.query_params.get(PROFILE_QUERY_PARAM, "")).lower() in ("1", "true", "yes")
+    except Exception:
+        return False
+
+
+class _StackSampler:
+    """Samples the Streamlit script thread's stack and counts collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ecoguide-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(parts))] += 1
+
+
+def _top_functions(profiler: cProfile.Profile, top_n: int) -> str:
+    buf = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buf)
+    stats.strip_dirs().sort_stats("cumulative").print_stats(top_n)
+    return buf.getvalue()
+
+
+def _update_index(entry: Dict[str, Any]) -> None:
+    """Keeps a rolling index of the slowest reruns (descending by duration)."""
+    path = os.path.join(PROFILE_DIR, INDEX_FILE)
+    with _index_lock:
+        entries: List[Dict[str, Any]] = []
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    entries = json.load(f)
+            except Exception:
+                entries = []
+        entries.append(entry)
+        entries.sort(key=lambda e: e.get("duration_ms", 0), reverse=True)
+        kept, dropped = entries[:INDEX_SIZE], entries[INDEX_SIZE:]
+
+        # Remove profile files that fell out of the index
+        for old in dropped:
+            for key in ("stats_file", "collapsed_file"):
+                old_path = os.path.join(PROFILE_DIR, old.get(key, ""))
+                if old.get(key) and os.path.exists(old_path):
+                    os.remove(old_path)
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(kept, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+@contextmanager
+def profile_rerun(label: str = "rerun", enabled: Optional[bool] = None):
+    """
+    Profiles the wrapped block of one Streamlit rerun.
+
+    Writes <id>.txt (top-N cumulative functions) and <id>.collapsed
+    (collapsed stacks, loadable by speedscope / flamegraph.pl) to PROFILE_DIR.
+    Does nothing unless profiling is enabled.
+    """
+    if enabled is None:
+        enabled = profiling_enabled()
+    if not enabled:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    sampler = _StackSampler(threading.get_ident(), SAMPLE_INTERVAL)
+    started = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        duration_ms = (time.perf_counter() - started) * 1000
+        try:
+            _write_profile(label, duration_ms, profiler, sampler.stacks)
+        except Exception as e:
+            logger.error(f"Profiler write failed: {e}")
+
+
+def _write_profile(label: str, duration_ms: float, profiler: cProfile.Profile, stacks: Counter) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{label}"
+    stats_file = f"{run_id}.txt"
+    collapsed_file = f"{run_id}.collapsed"
+
+    with open(os.path.join(PROFILE_DIR, stats_file), "w") as f:
+        f.write(f"# {label} — {duration_ms:.1f} ms\n")
+        f.write(_top_functions(profiler, TOP_N))
+
+    with open(os.path.join(PROFILE_DIR, collapsed_file), "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+    _update_index({
+        "id": run_id,
+        "label": label,
+        "duration_ms": round(duration_ms, 2),
+        "samples": sum(stacks.values()),
+        "timestamp": time.time(),
+        "stats_file": stats_file,
+        "collapsed_file": collapsed_file,
+    })
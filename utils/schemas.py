@@ -10,6 +10,8 @@ class Activity(BaseModel):
     description: str = Field(default="")
     image_url: str = Field(default="https://placehold.co/600x400?text=No+Image")
     tag: Optional[str] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
 class ItinerarySchema(BaseModel):
     plan: str = Field(default="## No plan generated.")
@@ -17,6 +19,10 @@ class ItinerarySchema(BaseModel):
     total_cost: int = 0
     eco_score: float = 0.0
     carbon_saved: str = "0kg"
+    carbon_footprint_kg: float = 0.0  # computed by backend/carbon.py
+    carbon_baseline_kg: float = 0.0
+    carbon_saved_kg: float = 0.0
+    travel_km: float = 0.0
     waste_free_score: int = 5
     plan_health_score: int = 75
     
@@ -39,4 +45,20 @@ class ItinerarySchema(BaseModel):
     @validator('*', pre=True)
     def handle_nulls(cls, v):
         return {} if v is None else v
-      
+
+class Priorities(BaseModel):
+    eco: int = Field(default=8, ge=1, le=10)
+    budget: int = Field(default=6, ge=1, le=10)
+    comfort: int = Field(default=5, ge=1, le=10)
+
+class TripRequest(BaseModel):
+    """Same inputs as the sidebar's 'Plan a New Trip' form."""
+    user_name: str = Field(default="User", min_length=1)
+    location: str = "Dubai"
+    days: int = Field(default=3, ge=1, le=30)
+    travelers: int = Field(default=1, ge=1, le=20)
+    budget: int = Field(default=1500, ge=100, le=10000)
+    interests: List[str] = Field(default_factory=list)
+    min_eco_score: float = Field(default=8.0, ge=0.0, le=10.0)
+    priorities: Priorities = Field(default_factory=Priorities)
+    query: Optional[str] = None
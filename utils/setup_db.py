@@ -1,10 +1,16 @@
 import os
-import pandas as pd
-from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
-from uuid import uuid4
+import sys
+from qdrant_client import QdrantClient
 from dotenv import load_dotenv
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+
+from backend.embedder import load_embedder
+from backend.quantization import QDRANT_QUANTIZATION, collection_params
+from backend.ingest import INGEST_CHUNK_ROWS, ingest
+
 # এনভায়রনমেন্ট লোড
 load_dotenv()
 
@@ -14,7 +20,7 @@ QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION = "eco_travel_v3"
 
 # পাথ ফিক্স (যাতে data ফোল্ডার খুঁজে পায়)
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = ROOT_DIR  # this script lives in utils/, data/ is at the repo root
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
 print("🚀 Starting Database Setup...")
@@ -33,7 +39,7 @@ except Exception as e:
 
 # ২. মডেল লোড করা
 print("🧠 Loading Embedding Model (might take a moment)...")
-model = SentenceTransformer("all-MiniLM-L6-v2")
+model = load_embedder()  # shared embedding service if EMBEDDING_SERVICE_SOCKET is set
 
 # ৩. কালেকশন রিসেট করা
 print("🗑️ Clearing old data...")
@@ -42,11 +48,9 @@ try:
 except:
     pass # কালেকশন না থাকলে ইগনোর করো
 
-client.recreate_collection(
-    collection_name=COLLECTION,
-    vectors_config=models.VectorParams(size=384, distance=models.Distance.COSINE)
-)
-print("✨ New Collection Created!")
+# int8/binary codes in RAM, full vectors on disk (QDRANT_QUANTIZATION=none|scalar|binary)
+client.create_collection(collection_name=COLLECTION, **collection_params())
+print(f"✨ New Collection Created! (quantization: {QDRANT_QUANTIZATION})")
 
 # ৪. ডাটা আপলোড করা
 files = {
@@ -55,43 +59,20 @@ files = {
     "Place": "places.csv"
 }
 
-total_indexed = 0
-
+paths = []
 for dtype, filename in files.items():
     file_path = os.path.join(DATA_DIR, filename)
-    
     if not os.path.exists(file_path):
         print(f"⚠️ WARNING: File not found: {filename}")
         continue
-        
-    df = pd.read_csv(file_path)
-    points = []
-    
-    print(f"📄 Indexing {len(df)} {dtype}s from {filename}...")
-    
-    for _, row in df.iterrows():
-        # টেক্সট তৈরি (যেটা দিয়ে সার্চ হবে)
-        text_data = f"{dtype}: {row.get('name', '')} in {row.get('location', '')}. {row.get('description', '')} Eco Score: {row.get('eco_score', 0)}"
-        
-        # ভেক্টর জেনারেট
-        embedding = model.encode(text_data).tolist()
-        
-        # ডাটা রেডি করা
-        payload = row.to_dict()
-        payload['data_type'] = dtype
-        # নিশ্চিত করা যে ফিল্ডগুলো আছে
-        payload.setdefault('eco_score', 5.0)
-        payload.setdefault('cost', 0)
-        
-        points.append(models.PointStruct(
-            id=str(uuid4()),
-            vector=embedding,
-            payload=payload
-        ))
-    
-    if points:
-        client.upsert(collection_name=COLLECTION, points=points)
-        total_indexed += len(points)
+    paths.append(file_path)
+
+# chunked read -> normalize -> validate -> dedupe -> embed + upsert (backend/ingest.py)
+print(f"📄 Indexing {', '.join(os.path.basename(p) for p in paths)} in chunks of {INGEST_CHUNK_ROWS} rows...")
+stats = ingest(paths, client, model, COLLECTION)
+total_indexed = stats["indexed"]
+if stats.get("rejected") or stats.get("duplicates"):
+    print(f"🧹 Skipped {sum(stats.get('rejected', {}).values())} invalid and {stats.get('duplicates', 0)} duplicate rows.")
 
 print("\n------------------------------------------------")
 if total_indexed > 0: